@@ -1,86 +1,268 @@
 from fastapi import FastAPI, File, UploadFile, HTTPException, Request, Form
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.concurrency import run_in_threadpool
 import os
+import re
 import sys
+import time
+import signal
+import asyncio
+import multiprocessing
+import hashlib
 import logging
+import tempfile
+import orjson
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import Optional
 
 # 添加项目根目录到Python路径
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
 # 导入自定义模块
-from backend.config import config_manager
-from backend.utils import setup_logging, create_response, app_logger
-from backend.sync_service import StudentSyncService
-from backend.csv_processor import validate_csv_file
+from backend.config import config_manager, SENSITIVE_FIELDS, PUBLIC_CONFIG_FIELDS
+from backend.utils import setup_logging, create_response, app_logger, ORJSONResponse
+from backend.sync_service import StudentSyncService, classify_csv_headers
+from backend.csv_processor import CSVProcessor, validate_csv_file
 from backend.cache_manager import StudentCacheManager
+from backend.feishu_client import shared_feishu_client, close_feishu_client
 from backend.mapping_memory import MappingMemory
+from backend.upload_store import UploadSessionStore, UploadSession
+from backend.sync_jobs import SyncJobStore
 
 # 设置日志系统
 setup_logging()
 
+# 应用生命周期：启动时初始化，关闭时清理
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用启动与关闭处理"""
+    global index_page_content, index_page_etag
+    try:
+        app_logger.info("应用启动中...")
+        # uvicorn[standard] 已包含uvloop，loop="auto" 时会自动启用，这里记录实际使用的事件循环便于确认
+        app_logger.info("事件循环: %s", type(asyncio.get_running_loop()).__module__)
+        
+        # 预读首页内容，避免每次请求都访问磁盘
+        index_page_content, index_page_etag = load_index_page()
+        
+        # 尝试加载配置
+        try:
+            config_manager.load_config()
+            app_logger.info("配置加载完成")
+            # 预先创建共享的同步服务，首个请求无需再初始化
+            get_sync_service()
+        except Exception as e:
+            app_logger.warning(f"配置加载失败，将使用默认配置: {e}")
+        
+        # 预先加载映射历史，映射相关接口直接复用
+        get_mapping_memory()
+        
+        app_logger.info("应用启动完成")
+    except Exception as e:
+        app_logger.error(f"应用启动失败: {e}")
+        raise
+    
+    yield
+    
+    app_logger.info("应用关闭中...")
+    await sync_jobs.cancel_all()
+    await close_feishu_client()
+    upload_store.clear()
+    csv_validation_cache.clear()
+
 # 创建FastAPI应用实例
 app = FastAPI(
     title="NVC学员信息同步工具",
     description="自动化处理从小鹅通导出的学员数据并同步到飞书多维表格",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
-# 配置CORS
+# 配置CORS（允许的来源从环境变量读取，多个来源用逗号分隔）
+ALLOWED_ORIGINS = [
+    origin.strip()
+    for origin in os.getenv("ALLOWED_ORIGINS", "http://localhost:8000,http://127.0.0.1:8000").split(",")
+    if origin.strip()
+]
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # 生产环境中应该限制具体域名
+    allow_origins=ALLOWED_ORIGINS,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "DELETE"],
+    allow_headers=["Content-Type"],
+    max_age=86400,  # 浏览器缓存预检结果一天
 )
 
+def read_int_env(name: str, default: int, minimum: int, maximum: Optional[int] = None) -> int:
+    """读取整数环境变量，无效时使用默认值，超出范围时限制在允许范围内"""
+    value = os.getenv(name, "").strip()
+    if not value:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        app_logger.warning("%s=%r 不是整数，使用默认值%s", name, value, default)
+        return default
+    clamped = max(number, minimum)
+    if maximum is not None:
+        clamped = min(clamped, maximum)
+    if clamped != number:
+        app_logger.warning("%s=%s 超出允许范围，已调整为%s", name, number, clamped)
+    return clamped
+
+# 压缩较大的JSON/CSV响应（默认小于1KB的响应不压缩）；
+# 仅在本机使用时可设置 GZIP_LEVEL=0 关闭压缩，省去无意义的CPU开销
+gzip_level = read_int_env("GZIP_LEVEL", 5, 0, 9)
+if gzip_level > 0:
+    app.add_middleware(
+        GZipMiddleware,
+        minimum_size=read_int_env("GZIP_MINIMUM_SIZE", 1024, 0),
+        compresslevel=gzip_level
+    )
+
+class CachedStaticFiles(StaticFiles):
+    """带缓存头的静态文件服务，启动时记录文件清单，不存在的路径无需访问磁盘"""
+
+    # 文件名带内容哈希的资源（如 app.3f2a9c1d.js）内容不会变化，可以永久缓存
+    HASHED_ASSET_PATTERN = re.compile(r"\.[0-9a-f]{8,}\.(js|css|woff2?)$")
+
+    def __init__(self, directory: str, **kwargs):
+        super().__init__(directory=directory, **kwargs)
+        self.manifest = {
+            os.path.relpath(os.path.join(root, name), directory)
+            for root, _, files in os.walk(directory)
+            for name in files
+        }
+
+    def lookup_path(self, path: str):
+        if os.path.normpath(path) not in self.manifest:
+            return "", None
+        return super().lookup_path(path)
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if self.HASHED_ASSET_PATTERN.search(str(full_path)):
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        else:
+            # 未带哈希的文件每次协商缓存（ETag/Last-Modified未变化时返回304）
+            response.headers["Cache-Control"] = "no-cache"
+        return response
+
 # 挂载静态文件
 frontend_dir = Path(__file__).parent.parent / "frontend"
 if frontend_dir.exists():
-    app.mount("/static", StaticFiles(directory=str(frontend_dir)), name="static")
+    app.mount("/static", CachedStaticFiles(directory=str(frontend_dir)), name="static")
+
+# 后台同步任务（已结束的任务保留1小时供查询）
+sync_jobs = SyncJobStore(ttl_seconds=3600)
 
-# 全局变量存储上传的文件数据和字段映射
-uploaded_file_data = None
-current_field_mapping = None
+# 按上传令牌存储上传的文件数据和字段映射（30分钟过期）；同步任务仍在读取文件的会话不会被清理
+upload_store = UploadSessionStore(
+    maxsize=128,
+    ttl_seconds=1800,
+    is_pinned=lambda session: sync_jobs.is_active(session.sync_job_id)
+)
+
+# 上传文件大小限制与分块读取参数
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024  # 10MB
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 每次读取1MB，减少大文件上传时的读取和线程切换次数，可按需调整
+UPLOAD_SPOOL_SIZE = 2 * 1024 * 1024  # 超过2MB后落盘
+UPLOAD_FORM_OVERHEAD = 64 * 1024  # 表单字段和multipart边界的额外开销
 
-# 应用启动事件
-@app.on_event("startup")
-async def startup_event():
-    """应用启动时的初始化"""
+class UploadSizeLimitMiddleware:
+    """
+    在读取请求体之前按Content-Length拒绝过大的上传请求
+    
+    FastAPI会在调用接口函数前解析完整的multipart表单，接口内的大小检查无法避免读取；
+    未携带或伪造Content-Length的请求仍由接口内的分块大小检查兜底
+    """
+
+    def __init__(self, app, path: str, max_body_size: int):
+        self.app = app
+        self.path = path
+        self.max_body_size = max_body_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == self.path:
+            content_length = dict(scope["headers"]).get(b"content-length")
+            if content_length and content_length.isdigit() and int(content_length) > self.max_body_size:
+                app_logger.warning("上传请求过大，直接拒绝: %s bytes", content_length.decode())
+                response = ORJSONResponse(
+                    create_response(success=False, message="文件大小超过10MB限制"),
+                    status_code=413
+                )
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    path="/api/upload",
+    max_body_size=MAX_UPLOAD_SIZE + UPLOAD_FORM_OVERHEAD
+)
+
+# CSV格式验证结果缓存：文件内容摘要 -> 验证结果，重复上传同一文件时无需再次解析
+CSV_VALIDATION_CACHE_SIZE = 32
+csv_validation_cache: "OrderedDict[bytes, dict]" = OrderedDict()
+# 按文件内容摘要加锁：同一文件并发上传（如重复点击）时只验证一次，其余请求等待后复用结果
+# 摘要 -> [锁, 持有或等待该锁的请求数]，计数归零时才移除，保证同一摘要的请求始终使用同一把锁
+csv_validation_locks: "dict[bytes, list]" = {}
+
+# 学员缓存文件路径（与 StudentCacheManager 默认路径一致）
+CACHE_DIR = Path("cache")
+CACHE_FILE = CACHE_DIR / "students_cache.json"
+LEGACY_CACHE_FILE = CACHE_DIR / "students_cache.pkl"
+CACHE_META_FILE = CACHE_DIR / "cache_meta.json"
+
+def read_cache_meta() -> Optional[bytes]:
+    """读取缓存元信息文件内容，缓存文件或元信息文件不存在时返回None"""
+    if not CACHE_FILE.exists() and not LEGACY_CACHE_FILE.exists():
+        return None
     try:
-        app_logger.info("应用启动中...")
-        
-        # 尝试加载配置
-        try:
-            config_manager.load_config()
-            app_logger.info("配置加载完成")
-        except Exception as e:
-            app_logger.warning(f"配置加载失败，将使用默认配置: {e}")
-        
-        app_logger.info("应用启动完成")
-    except Exception as e:
-        app_logger.error(f"应用启动失败: {e}")
-        raise
+        return CACHE_META_FILE.read_bytes()
+    except FileNotFoundError:
+        return None
+
+# 共享的同步服务实例（保持学员缓存常驻内存），配置重新加载后重建；
+# 重建时沿用原有的缓存管理器，仍在执行的同步任务与新实例写缓存文件时共用同一把锁
+shared_sync_service: Optional[StudentSyncService] = None
+shared_sync_service_version = -1
+
+def get_sync_service() -> StudentSyncService:
+    """获取共享的同步服务实例"""
+    global shared_sync_service, shared_sync_service_version
+    if shared_sync_service is None or shared_sync_service_version != config_manager.config_version:
+        shared_sync_service = StudentSyncService(
+            config_manager.config,
+            cache_manager=shared_sync_service.cache_manager if shared_sync_service else None
+        )
+        shared_sync_service_version = config_manager.config_version
+    return shared_sync_service
 
-# 应用关闭事件
-@app.on_event("shutdown")
-async def shutdown_event():
-    """应用关闭时的清理"""
-    app_logger.info("应用关闭中...")
+# 同步状态快照：((上传令牌, 配置版本号), 状态数据, ETag)，供状态轮询接口复用
+sync_status_snapshot: Optional[tuple] = None
 
-# 根路径 - 返回前端页面
-@app.get("/", response_class=HTMLResponse)
-async def root():
-    """返回主页面"""
-    frontend_file = frontend_dir / "index.html"
-    if frontend_file.exists():
-        return FileResponse(str(frontend_file))
+# 共享的映射记忆实例，历史文件变化时才重新解析
+shared_mapping_memory: Optional[MappingMemory] = None
+
+def get_mapping_memory() -> MappingMemory:
+    """获取共享的映射记忆实例"""
+    global shared_mapping_memory
+    if shared_mapping_memory is None:
+        shared_mapping_memory = MappingMemory()
     else:
-        return HTMLResponse("""
+        shared_mapping_memory.refresh()
+    return shared_mapping_memory
+
+# 前端页面不存在时的提示页面
+FALLBACK_HTML = """
         <!DOCTYPE html>
         <html>
         <head>
@@ -92,7 +274,43 @@ async def root():
             <p>前端页面未找到，请检查文件路径。</p>
         </body>
         </html>
-        """)
+        """
+
+def load_index_page():
+    """读取首页内容并计算ETag，启动时执行一次"""
+    frontend_file = frontend_dir / "index.html"
+    if frontend_file.exists():
+        content = frontend_file.read_bytes()
+    else:
+        app_logger.warning(f"前端页面未找到: {frontend_file}")
+        content = FALLBACK_HTML.encode("utf-8")
+    etag = f'"{hashlib.md5(content).hexdigest()}"'
+    return content, etag
+
+index_page_content, index_page_etag = b"", ""
+
+def build_sample_csv():
+    """生成示例CSV内容（带UTF-8 BOM以便Excel正确显示中文）并计算ETag"""
+    content = CSVProcessor().generate_sample_csv().encode("utf-8-sig")
+    etag = f'"{hashlib.md5(content).hexdigest()}"'
+    return content, etag
+
+# 示例CSV内容固定不变，导入时生成一次
+sample_csv_content, sample_csv_etag = build_sample_csv()
+
+# 根路径 - 返回前端页面
+@app.get("/", response_class=HTMLResponse)
+async def root(request: Request):
+    """返回主页面"""
+    # 首页每次协商缓存，确保前端更新后立即生效；内容未变化时只返回304
+    headers = {
+        "ETag": index_page_etag,
+        "Cache-Control": "no-cache"
+    }
+    if request.headers.get("if-none-match") == index_page_etag:
+        return Response(status_code=304, headers=headers)
+    
+    return HTMLResponse(index_page_content, headers=headers)
 
 # 健康检查
 @app.get("/health")
@@ -110,11 +328,11 @@ async def get_config():
     """获取当前配置信息（脱敏）"""
     try:
         if config_manager.config:
-            # 返回脱敏的配置信息
-            config_dict = config_manager.config.dict()
-            # 脱敏处理
-            config_dict['feishu_app_id'] = "***" if config_dict['feishu_app_id'] else ""
-            config_dict['feishu_app_secret'] = "***" if config_dict['feishu_app_secret'] else ""
+            config = config_manager.config
+            # 返回脱敏的配置信息，只序列化白名单中的字段
+            config_dict = config.model_dump(include=PUBLIC_CONFIG_FIELDS)
+            for field in SENSITIVE_FIELDS:
+                config_dict[field] = "***" if getattr(config, field) else ""
             
             return create_response(
                 success=True,
@@ -151,6 +369,12 @@ async def validate_config():
         app_logger.error(f"配置验证失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# 连接测试超时时间与成功结果缓存时间（秒）
+CONNECTION_TEST_TIMEOUT = 10.0
+CONNECTION_TEST_CACHE_TTL = 30.0
+# 配置版本号 -> (缓存时间, 测试结果)；配置重新加载（凭证、表格变化）后版本号变化，旧结果不再使用
+connection_test_cache = {}
+
 @app.post("/api/config/test-connection")
 async def test_feishu_connection():
     """测试飞书连接"""
@@ -161,8 +385,28 @@ async def test_feishu_connection():
                 message="配置未加载"
             )
         
-        sync_service = StudentSyncService(config_manager.config)
-        result = await sync_service.validate_table_structure()
+        cache_key = config_manager.config_version
+        cached = connection_test_cache.get(cache_key)
+        if cached and time.monotonic() - cached[0] < CONNECTION_TEST_CACHE_TTL:
+            result = cached[1]
+        else:
+            sync_service = get_sync_service()
+            try:
+                result = await asyncio.wait_for(
+                    sync_service.validate_table_structure(),
+                    timeout=CONNECTION_TEST_TIMEOUT
+                )
+            except asyncio.TimeoutError:
+                app_logger.warning("飞书连接测试超时")
+                return create_response(
+                    success=False,
+                    message="飞书连接超时，请稍后重试"
+                )
+            
+            # 表格结构很少变化，短时间内重复测试直接返回上次的成功结果
+            if result["success"]:
+                connection_test_cache.clear()
+                connection_test_cache[cache_key] = (time.monotonic(), result)
         
         return create_response(
             success=result["success"],
@@ -182,29 +426,22 @@ async def upload_csv(
     learningDate: str = Form(...)
 ):
     """上传CSV文件"""
-    global uploaded_file_data
-    
+    # 上传内容的临时文件，保存到上传会话之前任何路径退出都要关闭，避免大文件留在磁盘上
+    content = None
+    stored = False
     try:
-        # 主动清除旧的缓存数据
-        if uploaded_file_data:
-            old_filename = uploaded_file_data.get("filename", "未知文件")
-            app_logger.info(f"清除旧缓存文件: {old_filename}")
-            uploaded_file_data = None
-        else:
-            app_logger.info("无需清除缓存，当前无已上传文件")
-        
-        app_logger.info(f"接收到上传请求 - 课程: '{courseName}', 日期: '{learningDate}', 文件: {file.filename}")
+        app_logger.info("接收到上传请求 - 课程: '%s', 日期: '%s', 文件: %s", courseName, learningDate, file.filename)
         
         # 验证必需参数
         if not courseName or not courseName.strip():
-            app_logger.warning(f"课程名称为空: '{courseName}'")
+            app_logger.warning("课程名称为空: '%s'", courseName)
             return create_response(
                 success=False,
                 message="请输入课程名称"
             )
         
         if not learningDate or not learningDate.strip():
-            app_logger.warning(f"学习日期为空: '{learningDate}'")
+            app_logger.warning("学习日期为空: '%s'", learningDate)
             return create_response(
                 success=False,
                 message="请选择学习日期"
@@ -212,96 +449,91 @@ async def upload_csv(
         
         # 验证文件类型
         if not file.filename or not file.filename.endswith('.csv'):
-            app_logger.warning(f"文件类型错误: {file.filename}")
+            app_logger.warning("文件类型错误: %s", file.filename)
             return create_response(
                 success=False,
                 message="请上传CSV格式的文件"
             )
         
-        # 读取文件内容
-        content = await file.read()
-        file_size = len(content)
-        
-        # 验证文件大小（限制为10MB）
-        if file_size > 10 * 1024 * 1024:  # 10MB
-            app_logger.warning(f"文件大小超限: {file_size} bytes")
-            return create_response(
-                success=False,
-                message="文件大小超过10MB限制"
-            )
+        # 分块读取文件内容到临时文件（小文件留在内存，大文件落盘）
+        content = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_SIZE)
+        file_size = 0
+        content_hash = hashlib.blake2b(digest_size=16)
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            file_size += len(chunk)
+            # 验证文件大小（限制为10MB），超限立即停止读取
+            if file_size > MAX_UPLOAD_SIZE:
+                app_logger.warning("文件大小超限: 已读取 %s bytes", file_size)
+                return create_response(
+                    success=False,
+                    message="文件大小超过10MB限制"
+                )
+            content.write(chunk)
+            content_hash.update(chunk)
+        content.seek(0)
+        content_digest = content_hash.digest()
         
-        app_logger.info(f"文件验证通过 - 文件: {file.filename}, 大小: {file_size} bytes, 课程: {courseName}, 日期: {learningDate}")
+        app_logger.info("文件验证通过 - 文件: %s, 大小: %s bytes, 课程: %s, 日期: %s", file.filename, file_size, courseName, learningDate)
         
-        # 验证CSV文件格式
-        csv_validation = validate_csv_file(content, file.filename)
+        # 验证CSV文件格式（编码检测和解析较耗CPU，放到线程池执行，避免阻塞事件循环）
+        lock_entry = csv_validation_locks.setdefault(content_digest, [asyncio.Lock(), 0])
+        lock_entry[1] += 1
+        validation_lock = lock_entry[0]
+        try:
+            async with validation_lock:
+                csv_validation = csv_validation_cache.get(content_digest)
+                if csv_validation is None:
+                    csv_validation = await run_in_threadpool(validate_csv_file, content, file.filename)
+                    csv_validation_cache[content_digest] = csv_validation
+                    if len(csv_validation_cache) > CSV_VALIDATION_CACHE_SIZE:
+                        csv_validation_cache.popitem(last=False)
+                else:
+                    csv_validation_cache.move_to_end(content_digest)
+                    app_logger.info("文件内容与之前上传的文件相同，复用格式验证结果")
+        finally:
+            lock_entry[1] -= 1
+            if not lock_entry[1]:
+                csv_validation_locks.pop(content_digest, None)
         if not csv_validation["valid"]:
-            app_logger.error(f"CSV格式验证失败: {csv_validation['error']}")
+            app_logger.warning("CSV格式验证失败: %s", csv_validation['error'])
             return create_response(
                 success=False,
                 message=f"CSV文件格式错误: {csv_validation['error']}"
             )
         
-        # 存储文件数据到内存
-        uploaded_file_data = {
-            "content": content,
-            "filename": file.filename,
-            "size": file_size,
-            "headers": csv_validation["headers"],
-            "encoding": csv_validation["encoding"],
-            "courseName": courseName.strip(),
-            "learningDate": learningDate.strip()
-        }
-        
-        app_logger.info(f"文件上传成功，数据已缓存 - 文件: {file.filename}, 课程: {courseName}, 日期: {learningDate}")
-        
         # 检查是否需要字段映射
         # 如果所有CSV字段都能在默认映射中找到，则不需要互动配置
-        from .sync_service import FieldMappingService
-        default_mapping = FieldMappingService.DEFAULT_FIELD_MAPPING
-        csv_headers = csv_validation["headers"]
-
         # 检查是否有未映射的字段（排除核心字段和已知字段）
-        # 核心字段：这些字段会被CSV处理器自动处理
-        core_fields = {"user_id", "nickname", "phone", "course", "learning_date"}
-        # 已知字段的所有可能变体
-        known_field_variants = set()
-        for field in default_mapping.keys():
-            known_field_variants.add(field)
-            # 添加常见的变体
-            known_field_variants.add(field.replace(" ", ""))  # 去除空格
-            known_field_variants.add(field.replace("　", ""))  # 去除全角空格
-
-        unmapped_fields = []
-        mapped_fields = []
-
-        for header in csv_headers:
-            # 标准化字段名（去除空格等）
-            normalized_header = header.strip().replace(" ", "").replace("　", "")
-
-            # 检查是否是核心字段
-            if any(core in normalized_header.lower() for core in ["userid", "用户id", "昵称", "nickname", "手机", "phone"]):
-                mapped_fields.append(header)
-                continue
-
-            # 检查是否在默认映射中
-            if header in default_mapping or normalized_header in known_field_variants:
-                mapped_fields.append(header)
-            else:
-                unmapped_fields.append(header)
+        mapped_fields, unmapped_fields = classify_csv_headers(csv_validation["headers"])
+        
+        # 按上传令牌存储文件数据，不同用户的上传互不覆盖；存储后临时文件由上传会话负责关闭
+        upload_token = upload_store.put(UploadSession(
+            content=content,
+            filename=file.filename,
+            size=file_size,
+            headers=csv_validation["headers"],
+            encoding=csv_validation["encoding"],
+            course_name=courseName.strip(),
+            learning_date=learningDate.strip()
+        ))
+        stored = True
+        
+        app_logger.info("文件上传成功，数据已缓存 - 文件: %s, 课程: %s, 日期: %s", file.filename, courseName, learningDate)
 
         # 只有当有未映射字段时才需要显示映射界面
         need_mapping = len(unmapped_fields) > 0
 
         if need_mapping:
-            app_logger.info(f"检测到 {len(unmapped_fields)} 个未映射的字段: {unmapped_fields}")
-            app_logger.info(f"已知映射的字段: {mapped_fields}")
+            app_logger.info("检测到 %s 个未映射的字段: %s", len(unmapped_fields), unmapped_fields)
+            app_logger.info("已知映射的字段: %s", mapped_fields)
         else:
-            app_logger.info(f"所有字段都可以使用默认映射，无需互动配置。已映射字段: {mapped_fields}")
+            app_logger.info("所有字段都可以使用默认映射，无需互动配置。已映射字段: %s", mapped_fields)
 
         return create_response(
             success=True,
             message="文件上传成功，可以开始同步",
             data={
+                "upload_token": upload_token,
                 "filename": file.filename,
                 "size": file_size,
                 "headers": csv_validation["headers"],
@@ -315,12 +547,22 @@ async def upload_csv(
             }
         )
         
+    except (ValueError, UnicodeDecodeError, KeyError) as e:
+        # 文件内容问题属于用户输入错误，记录原因即可，不输出堆栈
+        app_logger.warning("文件上传失败: %s", e)
+        return create_response(
+            success=False,
+            message=f"文件上传失败: {str(e)}"
+        )
     except Exception as e:
-        app_logger.error(f"文件上传失败: {e}", exc_info=True)
+        app_logger.exception("文件上传失败: %s", e)
         return create_response(
             success=False,
             message=f"文件上传失败: {str(e)}"
         )
+    finally:
+        if content is not None and not stored:
+            content.close()
 
 # 获取表格字段信息接口
 @app.get("/api/table/fields")
@@ -340,7 +582,7 @@ async def get_table_fields():
         # 验证配置
         validation_result = config_manager.validate_config(config_manager.config)
         if not validation_result["valid"]:
-            app_logger.error(f"配置验证失败: {validation_result.get('errors', [])}")
+            app_logger.error("配置验证失败: %s", validation_result.get('errors', []))
             return create_response(
                 success=False,
                 message="配置验证失败",
@@ -348,18 +590,19 @@ async def get_table_fields():
             )
 
         # 创建同步服务并获取字段信息
-        sync_service = StudentSyncService(config_manager.config)
+        sync_service = get_sync_service()
         fields_info = await sync_service.get_table_fields_info()
 
         app_logger.info("飞书表格字段信息获取成功")
-        return create_response(
+        # 字段列表较大，直接返回ORJSONResponse，跳过FastAPI对返回值的jsonable_encoder逐层转换
+        return ORJSONResponse(create_response(
             success=True,
             message="字段信息获取成功",
             data=fields_info
-        )
+        ))
 
     except Exception as e:
-        app_logger.error(f"获取表格字段信息失败: {e}", exc_info=True)
+        app_logger.error("获取表格字段信息失败: %s", e)
         return create_response(
             success=False,
             message=f"获取表格字段信息失败: {str(e)}"
@@ -368,10 +611,9 @@ async def get_table_fields():
 # 设置字段映射接口
 @app.post("/api/mapping/set")
 async def set_field_mapping(request: dict):
-    """设置字段映射配置"""
-    global current_field_mapping
-
+    """设置字段映射配置（已废弃：请在 /api/sync 请求中直接传入 field_mapping）"""
     try:
+        app_logger.warning("/api/mapping/set 已废弃，请在 /api/sync 请求中传入 field_mapping")
         mapping = request.get('mapping', {})
 
         if not isinstance(mapping, dict):
@@ -380,8 +622,15 @@ async def set_field_mapping(request: dict):
                 message="映射配置格式错误"
             )
 
-        current_field_mapping = mapping
-        app_logger.info(f"字段映射配置已保存: {len(mapping)} 个映射")
+        uploaded_file_data = upload_store.get(request.get('upload_token'))
+        if not uploaded_file_data:
+            return create_response(
+                success=False,
+                message="请先上传CSV文件"
+            )
+
+        uploaded_file_data.field_mapping = mapping
+        app_logger.info("字段映射配置已保存: %s 个映射", len(mapping))
 
         return create_response(
             success=True,
@@ -392,7 +641,7 @@ async def set_field_mapping(request: dict):
         )
 
     except Exception as e:
-        app_logger.error(f"设置字段映射失败: {e}", exc_info=True)
+        app_logger.error("设置字段映射失败: %s", e)
         return create_response(
             success=False,
             message=f"设置字段映射失败: {str(e)}"
@@ -400,19 +649,32 @@ async def set_field_mapping(request: dict):
 
 # 同步处理接口
 @app.post("/api/sync")
-async def sync_data():
-    """执行数据同步"""
-    global uploaded_file_data, current_field_mapping
-    
+async def sync_data(request_data: Optional[dict] = None):
+    """提交数据同步任务，立即返回任务ID"""
     try:
         app_logger.info("开始同步数据处理...")
         
-        # 检查是否有上传的文件
-        if not uploaded_file_data:
-            app_logger.error("同步失败: 没有上传的文件")
+        request_data = request_data or {}
+        
+        # 字段映射随同步请求一起提交，无需先调用 /api/mapping/set
+        field_mapping = request_data.get("field_mapping")
+        if field_mapping is not None and not isinstance(field_mapping, dict):
             return create_response(
                 success=False,
-                message="请先上传CSV文件"
+                message="映射配置格式错误"
+            )
+        
+        # 检查是否有上传的文件（必须携带上传令牌，避免同步到其他用户上传的文件）
+        upload_token = request_data.get("upload_token")
+        uploaded_file_data = upload_store.get(upload_token)
+        if not uploaded_file_data:
+            app_logger.error("同步失败: 上传令牌缺失或已失效")
+            return ORJSONResponse(
+                create_response(
+                    success=False,
+                    message="请先上传CSV文件" if not upload_token else "上传文件不存在或已过期，请重新上传"
+                ),
+                status_code=400
             )
         
         # 检查配置
@@ -426,50 +688,75 @@ async def sync_data():
         # 验证配置
         validation_result = config_manager.validate_config(config_manager.config)
         if not validation_result["valid"]:
-            app_logger.error(f"同步失败: 配置验证失败 - {validation_result.get('errors', [])}")
+            app_logger.error("同步失败: 配置验证失败 - %s", validation_result.get('errors', []))
             return create_response(
                 success=False,
                 message="配置验证失败",
                 data=validation_result
             )
         
-        app_logger.info(f"开始同步数据: {uploaded_file_data['filename']}")
-        app_logger.info(f"课程名称: {uploaded_file_data.get('courseName', 'N/A')}")
-        app_logger.info(f"学习日期: {uploaded_file_data.get('learningDate', 'N/A')}")
+        # 同一个上传文件已有同步任务在执行时，直接返回该任务
+        running_job_id = uploaded_file_data.sync_job_id
+        if sync_jobs.is_active(running_job_id):
+            app_logger.info("同步任务已在执行中: %s", running_job_id)
+            return create_response(
+                success=True,
+                message="同步任务执行中",
+                data=sync_jobs.get(running_job_id)
+            )
+        
+        if field_mapping is not None:
+            # 保存到上传会话，同步失败后重试时沿用
+            uploaded_file_data.field_mapping = field_mapping
+        
+        app_logger.info("开始同步数据: %s", uploaded_file_data.filename)
+        app_logger.info("课程名称: %s", uploaded_file_data.course_name or 'N/A')
+        app_logger.info("学习日期: %s", uploaded_file_data.learning_date or 'N/A')
         
         # 创建同步服务并执行同步
-        sync_service = StudentSyncService(config_manager.config)
+        sync_service = get_sync_service()
         
         app_logger.info("开始调用同步服务...")
         # 添加字段映射信息到日志
+        current_field_mapping = uploaded_file_data.field_mapping
         if current_field_mapping:
-            app_logger.info(f"使用自定义字段映射: {len(current_field_mapping)} 个映射")
+            app_logger.info("使用自定义字段映射: %s 个映射", len(current_field_mapping))
             for csv_field, feishu_field in current_field_mapping.items():
-                app_logger.info(f"  {csv_field} → {feishu_field}")
+                app_logger.info("  %s → %s", csv_field, feishu_field)
         else:
             app_logger.info("使用默认字段映射")
 
-        result = await sync_service.sync_csv_data(
-            uploaded_file_data["content"],
-            uploaded_file_data["filename"],
-            course_name=uploaded_file_data.get("courseName"),
-            learning_date=uploaded_file_data.get("learningDate"),
-            field_mapping=current_field_mapping
-        )
+        def run_sync():
+            return sync_service.sync_csv_data(
+                uploaded_file_data.content,
+                uploaded_file_data.filename,
+                course_name=uploaded_file_data.course_name,
+                learning_date=uploaded_file_data.learning_date,
+                field_mapping=current_field_mapping,
+                # 上传验证时已检测过编码，同步时直接复用
+                encoding=uploaded_file_data.encoding
+            )
         
-        app_logger.info(f"同步服务完成，结果: {result.get('success', False)}")
+        def on_sync_done(result):
+            app_logger.info("同步服务完成，结果: %s", result.get('success', False))
+            if result.get("success"):
+                app_logger.info("同步成功，清除上传文件数据和映射配置")
+                upload_store.pop(upload_token)
+            else:
+                app_logger.error("同步失败: %s", result.get('message', '未知错误'))
         
-        if result.get("success"):
-            app_logger.info("同步成功，清除上传文件数据和映射配置")
-            uploaded_file_data = None
-            current_field_mapping = None
-        else:
-            app_logger.error(f"同步失败: {result.get('message', '未知错误')}")
+        job_id = sync_jobs.submit(run_sync, on_done=on_sync_done)
+        uploaded_file_data.sync_job_id = job_id
+        app_logger.info("同步任务已提交: %s", job_id)
         
-        return result
+        return create_response(
+            success=True,
+            message="同步任务已提交",
+            data=sync_jobs.get(job_id)
+        )
         
     except Exception as e:
-        app_logger.error(f"同步过程发生异常: {str(e)}", exc_info=True)
+        app_logger.exception("同步过程发生异常: %s", e)
         return create_response(
             success=False,
             message=f"同步过程发生异常: {str(e)}"
@@ -477,46 +764,100 @@ async def sync_data():
 
 # 同步状态查询接口
 @app.get("/api/sync/status")
-async def get_sync_status():
-    """获取同步状态"""
+async def get_sync_status(request: Request, upload_token: Optional[str] = None):
+    """获取同步状态（状态未变化时返回304）"""
+    global sync_status_snapshot
     try:
-        has_file = uploaded_file_data is not None
-        has_config = config_manager.config is not None
-        
-        config_valid = False
-        if has_config:
-            validation_result = config_manager.validate_config(config_manager.config)
-            config_valid = validation_result["valid"]
+        uploaded_file_data = upload_store.get(upload_token)
+        if not uploaded_file_data:
+            return ORJSONResponse(
+                create_response(
+                    success=False,
+                    message="缺少上传令牌" if not upload_token else "上传文件不存在或已过期，请重新上传"
+                ),
+                status_code=400
+            )
         
-        return create_response(
-            success=True,
-            message="状态查询成功",
-            data={
-                "has_uploaded_file": has_file,
+        # 状态只取决于上传会话和配置，两者都未变化时直接复用上次计算的结果
+        snapshot_key = (upload_token, config_manager.config_version)
+        if sync_status_snapshot and sync_status_snapshot[0] == snapshot_key:
+            status_data, etag = sync_status_snapshot[1], sync_status_snapshot[2]
+        else:
+            has_config = config_manager.config is not None
+            
+            config_valid = False
+            if has_config:
+                validation_result = config_manager.validate_config(config_manager.config)
+                config_valid = validation_result["valid"]
+            
+            status_data = {
+                "has_uploaded_file": True,
                 "has_config": has_config,
                 "config_valid": config_valid,
-                "ready_to_sync": has_file and has_config and config_valid,
+                "ready_to_sync": has_config and config_valid,
                 "uploaded_file": {
-                    "filename": uploaded_file_data["filename"] if has_file else None,
-                    "size": uploaded_file_data["size"] if has_file else None
-                } if has_file else None
+                    "filename": uploaded_file_data.filename,
+                    "size": uploaded_file_data.size
+                }
             }
+            
+            # 以状态内容计算ETag，前端轮询时状态未变化直接返回304
+            etag = f'"{hashlib.md5(orjson.dumps(status_data)).hexdigest()}"'
+            sync_status_snapshot = (snapshot_key, status_data, etag)
+        
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        
+        return ORJSONResponse(
+            create_response(
+                success=True,
+                message="状态查询成功",
+                data=status_data
+            ),
+            headers=headers
         )
         
     except Exception as e:
         app_logger.error(f"状态查询失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# 同步任务进度查询接口
+@app.get("/api/sync/status/{job_id}")
+async def get_sync_job_status(job_id: str):
+    """查询后台同步任务状态，任务结束后返回同步结果"""
+    job = sync_jobs.get(job_id)
+    if not job:
+        return ORJSONResponse(
+            create_response(
+                success=False,
+                message="同步任务不存在或已过期"
+            ),
+            status_code=404
+        )
+    
+    return create_response(
+        success=True,
+        message="任务状态查询成功",
+        data=job
+    )
+
 # 清除上传文件接口
 @app.delete("/api/upload/clear")
-async def clear_uploaded_file():
+async def clear_uploaded_file(upload_token: Optional[str] = None):
     """清除已上传的文件"""
-    global uploaded_file_data
-    
     try:
+        # 同步任务仍在读取该文件时不能清除
+        uploaded_file_data = upload_store.get(upload_token)
+        if uploaded_file_data and sync_jobs.is_active(uploaded_file_data.sync_job_id):
+            return create_response(
+                success=False,
+                message="文件正在同步中，暂时无法清除"
+            )
+        
+        uploaded_file_data = upload_store.pop(upload_token)
         if uploaded_file_data:
-            filename = uploaded_file_data["filename"]
-            uploaded_file_data = None
+            filename = uploaded_file_data.filename
             app_logger.info(f"已清除上传文件: {filename}")
             
             return create_response(
@@ -556,7 +897,7 @@ async def update_conflicts(request: Request):
             )
         
         # 创建同步服务并执行冲突更新
-        sync_service = StudentSyncService(config_manager.config)
+        sync_service = get_sync_service()
         result = await sync_service.update_selected_conflicts(selected_conflicts)
         
         return create_response(
@@ -566,7 +907,7 @@ async def update_conflicts(request: Request):
         )
         
     except Exception as e:
-        app_logger.error(f"冲突更新失败: {e}", exc_info=True)
+        app_logger.error(f"冲突更新失败: {e}")
         return create_response(
             success=False,
             message=f"冲突更新失败: {str(e)}"
@@ -574,43 +915,32 @@ async def update_conflicts(request: Request):
 
 # 示例CSV下载接口
 @app.get("/api/sample-csv")
-async def download_sample_csv():
+async def download_sample_csv(request: Request):
     """下载示例CSV文件"""
-    try:
-        from backend.csv_processor import CSVProcessor
-        
-        processor = CSVProcessor()
-        sample_content = processor.generate_sample_csv()
-        
-        from fastapi.responses import Response
-        
-        return Response(
-            content=sample_content.encode('utf-8-sig'),  # 使用UTF-8 BOM以便Excel正确显示中文
-            media_type="text/csv",
-            headers={
-                "Content-Disposition": "attachment; filename=sample_students.csv"
-            }
-        )
-        
-    except Exception as e:
-        app_logger.error(f"生成示例CSV失败: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    headers = {
+        "ETag": sample_csv_etag,
+        "Cache-Control": "public, max-age=86400",
+        "Content-Disposition": "attachment; filename=sample_students.csv"
+    }
+    if request.headers.get("if-none-match") == sample_csv_etag:
+        return Response(status_code=304, headers=headers)
+    
+    return Response(
+        content=sample_csv_content,
+        media_type="text/csv; charset=utf-8",
+        headers=headers
+    )
 
 # 缓存管理接口
 @app.get("/api/cache/status")
 async def get_cache_status():
     """获取缓存状态"""
     try:
-        import json
         from datetime import datetime
-        from pathlib import Path
-
-        cache_dir = Path("cache")
-        cache_file = cache_dir / "students_cache.pkl"
-        meta_file = cache_dir / "cache_meta.json"
 
-        # 检查缓存文件是否存在
-        if not cache_file.exists() or not meta_file.exists():
+        # 检查缓存文件是否存在并读取元信息（文件操作放到线程池执行，避免阻塞事件循环）
+        meta_bytes = await run_in_threadpool(read_cache_meta)
+        if meta_bytes is None:
             return create_response(
                 success=True,
                 message="缓存状态获取成功",
@@ -625,8 +955,7 @@ async def get_cache_status():
 
         # 读取缓存元信息
         try:
-            with open(meta_file, 'r', encoding='utf-8') as f:
-                meta = json.load(f)
+            meta = orjson.loads(meta_bytes)
 
             last_update = datetime.fromisoformat(meta['last_update'])
             age_hours = (datetime.now() - last_update).total_seconds() / 3600
@@ -679,11 +1008,9 @@ async def refresh_cache():
                 message="配置未加载，请检查配置文件"
             )
 
-        # 创建缓存管理器和飞书客户端
-        cache_manager = StudentCacheManager()
-        from backend.feishu_client import FeishuClient
-
-        async with FeishuClient(config_manager.config) as feishu_client:
+        # 使用同步服务的缓存管理器，刷新后同步时直接使用内存中的新数据
+        cache_manager = get_sync_service().cache_manager
+        async with shared_feishu_client(config_manager.config) as feishu_client:
             # 获取学员表配置
             student_table = config_manager.config.student_table
 
@@ -716,7 +1043,13 @@ async def refresh_cache():
 async def clear_cache():
     """清空缓存"""
     try:
-        cache_manager = StudentCacheManager()
+        # 同时清空同步服务内存中的缓存，避免继续使用已清空的数据
+        if config_manager.config:
+            sync_service = get_sync_service()
+            sync_service.clear_user_record_index()
+            cache_manager = sync_service.cache_manager
+        else:
+            cache_manager = StudentCacheManager()
         cache_manager.clear_cache()
 
         return create_response(
@@ -752,7 +1085,7 @@ async def get_mapping_suggestion(request_data: dict):
             )
 
         # 获取飞书表格字段
-        sync_service = StudentSyncService(config_manager.config)
+        sync_service = get_sync_service()
         feishu_fields_info = await sync_service.get_table_fields_info()
 
         if not feishu_fields_info["success"]:
@@ -764,7 +1097,7 @@ async def get_mapping_suggestion(request_data: dict):
         feishu_fields = feishu_fields_info["data"]["student_table"]["fields"]
 
         # 获取历史映射建议
-        mapping_memory = MappingMemory()
+        mapping_memory = get_mapping_memory()
         suggested_mapping = mapping_memory.get_last_mapping_for_csv(csv_headers)
 
         return create_response(
@@ -799,7 +1132,7 @@ async def save_mapping(request_data: dict):
             )
 
         # 保存映射配置
-        mapping_memory = MappingMemory()
+        mapping_memory = get_mapping_memory()
         success = mapping_memory.save_mapping(csv_headers, mapping)
 
         if success:
@@ -825,7 +1158,7 @@ async def save_mapping(request_data: dict):
 async def get_mapping_history():
     """获取映射历史记录"""
     try:
-        mapping_memory = MappingMemory()
+        mapping_memory = get_mapping_memory()
         history = mapping_memory.get_mapping_history()
         statistics = mapping_memory.get_mapping_statistics()
 
@@ -848,7 +1181,7 @@ async def get_mapping_history():
 async def clear_mapping_history():
     """清除映射历史记录"""
     try:
-        mapping_memory = MappingMemory()
+        mapping_memory = get_mapping_memory()
         success = mapping_memory.clear_history()
 
         if success:
@@ -875,10 +1208,6 @@ async def clear_mapping_history():
 async def shutdown_server():
     """优雅关闭服务器"""
     try:
-        import asyncio
-        import signal
-        import os
-        
         app_logger.info("收到关闭服务请求")
         
         # 立即返回响应
@@ -887,17 +1216,14 @@ async def shutdown_server():
             message="服务器正在关闭，感谢使用！"
         )
         
-        # 延迟1秒后关闭服务器，确保响应能够发送
+        # uvicorn 优雅退出时会等待正在处理的请求（包括本次响应）发送完毕
         async def delayed_shutdown():
-            await asyncio.sleep(1)
             app_logger.info("开始优雅关闭服务器...")
             
             # 清理资源
-            global uploaded_file_data
-            uploaded_file_data = None
+            upload_store.clear()
             
-            # 发送SIGTERM信号来优雅关闭
-            os.kill(os.getpid(), signal.SIGTERM)
+            request_server_exit()
         
         # 在后台执行关闭任务
         asyncio.create_task(delayed_shutdown())
@@ -911,11 +1237,24 @@ async def shutdown_server():
             message=f"关闭服务失败: {str(e)}"
         )
 
+def request_server_exit():
+    """通知uvicorn优雅退出"""
+    server = getattr(app.state, "server", None)
+    if server is not None:
+        # 直接运行 app.py 时持有 uvicorn.Server，设置退出标志即可
+        server.should_exit = True
+    elif multiprocessing.parent_process() is not None:
+        # --reload 或多进程模式下当前进程由uvicorn主进程派生，
+        # 只结束当前进程会被重启或残留其他进程，需通知主进程整体退出
+        os.kill(os.getppid(), signal.SIGTERM)
+    else:
+        os.kill(os.getpid(), signal.SIGTERM)
+
 # 错误处理中间件
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     """全局异常处理"""
-    app_logger.error(f"未处理的异常: {exc}")
+    app_logger.error("未处理的异常: %s", exc, exc_info=exc)
     return create_response(
         success=False,
         message="服务器内部错误"
@@ -923,10 +1262,21 @@ async def global_exception_handler(request: Request, exc: Exception):
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(
-        "app:app",
+    # 上传会话和同步任务保存在进程内存中，默认单进程；
+    # 多进程部署（WORKERS>1）时需由负载均衡保证同一用户的请求落在同一进程
+    workers = int(os.getenv("WORKERS", "1"))
+    reload = os.getenv("DEV") == "1"
+    server_options = dict(
         host="0.0.0.0",
         port=8000,
-        reload=True,
-        log_level="info"
-    ) 
\ No newline at end of file
+        loop="auto",  # 已安装uvloop时自动使用
+        http="auto",  # 已安装httptools时自动使用
+        log_level=os.getenv("LOG_LEVEL", "info")
+    )
+    if workers > 1 or reload:
+        uvicorn.run("app:app", workers=workers, reload=reload, **server_options)
+    else:
+        # 单进程时自行创建Server，关闭接口通过 should_exit 通知退出
+        server = uvicorn.Server(uvicorn.Config(app, **server_options))
+        app.state.server = server
+        server.run()
@@ -7,13 +7,21 @@ import asyncio
 import json
 import logging
 import os
+import time
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Dict, List, Optional, Any
 import pickle
 
+import orjson
+
+from .feishu_client import shared_feishu_client
+
 logger = logging.getLogger(__name__)
 
+# 增量日志超过完整缓存文件大小的该比例时，合并写回完整缓存文件
+DELTA_COMPACT_RATIO = 0.2
+
 
 class StudentCacheManager:
     """学员缓存管理器"""
@@ -27,12 +35,23 @@ class StudentCacheManager:
             ttl_hours: 缓存有效期（小时）
         """
         self.cache_dir = Path(cache_dir)
-        self.cache_file = self.cache_dir / "students_cache.pkl"
+        # 飞书记录本身就是JSON结构，使用orjson序列化比pickle更快、文件更小
+        self.cache_file = self.cache_dir / "students_cache.json"
+        # 旧版本使用的pickle缓存文件，首次加载时自动迁移
+        self.legacy_cache_file = self.cache_dir / "students_cache.pkl"
+        # 增量日志：每行一条更新过的学员记录，加载时在完整缓存之上回放
+        self.delta_file = self.cache_dir / "students_cache.delta.jsonl"
         self.meta_file = self.cache_dir / "cache_meta.json"
         self.ttl_hours = ttl_hours
+        # 后台刷新任务，同一时间只允许一个
+        self._refresh_task: Optional[asyncio.Task] = None
+        # 串行化缓存文件写入，避免完整保存与增量追加在不同线程中同时写同一批文件
+        self._save_lock = asyncio.Lock()
 
         # 内存缓存
         self.cache: Dict[str, Dict] = {}  # user_id -> record 映射
+        # 尚未写入文件的学员更新，user_id -> record
+        self._pending_updates: Dict[str, Dict] = {}
         self.is_loaded = False
         self.last_update: Optional[datetime] = None
         self.total_records = 0
@@ -63,53 +82,62 @@ class StudentCacheManager:
         """
         try:
             logger.info("开始加载学员数据到缓存...")
-            start_time = datetime.now()
-
-            all_students = []
-            page_token = None
-            page_count = 0
+            start_time = time.perf_counter()
 
-            # 分页获取所有记录
-            while True:
-                query_result = await feishu_client.query_records(
+            def fetch_page(page_token: Optional[str]) -> asyncio.Task:
+                return asyncio.create_task(feishu_client.query_records(
                     table_config.app_token,
                     table_config.table_id,
                     page_size=500,
                     page_token=page_token
-                )
+                ))
 
-                records = query_result.get("records", [])
-                all_students.extend(records)
-                page_count += 1
-
-                # 每10页记录一次进度
-                if page_count % 10 == 0:
-                    logger.info(f"缓存加载进度: 已加载 {len(all_students)} 条记录...")
-
-                # 检查是否有更多数据
-                if not query_result.get("has_more", False):
-                    break
-
-                page_token = query_result.get("page_token")
-                if not page_token:
-                    break
+            new_cache: Dict[str, Dict] = {}
+            total_records = 0
+            page_count = 0
 
-            # 构建缓存映射
-            self.cache.clear()
-            for record in all_students:
-                user_id = record.get("fields", {}).get("用户ID")
-                if user_id:
-                    self.cache[user_id] = record
+            # 分页获取所有记录：飞书只支持游标分页，拿到下一页的page_token后
+            # 先发起下一页请求，再处理当前页数据，让数据处理与网络等待重叠
+            next_page = fetch_page(None)
+            try:
+                while next_page:
+                    query_result = await next_page
+                    next_page = None
+                    page_count += 1
+
+                    # 检查是否有更多数据
+                    page_token = query_result.get("page_token")
+                    if query_result.get("has_more", False) and page_token:
+                        next_page = fetch_page(page_token)
+
+                    # 构建缓存映射
+                    records = query_result.get("records") or []
+                    total_records += len(records)
+                    new_cache.update({
+                        user_id: record
+                        for record in records
+                        if (fields := record.get("fields")) and (user_id := fields.get("用户ID"))
+                    })
+
+                    # 每10页记录一次进度
+                    if page_count % 10 == 0:
+                        logger.info(f"缓存加载进度: 已加载 {total_records} 条记录...")
+            finally:
+                if next_page and not next_page.done():
+                    next_page.cancel()
+
+            # 全部加载成功后再替换缓存，加载失败时保留原有缓存
+            self.cache = new_cache
 
             # 更新元数据
             self.is_loaded = True
             self.last_update = datetime.now()
-            self.total_records = len(all_students)
+            self.total_records = total_records
 
             # 保存到文件
             await self._save_to_file()
 
-            elapsed_time = (datetime.now() - start_time).total_seconds()
+            elapsed_time = time.perf_counter() - start_time
             logger.info(
                 f"缓存加载完成: {self.total_records} 条记录, "
                 f"{len(self.cache)} 个唯一用户, 耗时 {elapsed_time:.2f} 秒"
@@ -129,22 +157,16 @@ class StudentCacheManager:
             是否加载成功
         """
         try:
-            # 检查缓存文件是否存在
-            if not self.cache_file.exists() or not self.meta_file.exists():
+            # 文件读取和解析放到线程中执行，避免大缓存文件阻塞事件循环
+            loaded = await asyncio.to_thread(self._read_cache_files)
+            if loaded is None:
                 logger.info("缓存文件不存在")
                 return False
-
-            # 读取元数据
-            with open(self.meta_file, 'r', encoding='utf-8') as f:
-                meta = json.load(f)
+            meta, self.cache, has_cache_file = loaded
 
             # 不再检查过期，直接加载缓存数据
             last_update = datetime.fromisoformat(meta['last_update'])
 
-            # 加载缓存数据
-            with open(self.cache_file, 'rb') as f:
-                self.cache = pickle.load(f)
-
             # 更新元数据
             self.is_loaded = True
             self.last_update = last_update
@@ -155,28 +177,117 @@ class StudentCacheManager:
                 f"{len(self.cache)} 个唯一用户"
             )
 
+            if not has_cache_file:
+                # 旧版pickle缓存转存为JSON格式
+                await self._save_to_file()
+                if self.cache_file.exists():
+                    self.legacy_cache_file.unlink()
+                    logger.info("旧版缓存文件已迁移为JSON格式")
+
             return True
 
         except Exception as e:
             logger.error(f"从文件加载缓存失败: {e}")
             return False
 
+    def _read_cache_files(self):
+        """
+        读取缓存文件和元数据文件（同步执行，供线程调用）
+
+        Returns:
+            (元数据, 缓存数据, 是否为JSON格式缓存)，缓存文件不存在时返回None
+        """
+        has_cache_file = self.cache_file.exists()
+        if not self.meta_file.exists() or not (has_cache_file or self.legacy_cache_file.exists()):
+            return None
+
+        # 读取元数据
+        with open(self.meta_file, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+
+        # 加载缓存数据
+        if has_cache_file:
+            with open(self.cache_file, 'rb') as f:
+                cache = orjson.loads(f.read())
+        else:
+            with open(self.legacy_cache_file, 'rb') as f:
+                cache = pickle.load(f)
+
+        # 回放增量日志，后写入的记录覆盖先前的记录
+        if self.delta_file.exists():
+            with open(self.delta_file, 'rb') as f:
+                for line in f:
+                    try:
+                        delta = orjson.loads(line)
+                    except orjson.JSONDecodeError:
+                        # 写入中断留下的不完整行，跳过
+                        logger.warning("缓存增量日志中存在无法解析的行，已跳过")
+                        continue
+                    cache[delta['user_id']] = delta['record']
+
+        return meta, cache, has_cache_file
+
+    def _write_meta_file(self, meta: Dict[str, Any]):
+        """写入元数据文件"""
+        with open(self.meta_file, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    def _write_cache_files(self, cache: Dict[str, Dict], meta: Dict[str, Any]):
+        """序列化并写入缓存文件和元数据文件（同步执行，供线程调用）"""
+        # 保存缓存数据
+        with open(self.cache_file, 'wb') as f:
+            f.write(orjson.dumps(cache))
+
+        self._write_meta_file(meta)
+
+        # 完整缓存文件已包含所有更新，增量日志不再需要
+        self.delta_file.unlink(missing_ok=True)
+
+    def _append_cache_updates(self, updates: Dict[str, Dict], meta: Dict[str, Any]) -> bool:
+        """
+        把学员更新追加到增量日志（同步执行，供线程调用）
+
+        Args:
+            updates: 更新过的学员记录
+            meta: 元数据
+
+        Returns:
+            是否需要重新写入完整缓存文件
+        """
+        # 还没有完整缓存文件时无法追加，由调用方写入完整缓存
+        if not self.cache_file.exists():
+            return True
+
+        with open(self.delta_file, 'ab') as f:
+            f.write(b"".join(
+                orjson.dumps({'user_id': user_id, 'record': record}) + b"\n"
+                for user_id, record in updates.items()
+            ))
+        self._write_meta_file(meta)
+
+        # 增量日志过大时需要合并回完整缓存文件，避免加载时回放过多记录
+        return self.delta_file.stat().st_size > DELTA_COMPACT_RATIO * self.cache_file.stat().st_size
+
+    def _build_meta(self) -> Dict[str, Any]:
+        """生成元数据"""
+        return {
+            'last_update': self.last_update.isoformat(),
+            'total_records': self.total_records,
+            'unique_users': len(self.cache)
+        }
+
     async def _save_to_file(self):
         """保存缓存到文件"""
         try:
-            # 保存缓存数据
-            with open(self.cache_file, 'wb') as f:
-                pickle.dump(self.cache, f)
-
-            # 保存元数据
-            meta = {
-                'last_update': self.last_update.isoformat(),
-                'total_records': self.total_records,
-                'unique_users': len(self.cache)
-            }
+            async with self._save_lock:
+                # 完整缓存已包含所有待写入的更新
+                self._pending_updates = {}
+                # 在事件循环中复制一份快照（只复制字典本身），写文件期间缓存被修改也不影响本次写入
+                snapshot = dict(self.cache)
+                meta = self._build_meta()
 
-            with open(self.meta_file, 'w', encoding='utf-8') as f:
-                json.dump(meta, f, ensure_ascii=False, indent=2)
+                # 序列化和写文件放到线程中执行，避免阻塞事件循环
+                await asyncio.to_thread(self._write_cache_files, snapshot, meta)
 
             logger.info("缓存已保存到文件")
 
@@ -203,14 +314,11 @@ class StudentCacheManager:
             user_ids: 用户ID列表
 
         Returns:
-            找到的学员记录列表
+            找到的学员记录列表（顺序不保证与user_ids一致）
         """
-        result = []
-        for user_id in user_ids:
-            student = self.cache.get(user_id)
-            if student:
-                result.append(student)
-        return result
+        # 先在C层对缓存的键与请求的用户ID求交集，新用户居多时未命中的查找不再逐个经过Python循环
+        cache = self.cache
+        return [cache[user_id] for user_id in cache.keys() & user_ids]
 
     def update_student(self, user_id: str, record: Dict):
         """
@@ -221,8 +329,9 @@ class StudentCacheManager:
             record: 学员记录
         """
         self.cache[user_id] = record
+        self._pending_updates[user_id] = record
         self.last_update = datetime.now()
-        logger.debug(f"更新缓存: 用户 {user_id}")
+        logger.debug("更新缓存: 用户 %s", user_id)
 
     def add_student(self, user_id: str, record: Dict):
         """
@@ -233,17 +342,33 @@ class StudentCacheManager:
             record: 学员记录
         """
         self.cache[user_id] = record
+        self._pending_updates[user_id] = record
         self.total_records += 1
         self.last_update = datetime.now()
-        logger.debug(f"添加到缓存: 新用户 {user_id}")
+        logger.debug("添加到缓存: 新用户 %s", user_id)
 
     async def save_cache_updates(self):
         """
-        保存缓存更新到文件
+        保存缓存更新到文件：只把更新过的学员追加到增量日志，不重写整个缓存文件
         """
-        if self.is_loaded:
+        async with self._save_lock:
+            if not self.is_loaded or not self._pending_updates:
+                return
+
+            updates, self._pending_updates = self._pending_updates, {}
+            try:
+                needs_full_save = await asyncio.to_thread(self._append_cache_updates, updates, self._build_meta())
+            except Exception as e:
+                # 写入失败的更新留待下次保存，期间新的更新优先
+                self._pending_updates = updates | self._pending_updates
+                logger.error(f"保存缓存更新失败: {e}")
+                return
+
+        if needs_full_save:
             await self._save_to_file()
-            logger.info("缓存更新已保存到文件")
+            logger.info("缓存增量日志已合并到缓存文件")
+        else:
+            logger.info(f"缓存更新已保存到文件: {len(updates)} 个学员")
 
     def is_cache_valid(self) -> bool:
         """
@@ -286,20 +411,41 @@ class StudentCacheManager:
         Returns:
             是否成功加载
         """
-        # 如果缓存已经有效，直接返回
-        if self.is_cache_valid():
-            return True
-
-        # 尝试从文件加载
-        if await self.load_from_file():
+        # 如果缓存已经有效，直接返回；超过有效期的缓存照常使用，同时在后台刷新
+        if self.is_cache_valid() or await self.load_from_file():
+            self._schedule_refresh_if_stale(feishu_client, table_config)
             return True
 
         # 从API加载
         return await self.load_all_students(feishu_client, table_config)
 
+    def _schedule_refresh_if_stale(self, feishu_client, table_config):
+        """缓存超过有效期时启动后台刷新（已有刷新任务时不重复启动）"""
+        if not self.last_update or self._refresh_task is not None:
+            return
+        age_hours = (datetime.now() - self.last_update).total_seconds() / 3600
+        if age_hours <= self.ttl_hours:
+            return
+        logger.info(f"缓存已超过有效期（{age_hours:.0f}小时前更新），后台刷新中，当前继续使用旧缓存")
+        self._refresh_task = asyncio.create_task(
+            self._background_refresh(feishu_client.config, table_config)
+        )
+
+    async def _background_refresh(self, config, table_config):
+        """后台从API重新加载缓存"""
+        try:
+            # 调用方的请求可能已结束，后台刷新时重新获取共享客户端
+            async with shared_feishu_client(config) as feishu_client:
+                await self.load_all_students(feishu_client, table_config)
+        except Exception as e:
+            logger.error(f"后台刷新缓存失败: {e}")
+        finally:
+            self._refresh_task = None
+
     def clear_cache(self):
         """清空缓存"""
         self.cache.clear()
+        self._pending_updates.clear()
         self.is_loaded = False
         self.last_update = None
         self.total_records = 0
@@ -307,6 +453,9 @@ class StudentCacheManager:
         # 删除缓存文件
         if self.cache_file.exists():
             self.cache_file.unlink()
+        if self.legacy_cache_file.exists():
+            self.legacy_cache_file.unlink()
+        self.delta_file.unlink(missing_ok=True)
         if self.meta_file.exists():
             self.meta_file.unlink()
 
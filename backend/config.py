@@ -1,8 +1,8 @@
 import os
 import json
 import logging
-from typing import Dict, List, Optional
-from pydantic import BaseModel, validator
+from typing import Dict, List, Optional, Tuple
+from pydantic import BaseModel, Field, field_validator
 from dotenv import load_dotenv
 
 # 加载环境变量
@@ -10,6 +10,11 @@ load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# 不对外暴露、不写入配置文件的敏感字段
+SENSITIVE_FIELDS = {'feishu_app_id', 'feishu_app_secret'}
+# 允许通过接口返回的配置字段（白名单，新增字段默认不对外暴露）
+PUBLIC_CONFIG_FIELDS = {'student_table', 'learning_record_table'}
+
 class FieldMapping(BaseModel):
     """字段映射配置"""
     text_field: Optional[str] = None
@@ -26,7 +31,8 @@ class TableConfig(BaseModel):
     table_id: str
     field_mapping: FieldMapping
     
-    @validator('app_token', 'table_id')
+    @field_validator('app_token', 'table_id')
+    @classmethod
     def validate_not_empty(cls, v):
         if not v or not v.strip():
             raise ValueError('app_token和table_id不能为空')
@@ -38,8 +44,10 @@ class AppConfig(BaseModel):
     feishu_app_secret: str
     student_table: TableConfig  # 学员总表
     learning_record_table: TableConfig  # 学习记录表
+    write_concurrency: int = Field(default=5, ge=1, le=50)  # 同时向飞书发起的写入请求数上限
     
-    @validator('feishu_app_id', 'feishu_app_secret')
+    @field_validator('feishu_app_id', 'feishu_app_secret')
+    @classmethod
     def validate_credentials(cls, v):
         if not v or not v.strip():
             raise ValueError('飞书应用凭证不能为空')
@@ -51,6 +59,10 @@ class ConfigManager:
     def __init__(self, config_file: str = "config/config.json"):
         self.config_file = config_file
         self._config: Optional[AppConfig] = None
+        # 配置版本号，每次重新加载配置时递增
+        self._config_version = 0
+        # 配置验证结果缓存：(配置版本号, 已验证的配置对象, 验证结果)
+        self._validation_cache: Optional[Tuple[int, AppConfig, Dict]] = None
     
     def load_config(self) -> AppConfig:
         """加载配置"""
@@ -66,7 +78,13 @@ class ConfigManager:
             config_data['feishu_app_id'] = feishu_app_id or config_data.get('feishu_app_id', '')
             config_data['feishu_app_secret'] = feishu_app_secret or config_data.get('feishu_app_secret', '')
             
+            # 写入并发数可通过环境变量调整，便于按飞书应用的频率限制配置
+            write_concurrency = self._parse_write_concurrency(os.getenv('FEISHU_WRITE_CONCURRENCY', ''))
+            if write_concurrency is not None:
+                config_data['write_concurrency'] = write_concurrency
+            
             self._config = AppConfig(**config_data)
+            self._config_version += 1
             logger.info("配置加载成功")
             return self._config
             
@@ -74,6 +92,22 @@ class ConfigManager:
             logger.error(f"配置加载失败: {e}")
             raise
     
+    @staticmethod
+    def _parse_write_concurrency(value: str) -> Optional[int]:
+        """解析环境变量中的写入并发数，无效时忽略，超出范围时限制在1-50之间"""
+        value = value.strip()
+        if not value:
+            return None
+        try:
+            write_concurrency = int(value)
+        except ValueError:
+            logger.warning(f"FEISHU_WRITE_CONCURRENCY={value!r} 不是整数，已忽略")
+            return None
+        clamped = min(max(write_concurrency, 1), 50)
+        if clamped != write_concurrency:
+            logger.warning(f"FEISHU_WRITE_CONCURRENCY={write_concurrency} 超出范围1-50，已调整为{clamped}")
+        return clamped
+    
     def _load_json_config(self) -> Dict:
         """从JSON文件加载配置"""
         try:
@@ -124,9 +158,8 @@ class ConfigManager:
             os.makedirs(os.path.dirname(self.config_file), exist_ok=True)
             
             # 转换为字典（不包含敏感信息）
-            config_dict = config.dict()
-            config_dict['feishu_app_id'] = ''  # 不保存敏感信息到文件
-            config_dict['feishu_app_secret'] = ''
+            config_dict = config.model_dump(exclude=SENSITIVE_FIELDS)
+            config_dict.update({field: '' for field in SENSITIVE_FIELDS})  # 不保存敏感信息到文件
             
             with open(self.config_file, 'w', encoding='utf-8') as f:
                 json.dump(config_dict, f, indent=2, ensure_ascii=False)
@@ -137,7 +170,11 @@ class ConfigManager:
             raise
     
     def validate_config(self, config: AppConfig) -> Dict:
-        """验证配置"""
+        """验证配置（同一配置对象只验证一次，重新加载配置后失效）"""
+        cache = self._validation_cache
+        if cache and cache[0] == self._config_version and cache[1] is config:
+            return cache[2]
+
         errors = []
         warnings = []
         
@@ -164,16 +201,23 @@ class ConfigManager:
             if not any([mapping.text_field, mapping.image_field]):
                 warnings.append(f"{table_name}建议配置至少一个内容字段")
         
-        return {
+        result = {
             "valid": len(errors) == 0,
             "errors": errors,
             "warnings": warnings
         }
+        self._validation_cache = (self._config_version, config, result)
+        return result
     
     @property
     def config(self) -> Optional[AppConfig]:
         """获取当前配置"""
         return self._config
+    
+    @property
+    def config_version(self) -> int:
+        """获取配置版本号，可用于判断依赖配置的缓存是否失效"""
+        return self._config_version
 
 # 全局配置管理器实例
 config_manager = ConfigManager() 
\ No newline at end of file
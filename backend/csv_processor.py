@@ -1,16 +1,50 @@
 import csv
 import io
+import codecs
 import logging
 import re
-from typing import List, Dict, Any, Optional, Set
+from typing import List, Dict, Any, Optional, Set, Tuple, Union, BinaryIO, Iterator
 from datetime import datetime
 import pandas as pd
-from pydantic import BaseModel, validator
+from pydantic import BaseModel, ValidationInfo, field_validator
 
 from .utils import validate_csv_headers, ProcessLogger
 
 logger = logging.getLogger(__name__)
 
+# 分块检测编码时每次读取的字节数
+ENCODING_DETECT_CHUNK_SIZE = 64 * 1024
+
+# 示例CSV文件的表头和示例数据
+SAMPLE_CSV_ROWS = (
+    ("用户ID", "昵称", "手机号", "课程", "学习日期"),
+    ("001", "张三", "13800138000", "NVC基础课程", "2024-01-15"),
+    ("002", "李四", "13800138001", "NVC进阶课程", "2024-01-16"),
+    ("001", "张三", "13800138000", "NVC进阶课程", "2024-01-20"),
+    ("003", "王五", "13800138002", "NVC基础课程", "2024-01-18"),
+)
+# 生成过的示例CSV文本
+_sample_csv_text: Optional[str] = None
+
+# 依次尝试的候选编码。gb2312 是 gbk 的子集，带BOM的utf-8也能按utf-8解码，
+# 前两者都解码失败时后两者必然也失败，因此只需尝试utf-8和gbk
+CANDIDATE_ENCODINGS = ('utf-8', 'gbk')
+
+# 文件开头的BOM及其对应编码，命中时无需逐个尝试候选编码
+BOM_ENCODINGS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+def read_file_content(file_content: Union[bytes, BinaryIO]) -> bytes:
+    """读取文件内容，支持bytes或已打开的二进制文件句柄"""
+    if isinstance(file_content, (bytes, bytearray)):
+        return bytes(file_content)
+    # 文件句柄：每次从头读取，便于上传验证和同步阶段重复使用
+    file_content.seek(0)
+    return file_content.read()
+
 class StudentRecord(BaseModel):
     """学员记录模型"""
     user_id: str
@@ -19,30 +53,37 @@ class StudentRecord(BaseModel):
     course: Optional[str] = None  # 改为可选
     learning_date: Optional[str] = None  # 改为可选
     
-    @validator('user_id')
+    @field_validator('user_id')
+    @classmethod
     def validate_user_id(cls, v):
         if not v or not v.strip():
             raise ValueError('用户ID不能为空')
         return v.strip()
     
-    @validator('nickname')
+    @field_validator('nickname')
+    @classmethod
     def validate_nickname(cls, v):
         if not v or not v.strip():
             raise ValueError('昵称不能为空')
         return v.strip()
     
-    @validator('course')
+    @field_validator('course')
+    @classmethod
     def validate_course(cls, v):
         if v and not v.strip():
             raise ValueError('课程名称不能为空字符串')
         return v.strip() if v else "基础信息导入"  # 提供默认值
     
-    @validator('learning_date')
-    def validate_learning_date(cls, v):
+    @field_validator('learning_date')
+    @classmethod
+    def validate_learning_date(cls, v, info: ValidationInfo):
         if v and not v.strip():
             raise ValueError('学习日期不能为空字符串')
-        # 如果没有提供学习日期，使用当前日期
-        return v.strip() if v else datetime.now().strftime("%Y-%m-%d")
+        if v:
+            return v.strip()
+        # 如果没有提供学习日期，使用当前日期；批量验证时由调用方通过context传入，避免逐行计算
+        today = (info.context or {}).get('today')
+        return today or datetime.now().strftime("%Y-%m-%d")
 
 class CSVProcessor:
     """CSV处理器"""
@@ -56,8 +97,16 @@ class CSVProcessor:
         'learning_date': ['学习日期', 'learning_date', 'Learning Date', '报名日期', 'register_date', '日期', 'date']
     }
     
+    # 原始CSV记录中可能的用户ID列名，按优先级排列
+    RAW_USER_ID_FIELDS = ['用户ID', 'user_id', 'User ID', 'UserID']
+    
     def __init__(self, field_mapping: Optional[Dict[str, List[str]]] = None):
         self.field_mapping = field_mapping or self.DEFAULT_FIELD_MAPPING
+        # CSV列名 -> 标准字段名的反向索引，映射字段时每个列名只需一次字典查找
+        self.alias_to_standard: Dict[str, str] = {}
+        for standard_field, possible_names in self.field_mapping.items():
+            for name in possible_names:
+                self.alias_to_standard.setdefault(name, standard_field)
         self.process_logger = ProcessLogger("CSV处理")
 
     def clean_field_value(self, value: Any) -> str:
@@ -79,61 +128,99 @@ class CSVProcessor:
 
         return cleaned
     
+    def clean_dataframe(self, df: pd.DataFrame) -> pd.DataFrame:
+        """按列批量清理所有字段值，结果与逐个调用 clean_field_value 相同"""
+        # 转为Python对象后再转字符串，数值的格式与 str(value) 保持一致；空值统一为空字符串
+        values = df.astype(object)
+        values = values.where(values.notna(), "").astype(str)
+        
+        for column in values.columns:
+            values[column] = (
+                values[column]
+                .str.replace(r'[\t\n\r\f\v]', '', regex=True)
+                .str.strip()
+                .str.replace(r'\s+', ' ', regex=True)
+            )
+        return values
+    
     def detect_encoding(self, file_content: bytes) -> str:
         """检测文件编码"""
-        encodings = ['utf-8', 'gbk', 'gb2312', 'utf-8-sig']
+        # 分块解码，避免每个候选编码都生成一份完整的解码字符串
+        return self.detect_stream_encoding(io.BytesIO(file_content))
+    
+    def detect_stream_encoding(self, file_obj: BinaryIO) -> str:
+        """分块检测文件句柄的编码，不需要把整个文件读入内存"""
+        file_obj.seek(0)
+        head = file_obj.read(3)
+        for bom, encoding in BOM_ENCODINGS:
+            if head.startswith(bom):
+                logger.info(f"根据BOM检测到文件编码: {encoding}")
+                return encoding
         
-        for encoding in encodings:
+        for encoding in CANDIDATE_ENCODINGS:
+            file_obj.seek(0)
+            decoder = codecs.getincrementaldecoder(encoding)()
             try:
-                file_content.decode(encoding)
-                logger.info(f"检测到文件编码: {encoding}")
-                return encoding
+                while chunk := file_obj.read(ENCODING_DETECT_CHUNK_SIZE):
+                    decoder.decode(chunk)
+                decoder.decode(b'', final=True)
             except UnicodeDecodeError:
                 continue
+            logger.info(f"检测到文件编码: {encoding}")
+            return encoding
         
         # 如果都不行，默认使用utf-8
         logger.warning("无法检测文件编码，使用默认编码utf-8")
         return 'utf-8'
     
-    def parse_csv_content(self, file_content: bytes, filename: str) -> List[Dict[str, Any]]:
-        """解析CSV文件内容"""
+    def parse_csv_content(
+        self,
+        file_content: Union[bytes, BinaryIO],
+        filename: str,
+        encoding: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        解析CSV文件内容
+        
+        Args:
+            file_content: 文件内容，或已打开的二进制文件句柄（直接从句柄流式读取，不再整体读入内存）
+            filename: 文件名
+            encoding: 已知的文件编码（如上传验证时已检测过），为空时重新检测
+        """
         self.process_logger.start(f"解析CSV文件: {filename}")
         
         try:
-            # 检测编码
-            encoding = self.detect_encoding(file_content)
+            if isinstance(file_content, (bytes, bytearray)):
+                file_content = io.BytesIO(file_content)
             
-            # 解码文件内容
-            try:
-                text_content = file_content.decode(encoding)
-            except UnicodeDecodeError as e:
-                logger.error(f"文件解码失败: {e}")
-                raise ValueError(f"文件编码错误，无法解析: {e}")
+            # 检测编码
+            if not encoding:
+                encoding = self.detect_stream_encoding(file_content)
             
-            # 使用pandas读取CSV
+            # 使用pandas的C解析器从文件句柄分块读取并按检测到的编码解码，
+            # 不需要先把整个文件读成bytes或解码成字符串；
+            # 上传文件不超过10MB，关闭low_memory整体推断列类型，省去分段推断再合并的开销，
+            # 同一列也不会因分段推断结果不同而混杂数字和字符串
             try:
-                df = pd.read_csv(io.StringIO(text_content))
+                file_content.seek(0)
+                df = pd.read_csv(file_content, encoding=encoding, engine='c', low_memory=False)
                 self.process_logger.step(f"成功读取CSV文件，共{len(df)}行数据")
                 
-                # 转换为字典列表
-                records = df.to_dict('records')
-                
-                # 清理数据
+                # 按列批量清理数据（规则与 clean_field_value 一致），再转换为字典列表
+                df = self.clean_dataframe(df)
                 cleaned_records = []
-                for record in records:
-                    # 移除空值和NaN，并彻底清理字段值
-                    cleaned_record = {}
-                    for key, value in record.items():
-                        cleaned_value = self.clean_field_value(value)
-                        if cleaned_value:  # 只保留有内容的字段
-                            cleaned_record[key] = cleaned_value
-
+                for record in df.to_dict('records'):
+                    # 只保留有内容的字段
+                    cleaned_record = {key: value for key, value in record.items() if value}
                     if cleaned_record:  # 只保留非空记录
                         cleaned_records.append(cleaned_record)
                 
                 self.process_logger.step(f"数据清理完成，有效记录: {len(cleaned_records)}行")
                 return cleaned_records
                 
+            except UnicodeDecodeError as e:
+                logger.error(f"文件解码失败: {e}")
+                raise ValueError(f"文件编码错误，无法解析: {e}")
             except Exception as e:
                 logger.error(f"CSV解析失败: {e}")
                 raise ValueError(f"CSV文件格式错误: {e}")
@@ -142,45 +229,51 @@ class CSVProcessor:
             self.process_logger.error(f"CSV解析失败: {e}")
             raise
     
-    def map_fields(self, raw_records: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """映射字段名称"""
-        if not raw_records:
-            return {"mapped_records": [], "field_mapping": {}, "missing_fields": []}
+    def build_field_map(self, csv_headers: List[str]) -> Tuple[Dict[str, str], List[str]]:
+        """
+        根据CSV列名建立标准字段映射
         
-        # 获取CSV文件的字段名
-        csv_headers = list(raw_records[0].keys())
-        logger.info(f"CSV文件字段: {csv_headers}")
+        Args:
+            csv_headers: CSV文件的列名
         
-        # 建立字段映射
-        field_map = {}
-        missing_fields = []
+        Returns:
+            (标准字段 -> CSV列名, 缺少的标准字段)
+        """
+        logger.info(f"CSV文件字段: {csv_headers}")
         
-        for standard_field, possible_names in self.field_mapping.items():
-            found = False
-            for csv_header in csv_headers:
-                if csv_header in possible_names:
-                    field_map[standard_field] = csv_header
-                    found = True
-                    break
-            
-            if not found:
-                missing_fields.append(standard_field)
+        # 建立字段映射：每个标准字段取CSV中第一个匹配的列，并按标准字段的顺序排列
+        matched = {}
+        for csv_header in csv_headers:
+            standard_field = self.alias_to_standard.get(csv_header)
+            if standard_field:
+                matched.setdefault(standard_field, csv_header)
+        field_map = {field: matched[field] for field in self.field_mapping if field in matched}
+        missing_fields = [field for field in self.field_mapping if field not in matched]
         
         logger.info(f"字段映射: {field_map}")
         
         if missing_fields:
             logger.warning(f"缺少字段: {missing_fields}")
         
-        # 映射数据
-        mapped_records = []
-        for record in raw_records:
-            mapped_record = {}
-            for standard_field, csv_field in field_map.items():
-                if csv_field in record:
-                    mapped_record[standard_field] = record[csv_field]
-            
-            if mapped_record:
-                mapped_records.append(mapped_record)
+        return field_map, missing_fields
+    
+    def map_fields(self, raw_records: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """映射字段名称"""
+        if not raw_records:
+            return {"mapped_records": [], "field_mapping": {}, "missing_fields": []}
+        
+        # 获取CSV文件的字段名
+        field_map, missing_fields = self.build_field_map(list(raw_records[0].keys()))
+        
+        # 映射数据，丢弃没有任何映射字段的记录
+        mapped_records = [
+            mapped_record for record in raw_records
+            if (mapped_record := {
+                standard_field: record[csv_field]
+                for standard_field, csv_field in field_map.items()
+                if csv_field in record
+            })
+        ]
         
         return {
             "mapped_records": mapped_records,
@@ -188,17 +281,72 @@ class CSVProcessor:
             "missing_fields": missing_fields
         }
     
+    def _normalize_valid_record(self, record: Dict[str, Any], today: str) -> Optional[Dict[str, Any]]:
+        """
+        快速校验并规范化常见的合法记录，结果与 StudentRecord 校验后导出的字典一致
+        
+        Args:
+            record: 映射后的记录
+            today: 未提供学习日期时使用的默认日期
+        
+        Returns:
+            规范化后的记录；无法直接判定为合法时返回None，交给 StudentRecord 校验并生成错误信息
+        """
+        user_id = record.get('user_id')
+        nickname = record.get('nickname')
+        if type(user_id) is not str or type(nickname) is not str:
+            return None
+        user_id = user_id.strip()
+        nickname = nickname.strip()
+        if not user_id or not nickname:
+            return None
+        
+        phone = record.get('phone')
+        if phone is not None and type(phone) is not str:
+            return None
+        
+        normalized = {'user_id': user_id, 'nickname': nickname, 'phone': phone}
+        # 与模型一致：字段缺失时保持None，字段存在但为空时使用默认值
+        for field, default in (('course', "基础信息导入"), ('learning_date', today)):
+            if field not in record:
+                normalized[field] = None
+                continue
+            value = record[field]
+            if value is None or value == "":
+                normalized[field] = default
+            elif type(value) is str and value.strip():
+                normalized[field] = value.strip()
+            else:
+                return None
+        return normalized
+    
+    def validate_record(self, record: Dict[str, Any], today: str) -> Dict[str, Any]:
+        """
+        验证单条记录
+        
+        Args:
+            record: 映射后的记录
+            today: 未提供学习日期时使用的默认日期
+        
+        Returns:
+            规范化后的记录，验证失败时抛出异常
+        """
+        normalized = self._normalize_valid_record(record, today)
+        if normalized is not None:
+            return normalized
+        # 快速路径无法判定的记录使用Pydantic模型验证
+        return StudentRecord.model_validate(record, context={'today': today}).model_dump()
+    
     def validate_records(self, records: List[Dict[str, Any]]) -> Dict[str, Any]:
         """验证记录数据"""
         valid_records = []
         invalid_records = []
+        # 默认学习日期每批只计算一次
+        today = datetime.now().strftime("%Y-%m-%d")
         
         for i, record in enumerate(records):
             try:
-                # 使用Pydantic模型验证
-                student_record = StudentRecord(**record)
-                valid_records.append(student_record.dict())
-                
+                valid_records.append(self.validate_record(record, today))
             except Exception as e:
                 logger.warning(f"第{i+1}行数据验证失败: {e}")
                 invalid_records.append({
@@ -238,12 +386,10 @@ class CSVProcessor:
                 if existing['nickname'] != record['nickname']:
                     logger.warning(f"用户{user_id}的昵称不一致: {existing['nickname']} vs {record['nickname']}")
                 
-                # 合并所有字段，新数据优先
-                existing_csv_fields = existing.get('csv_all_fields', {})
-                for key, value in record.items():
-                    if value and (not existing_csv_fields.get(key) or existing_csv_fields[key] != value):
-                        existing_csv_fields[key] = value
-                existing['csv_all_fields'] = existing_csv_fields
+                # 合并所有字段，新数据中的非空值优先；生成新字典，不修改传入的记录
+                existing['csv_all_fields'] = existing.get('csv_all_fields', {}) | {
+                    key: value for key, value in record.items() if value
+                }
         
         logger.info(f"提取到{len(unique_students)}个唯一学员")
         return unique_students
@@ -252,30 +398,31 @@ class CSVProcessor:
         """提取唯一学员信息，同时传入原始记录以保留所有字段"""
         unique_students = {}
         
-        # 构建原始记录的用户ID映射
+        # 用户ID列只确定一次（空值已在清理时去掉，取第一个包含该列的记录判断）
+        user_id_field = next(
+            (field for field in self.RAW_USER_ID_FIELDS if any(field in raw_record for raw_record in raw_records)),
+            None
+        )
+        
+        # 构建原始记录的用户ID映射：每个用户只保存第一条原始记录，
+        # 重复出现的原始记录单独存放，只在需要合并时使用
         raw_records_map = {}
-        for raw_record in raw_records:
-            # 查找原始记录中的用户ID字段
-            user_id_field = None
-            for field_name in ['用户ID', 'user_id', 'User ID', 'UserID']:
-                if field_name in raw_record:
-                    user_id_field = field_name
-                    break
-            
-            if user_id_field and raw_record[user_id_field]:
-                user_id = raw_record[user_id_field]
+        duplicate_raw_records = {}
+        if user_id_field:
+            for raw_record in raw_records:
+                user_id = raw_record.get(user_id_field)
+                if not user_id:
+                    continue
                 if user_id not in raw_records_map:
-                    raw_records_map[user_id] = []
-                raw_records_map[user_id].append(raw_record)
+                    raw_records_map[user_id] = raw_record
+                else:
+                    duplicate_raw_records.setdefault(user_id, []).append(raw_record)
         
         for record in valid_records:
             user_id = record['user_id']
             if user_id not in unique_students:
-                # 查找对应的原始记录
-                raw_record = {}
-                if user_id in raw_records_map:
-                    # 取第一个匹配的原始记录
-                    raw_record = raw_records_map[user_id][0]
+                # 取第一个匹配的原始记录
+                raw_record = raw_records_map.get(user_id, {})
                 
                 # 保留所有字段，不仅仅是核心字段
                 unique_students[user_id] = {
@@ -294,10 +441,11 @@ class CSVProcessor:
                 if existing['nickname'] != record['nickname']:
                     logger.warning(f"用户{user_id}的昵称不一致: {existing['nickname']} vs {record['nickname']}")
                 
-                # 合并原始记录字段
-                if user_id in raw_records_map:
+                # 合并其余原始记录中缺少的字段，每个用户只需合并一次
+                duplicates = duplicate_raw_records.pop(user_id, None)
+                if duplicates:
                     existing_csv_fields = existing.get('csv_all_fields', {})
-                    for raw_record in raw_records_map[user_id]:
+                    for raw_record in duplicates:
                         for key, value in raw_record.items():
                             if value and str(value).strip() and key not in existing_csv_fields:
                                 existing_csv_fields[key] = value
@@ -308,46 +456,67 @@ class CSVProcessor:
     
     def process_file(
         self, 
-        file_content: bytes, 
+        file_content: Union[bytes, BinaryIO], 
         filename: str,
         course_name: str = None,
-        learning_date: str = None
+        learning_date: str = None,
+        encoding: Optional[str] = None
     ) -> Dict[str, Any]:
         """处理CSV文件的主要方法"""
         try:
             self.process_logger.start(f"处理CSV文件: {filename}")
             
             # 1. 解析CSV内容
-            raw_records = self.parse_csv_content(file_content, filename)
+            raw_records = self.parse_csv_content(file_content, filename, encoding=encoding)
             
-            # 2. 映射字段
-            mapping_result = self.map_fields(raw_records)
-            mapped_records = mapping_result["mapped_records"]
-            field_mapping = mapping_result["field_mapping"]
-            missing_fields = mapping_result["missing_fields"]
+            # 2. 建立字段映射
+            if raw_records:
+                field_mapping, missing_fields = self.build_field_map(list(raw_records[0].keys()))
+            else:
+                field_mapping, missing_fields = {}, []
             
-            # 3. 应用手动输入的课程信息
-            if course_name or learning_date:
-                for record in mapped_records:
-                    if course_name:
-                        record['course'] = course_name
-                    if learning_date:
-                        record['learning_date'] = learning_date
+            # 手动输入的课程信息覆盖CSV中的值
+            overrides = {}
+            if course_name:
+                overrides['course'] = course_name
+            if learning_date:
+                overrides['learning_date'] = learning_date
             
-            # 4. 验证数据
-            validation_result = self.validate_records(mapped_records)
-            valid_records = validation_result["valid_records"]
-            invalid_records = validation_result["invalid_records"]
+            # 3. 逐行映射字段、应用课程信息并验证，一次遍历完成，不再生成中间的映射记录列表
+            valid_records = []
+            invalid_records = []
+            mapped_rows = 0
+            today = datetime.now().strftime("%Y-%m-%d")
+            for raw_record in raw_records:
+                record = {
+                    standard_field: raw_record[csv_field]
+                    for standard_field, csv_field in field_mapping.items()
+                    if csv_field in raw_record
+                }
+                if not record:
+                    continue
+                mapped_rows += 1
+                record.update(overrides)
+                
+                try:
+                    valid_records.append(self.validate_record(record, today))
+                except Exception as e:
+                    logger.warning(f"第{mapped_rows}行数据验证失败: {e}")
+                    invalid_records.append({
+                        "row": mapped_rows,
+                        "record": record,
+                        "error": str(e)
+                    })
             
-            # 5. 提取唯一学员 - 同时传入原始记录以保留所有字段
+            # 4. 提取唯一学员 - 同时传入原始记录以保留所有字段
             unique_students = self.extract_unique_students_with_raw_data(
                 valid_records, raw_records
             )
             
-            # 6. 统计信息
+            # 5. 统计信息
             stats = {
                 "total_rows": len(raw_records),
-                "mapped_rows": len(mapped_records),
+                "mapped_rows": mapped_rows,
                 "valid_rows": len(valid_records),
                 "invalid_rows": len(invalid_records),
                 "unique_students": len(unique_students),
@@ -377,39 +546,47 @@ class CSVProcessor:
                 "success": False,
                 "error": str(e)
             }
+        finally:
+            # 提前返回时也输出缓存的步骤日志
+            self.process_logger.flush()
     
-    def generate_sample_csv(self) -> str:
-        """生成示例CSV文件内容"""
-        sample_data = [
-            ["用户ID", "昵称", "手机号", "课程", "学习日期"],
-            ["001", "张三", "13800138000", "NVC基础课程", "2024-01-15"],
-            ["002", "李四", "13800138001", "NVC进阶课程", "2024-01-16"],
-            ["001", "张三", "13800138000", "NVC进阶课程", "2024-01-20"],
-            ["003", "王五", "13800138002", "NVC基础课程", "2024-01-18"]
-        ]
-        
+    def iter_sample_csv(self) -> Iterator[str]:
+        """逐行生成示例CSV文件内容"""
         output = io.StringIO()
         writer = csv.writer(output)
-        writer.writerows(sample_data)
-        
-        return output.getvalue()
+        for row in SAMPLE_CSV_ROWS:
+            writer.writerow(row)
+            yield output.getvalue()
+            # 复用同一个缓冲区，每行输出后清空
+            output.seek(0)
+            output.truncate()
+
+    def generate_sample_csv(self) -> str:
+        """生成示例CSV文件内容（内容固定，只生成一次）"""
+        global _sample_csv_text
+        if _sample_csv_text is None:
+            _sample_csv_text = "".join(self.iter_sample_csv())
+        return _sample_csv_text
 
 # 工具函数
 def create_csv_processor(field_mapping: Optional[Dict[str, List[str]]] = None) -> CSVProcessor:
     """创建CSV处理器实例"""
     return CSVProcessor(field_mapping)
 
-def validate_csv_file(file_content: bytes, filename: str) -> Dict[str, Any]:
+def validate_csv_file(file_content: Union[bytes, BinaryIO], filename: str) -> Dict[str, Any]:
     """验证CSV文件格式"""
     processor = CSVProcessor()
     
     try:
-        # 只进行基本的解析验证，不做完整处理
-        encoding = processor.detect_encoding(file_content)
-        text_content = file_content.decode(encoding)
+        # 只进行基本的解析验证，不做完整处理；
+        # 直接在文件句柄上分块检测编码、只解析前几行，避免复制整个文件内容
+        if isinstance(file_content, (bytes, bytearray)):
+            file_content = io.BytesIO(file_content)
+        encoding = processor.detect_stream_encoding(file_content)
         
         # 检查是否为有效的CSV
-        df = pd.read_csv(io.StringIO(text_content), nrows=5)  # 只读前5行
+        file_content.seek(0)
+        df = pd.read_csv(file_content, encoding=encoding, nrows=5)  # 只读前5行
         
         headers = df.columns.tolist()
         
@@ -2,9 +2,11 @@ import asyncio
 import aiohttp
 import logging
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any, Union
-import json
+from typing import Dict, List, Optional, Any, AsyncIterator, Awaitable, Callable, Collection, Set, Tuple, Union
 import time
+import orjson
+from contextlib import aclosing, asynccontextmanager
+from functools import lru_cache
 import ssl
 import certifi
 
@@ -13,6 +15,26 @@ from .config import AppConfig
 
 logger = logging.getLogger(__name__)
 
+# 同时向飞书发起的写入请求数上限（飞书多维表格接口有频率限制）
+FEISHU_WRITE_CONCURRENCY = 5
+
+# 飞书批量新增/更新接口每次请求最多写入的记录数
+BATCH_CREATE_MAX_RECORDS = 500
+
+# 飞书接口触发频率限制时返回的错误码
+RATE_LIMIT_CODE = 99991400
+# 触发频率限制后单个请求最多重试的次数
+RATE_LIMIT_MAX_RETRIES = 3
+# 响应头未给出限流重置时间时的等待秒数，以及等待时间上限
+RATE_LIMIT_DEFAULT_WAIT = 1.0
+RATE_LIMIT_MAX_WAIT = 60.0
+
+# 服务端不支持按用户ID过滤时返回的错误码（过滤条件无效、字段不存在），其他错误不影响过滤方式的选择
+USER_ID_FILTER_UNSUPPORTED_CODES = frozenset({1254018, 1254045})
+
+# 带证书的 SSL 上下文，导入时创建一次，所有会话共用，避免每次重新解析CA证书文件
+SSL_CONTEXT = ssl.create_default_context(cafile=certifi.where())
+
 class FeishuAPIError(Exception):
     """飞书API异常类"""
     def __init__(self, message: str, code: int = 0, details: Any = None):
@@ -20,25 +42,49 @@ class FeishuAPIError(Exception):
         self.code = code
         self.details = details
 
+def orjson_dumps(obj: Any) -> str:
+    """使用orjson序列化请求数据（aiohttp要求返回字符串）"""
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+def orjson_dumps_bytes(obj: Any) -> bytes:
+    """使用orjson序列化请求体，直接得到可发送的字节串"""
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+async def read_json_response(response: aiohttp.ClientResponse) -> Dict:
+    """使用orjson解析响应数据"""
+    try:
+        return orjson.loads(await response.read())
+    except orjson.JSONDecodeError as e:
+        raise FeishuAPIError(f"响应数据解析失败: {e}")
+
+def create_client_session() -> aiohttp.ClientSession:
+    """创建访问飞书API的HTTP会话（带证书校验，复用连接并缓存DNS解析结果）"""
+    connector = aiohttp.TCPConnector(ssl=SSL_CONTEXT, ttl_dns_cache=300)
+    return aiohttp.ClientSession(connector=connector, json_serialize=orjson_dumps)
+
 class TokenManager:
     """Token管理器"""
     
-    def __init__(self, app_id: str, app_secret: str):
+    def __init__(self, app_id: str, app_secret: str, session: Optional[aiohttp.ClientSession] = None):
         self.app_id = app_id
         self.app_secret = app_secret
+        # 与API请求共用的HTTP会话，刷新token时复用已建立的连接
+        self.session = session
         self.access_token = None
         self.expire_time = 0
+        # 需要刷新token的单调时钟时间点（已预留5分钟提前量），不受系统时间调整影响
+        self._valid_until = 0.0
         self.refresh_lock = asyncio.Lock()
         
     async def get_token(self) -> str:
         """获取有效的访问令牌"""
         # 如果token还有效（提前5分钟刷新）
-        if self.access_token and time.time() < self.expire_time - 300:
+        if self.access_token and time.monotonic() < self._valid_until:
             return self.access_token
         
         async with self.refresh_lock:
             # 双重检查，避免并发刷新
-            if self.access_token and time.time() < self.expire_time - 300:
+            if self.access_token and time.monotonic() < self._valid_until:
                 return self.access_token
             
             logger.info("Token过期或不存在，正在获取新token...")
@@ -54,29 +100,92 @@ class TokenManager:
             "app_secret": self.app_secret
         }
 
-        # 创建带证书的 SSL 上下文
-        ssl_context = ssl.create_default_context(cafile=certifi.where())
-        connector = aiohttp.TCPConnector(ssl=ssl_context)
+        if self.session is not None and not self.session.closed:
+            await self._request_token(self.session, url, payload)
+            return
 
-        async with aiohttp.ClientSession(connector=connector) as session:
-            try:
-                async with session.post(url, json=payload) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        raise FeishuAPIError(f"Token请求失败: {response.status} - {error_text}")
-                    
-                    data = await response.json()
-                    
-                    if data.get("code") != 0:
-                        raise FeishuAPIError(f"Token获取失败: {data.get('msg', '未知错误')}", data.get("code"))
-                    
-                    self.access_token = data["app_access_token"]
-                    self.expire_time = time.time() + data["expire"]
-                    
-                    logger.info(f"Token刷新成功，有效期至: {datetime.fromtimestamp(self.expire_time)}")
-                    
-            except aiohttp.ClientError as e:
-                raise FeishuAPIError(f"网络请求失败: {str(e)}")
+        # 没有可复用的会话时（单独使用TokenManager），临时创建一个
+        async with create_client_session() as session:
+            await self._request_token(session, url, payload)
+
+    async def _request_token(self, session: aiohttp.ClientSession, url: str, payload: Dict[str, str]):
+        """请求新的访问令牌"""
+        try:
+            async with session.post(url, json=payload) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    raise FeishuAPIError(f"Token请求失败: {response.status} - {error_text}")
+                
+                data = await read_json_response(response)
+                
+                if data.get("code") != 0:
+                    raise FeishuAPIError(f"Token获取失败: {data.get('msg', '未知错误')}", data.get("code"))
+                
+                self.access_token = data["app_access_token"]
+                self.expire_time = time.time() + data["expire"]
+                self._valid_until = time.monotonic() + data["expire"] - 300
+                
+                logger.info(f"Token刷新成功，有效期至: {datetime.fromtimestamp(self.expire_time)}")
+                
+        except aiohttp.ClientError as e:
+            raise FeishuAPIError(f"网络请求失败: {str(e)}")
+
+# 进程内共享的飞书客户端，跨请求复用连接池和访问令牌
+_shared_client: Optional["FeishuClient"] = None
+# 应用凭证变化后被替换、但仍有请求在使用的旧客户端，最后一个使用者退出时关闭
+_retired_clients: Set["FeishuClient"] = set()
+
+async def get_feishu_client(config: AppConfig) -> "FeishuClient":
+    """
+    获取共享的飞书客户端，首次调用或应用凭证变化时创建
+
+    Args:
+        config: 应用配置
+
+    Returns:
+        已打开会话的飞书客户端
+    """
+    global _shared_client
+    client = _shared_client
+    if (
+        client is not None and not client.closed
+        and client.config.feishu_app_id == config.feishu_app_id
+        and client.config.feishu_app_secret == config.feishu_app_secret
+    ):
+        client.config = config
+        return client
+
+    _shared_client = await FeishuClient(config).__aenter__()
+    if client is not None:
+        # 后台同步任务可能仍在使用旧客户端写入，等它们全部退出后再关闭会话
+        if client.active_users:
+            _retired_clients.add(client)
+        else:
+            await client.close()
+    return _shared_client
+
+@asynccontextmanager
+async def shared_feishu_client(config: AppConfig) -> AsyncIterator["FeishuClient"]:
+    """以上下文管理器形式使用共享的飞书客户端，退出时不关闭会话（已被替换的旧客户端由最后一个使用者关闭）"""
+    client = await get_feishu_client(config)
+    client.active_users += 1
+    try:
+        yield client
+    finally:
+        client.active_users -= 1
+        if client in _retired_clients and not client.active_users:
+            _retired_clients.discard(client)
+            await client.close()
+
+async def close_feishu_client():
+    """关闭共享的飞书客户端及仍未关闭的旧客户端（应用关闭时调用）"""
+    global _shared_client
+    clients = [_shared_client, *_retired_clients]
+    _shared_client = None
+    _retired_clients.clear()
+    for client in clients:
+        if client is not None:
+            await client.close()
 
 class FeishuClient:
     """飞书API客户端"""
@@ -86,20 +195,54 @@ class FeishuClient:
         self.token_manager = TokenManager(config.feishu_app_id, config.feishu_app_secret)
         self.base_url = "https://open.feishu.cn/open-apis"
         self.session = None
+        # 当前token对应的请求头，token变化时才重新生成
+        self._auth_token: Optional[str] = None
+        self._default_headers: Dict[str, str] = {}
+        # 客户端过滤时建立的用户ID索引：(app_token, table_id, 用户ID字段) -> {用户ID: 记录列表}
+        self._record_index_cache: Dict[Tuple[str, str, str], Dict[Any, List[Dict]]] = {}
+        # 触发频率限制后暂停发送请求直到该单调时钟时间点，所有并发请求共同遵守
+        self._rate_limited_until = 0.0
+        # 正在通过 shared_feishu_client 使用该客户端的请求数，客户端被替换时据此推迟关闭
+        self.active_users = 0
+        # 拒绝过按用户ID过滤条件的表格：(app_token, table_id)，这些表改用客户端过滤，不再重复尝试
+        self._user_id_filter_unsupported_tables: Set[Tuple[str, str]] = set()
         
     async def __aenter__(self):
         """异步上下文管理器入口"""
-        # 创建带证书的 SSL 上下文
-        ssl_context = ssl.create_default_context(cafile=certifi.where())
-        connector = aiohttp.TCPConnector(ssl=ssl_context)
-        self.session = aiohttp.ClientSession(connector=connector)
+        self.session = create_client_session()
+        # token请求与API请求共用同一个会话和连接池
+        self.token_manager.session = self.session
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """异步上下文管理器退出"""
+        await self.close()
+    
+    @property
+    def closed(self) -> bool:
+        """HTTP会话是否未打开或已关闭"""
+        return self.session is None or self.session.closed
+    
+    async def close(self):
+        """关闭HTTP会话及其连接池"""
         if self.session:
             await self.session.close()
     
+    def is_user_id_filter_supported(self, app_token: str, table_id: str) -> bool:
+        """表格是否可以使用按用户ID的服务端过滤"""
+        return (app_token, table_id) not in self._user_id_filter_unsupported_tables
+    
+    def _mark_user_id_filter_unsupported(self, app_token: str, table_id: str, error: FeishuAPIError):
+        """服务端明确拒绝过滤条件时，记录该表改用客户端过滤；其他错误照常抛出"""
+        if error.code not in USER_ID_FILTER_UNSUPPORTED_CODES:
+            raise error
+        self._user_id_filter_unsupported_tables.add((app_token, table_id))
+        logger.warning(f"服务端过滤查询失败，改用客户端过滤: {error}")
+    
+    def clear_record_index(self):
+        """清空用户ID索引（长期复用的客户端在每次同步开始时调用，避免使用表格的旧数据）"""
+        self._record_index_cache.clear()
+    
     async def _make_request(
         self, 
         method: str, 
@@ -114,49 +257,95 @@ class FeishuClient:
         
         token = await self.token_manager.get_token()
         
-        # 构建请求头
-        request_headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
-        }
-        if headers:
-            request_headers.update(headers)
+        # 构建请求头（token未变化时复用同一个字典）
+        if token != self._auth_token:
+            self._auth_token = token
+            self._default_headers = {
+                "Authorization": f"Bearer {token}",
+                "Content-Type": "application/json"
+            }
+        request_headers = {**self._default_headers, **headers} if headers else self._default_headers
         
         # 构建URL
         url = f"{self.base_url}/{endpoint.lstrip('/')}"
         
-        # 记录请求信息（脱敏）
-        logger.debug(f"请求 {method} {url}")
-        if data:
-            logger.debug(f"请求数据: {sanitize_log_data(data)}")
+        # 记录请求信息（脱敏）；未开启DEBUG日志时跳过，避免每次请求都遍历脱敏整个请求数据
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("请求 %s %s", method, url)
+            if data:
+                logger.debug("请求数据: %s", sanitize_log_data(data))
+        
+        # 请求体只序列化一次，直接发送orjson产生的字节串（省去转str再由aiohttp编码回bytes，限流重试时也不重复序列化）
+        body = orjson_dumps_bytes(data) if data is not None else None
         
         try:
-            async with self.session.request(
-                method, url, 
-                json=data, 
-                params=params, 
-                headers=request_headers
-            ) as response:
-                
-                logger.debug(f"响应状态: {response.status}")
+            for attempt in range(RATE_LIMIT_MAX_RETRIES + 1):
+                # 其他请求触发了频率限制时，等限流解除后再发送
+                delay = self._rate_limited_until - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
                 
-                if response.status != 200:
-                    error_text = await response.text()
-                    raise FeishuAPIError(f"请求失败: {response.status} - {error_text}")
-                
-                result = await response.json()
-                
-                if result.get("code") != 0:
-                    raise FeishuAPIError(
-                        f"API错误: {result.get('msg', '未知错误')}", 
-                        result.get("code"),
-                        result
-                    )
-                
-                return result
+                can_retry = attempt < RATE_LIMIT_MAX_RETRIES
+                async with self.session.request(
+                    method, url, 
+                    data=body, 
+                    params=params, 
+                    headers=request_headers
+                ) as response:
+                    
+                    logger.debug("响应状态: %s", response.status)
+                    
+                    if response.status == 429 and can_retry:
+                        self._pause_for_rate_limit(response)
+                        continue
+                    
+                    if response.status != 200:
+                        error_text = await response.text()
+                        # 请求被拒绝（4xx）时带上飞书的业务错误码，没有时使用HTTP状态码；
+                        # 错误码为0表示请求结果未知（网络失败或服务端错误），记录可能已写入
+                        try:
+                            error_body = orjson.loads(error_text)
+                        except orjson.JSONDecodeError:
+                            error_body = None
+                        error_code = 0
+                        if response.status < 500:
+                            error_code = (error_body.get("code") if isinstance(error_body, dict) else None) or response.status
+                        raise FeishuAPIError(
+                            f"请求失败: {response.status} - {error_text}",
+                            error_code,
+                            error_body
+                        )
+                    
+                    result = await read_json_response(response)
+                    
+                    if result.get("code") == RATE_LIMIT_CODE and can_retry:
+                        self._pause_for_rate_limit(response)
+                        continue
+                    
+                    if result.get("code") != 0:
+                        raise FeishuAPIError(
+                            f"API错误: {result.get('msg', '未知错误')}", 
+                            result.get("code"),
+                            result
+                        )
+                    
+                    return result
                 
         except aiohttp.ClientError as e:
             raise FeishuAPIError(f"网络请求失败: {str(e)}")
+        except asyncio.TimeoutError:
+            raise FeishuAPIError("网络请求超时")
+    
+    def _pause_for_rate_limit(self, response: aiohttp.ClientResponse):
+        """根据响应头中的限流重置时间，暂停后续请求"""
+        reset = response.headers.get("x-ogw-ratelimit-reset") or response.headers.get("Retry-After")
+        try:
+            wait = min(max(float(reset), 0.0), RATE_LIMIT_MAX_WAIT)
+        except (TypeError, ValueError):
+            wait = RATE_LIMIT_DEFAULT_WAIT
+        
+        self._rate_limited_until = max(self._rate_limited_until, time.monotonic() + wait)
+        logger.warning("触发飞书接口频率限制，%.1f秒后重试", wait)
     
     async def test_connection(self) -> Dict:
         """测试连接"""
@@ -200,9 +389,10 @@ class FeishuClient:
         table_id: str, 
         filter_conditions: Optional[Union[str, Dict]] = None,
         page_size: int = 100,
-        page_token: Optional[str] = None
+        page_token: Optional[str] = None,
+        field_names: Optional[List[str]] = None
     ) -> Dict:
-        """查询记录"""
+        """查询记录（field_names不为空时只返回这些字段）"""
         endpoint = f"bitable/v1/apps/{app_token}/tables/{table_id}/records"
         
         params = {
@@ -212,7 +402,7 @@ class FeishuClient:
         if filter_conditions:
             if isinstance(filter_conditions, dict):
                 # JSON格式的过滤条件，需要转换为字符串
-                params["filter"] = json.dumps(filter_conditions)
+                params["filter"] = orjson.dumps(filter_conditions).decode()
             else:
                 # 字符串格式的过滤条件
                 params["filter"] = filter_conditions
@@ -220,12 +410,17 @@ class FeishuClient:
         if page_token:
             params["page_token"] = page_token
         
+        if field_names:
+            params["field_names"] = orjson.dumps(field_names).decode()
+        
         try:
             result = await self._make_request("GET", endpoint, params=params)
             
-            records = result.get("data", {}).get("items", [])
-            has_more = result.get("data", {}).get("has_more", False)
-            next_page_token = result.get("data", {}).get("page_token")
+            # 没有匹配的记录时（如过滤查询无结果）items可能为null
+            data = result.get("data") or {}
+            records = data.get("items") or []
+            has_more = data.get("has_more", False)
+            next_page_token = data.get("page_token")
             
             logger.info(f"查询记录成功: {len(records)}条记录")
             
@@ -239,6 +434,45 @@ class FeishuClient:
             logger.error(f"查询记录失败: {e}")
             raise
     
+    @staticmethod
+    def _user_id_filter(user_id_field: str, user_id: str) -> str:
+        """生成按用户ID精确匹配的服务端过滤条件"""
+        escaped_user_id = str(user_id).replace('\\', '\\\\').replace('"', '\\"')
+        return f'CurrentValue.[{user_id_field}]="{escaped_user_id}"'
+    
+    async def find_first_record_by_user_id(
+        self,
+        app_token: str,
+        table_id: str,
+        user_id_field: str,
+        user_id: str
+    ) -> Optional[Dict]:
+        """
+        查找用户的第一条记录（只用于确定record_id）
+        
+        使用服务端过滤时每次只取1条记录，并且只返回用户ID字段；
+        服务端不支持该过滤条件时，退回到客户端索引查找（返回完整记录）
+        """
+        if self.is_user_id_filter_supported(app_token, table_id):
+            try:
+                result = await self.query_records(
+                    app_token,
+                    table_id,
+                    filter_conditions=self._user_id_filter(user_id_field, user_id),
+                    page_size=1,
+                    field_names=[user_id_field]
+                )
+                for record in result["records"]:
+                    if record.get("fields", {}).get(user_id_field) == user_id:
+                        return record
+                return None
+            except FeishuAPIError as e:
+                self._mark_user_id_filter_unsupported(app_token, table_id, e)
+        
+        index = await self.build_user_index(app_token, table_id, user_id_field)
+        records = index.get(user_id)
+        return records[0] if records else None
+    
     async def search_records_by_user_id(
         self, 
         app_token: str, 
@@ -247,41 +481,28 @@ class FeishuClient:
         user_id: str
     ) -> List[Dict]:
         """根据用户ID搜索记录"""
-        # 由于飞书API的过滤条件语法复杂且不稳定，
-        # 采用客户端过滤的方式：获取所有记录，然后在客户端进行过滤
+        # 优先使用服务端过滤，只传输匹配的记录；
+        # 服务端不支持该过滤条件时，退回到获取所有记录后在客户端过滤
+        filter_conditions = None
+        if self.is_user_id_filter_supported(app_token, table_id):
+            filter_conditions = self._user_id_filter(user_id_field, user_id)
+        
         try:
-            # 获取所有记录（分页处理）
-            all_records = []
-            page_token = None
-            
-            while True:
-                result = await self.query_records(
-                    app_token, 
-                    table_id,
-                    page_size=500,  # 增大页面大小以提高效率
-                    page_token=page_token
-                )
-                
-                records = result["records"]
-                all_records.extend(records)
-                
-                # 检查是否有更多数据
-                if not result.get("has_more", False):
-                    break
-                
-                page_token = result.get("page_token")
-                if not page_token:
-                    break
-            
-            # 在客户端过滤匹配的记录
-            matching_records = []
-            for record in all_records:
-                record_fields = record.get("fields", {})
-                record_user_id = record_fields.get(user_id_field)
-                
-                if record_user_id == user_id:
-                    matching_records.append(record)
+            if filter_conditions:
+                try:
+                    records = await self._fetch_all_records(app_token, table_id, filter_conditions)
+                    matching_records = [
+                        record for record in records
+                        if record.get("fields", {}).get(user_id_field) == user_id
+                    ]
+                    logger.info(f"服务端过滤找到 {len(matching_records)} 条匹配记录")
+                    return matching_records
+                except FeishuAPIError as e:
+                    self._mark_user_id_filter_unsupported(app_token, table_id, e)
             
+            # 客户端过滤：整表只获取一次并建立索引，同一客户端后续查询直接查索引
+            index = await self.build_user_index(app_token, table_id, user_id_field)
+            matching_records = list(index.get(user_id, []))
             logger.info(f"客户端过滤找到 {len(matching_records)} 条匹配记录")
             return matching_records
             
@@ -289,6 +510,110 @@ class FeishuClient:
             logger.error(f"根据用户ID搜索记录失败: {e}")
             raise
     
+    async def build_user_index(self, app_token: str, table_id: str, user_id_field: str) -> Dict[Any, List[Dict]]:
+        """
+        获取表格的所有记录并按用户ID建立索引
+        
+        索引在同一客户端内缓存，通过该客户端写入此表时失效
+        
+        Returns:
+            用户ID -> 记录列表
+        """
+        key = (app_token, table_id, user_id_field)
+        index = self._record_index_cache.get(key)
+        if index is None:
+            index = {}
+            # 每页数据在下一页下载期间建立索引
+            async for records in self._iter_record_pages(app_token, table_id):
+                for record in records:
+                    record_user_id = record.get("fields", {}).get(user_id_field)
+                    # 富文本等结构化的值无法作为索引键，也不会与字符串用户ID相等
+                    if record_user_id is not None and not isinstance(record_user_id, (list, dict)):
+                        index.setdefault(record_user_id, []).append(record)
+            self._record_index_cache[key] = index
+        return index
+    
+    async def find_record_ids_by_user_ids(
+        self,
+        app_token: str,
+        table_id: str,
+        user_id_field: str,
+        user_ids: Collection[Any]
+    ) -> Dict[Any, str]:
+        """
+        分页扫描表格查找多个用户的record_id，所有用户都找到后立即停止翻页
+        
+        Returns:
+            扫描过的所有记录的 用户ID -> 第一条记录的record_id（不只包含要查找的用户）
+        """
+        remaining = set(user_ids)
+        record_ids: Dict[Any, str] = {}
+        async with aclosing(self._iter_record_pages(app_token, table_id)) as pages:
+            async for records in pages:
+                for record in records:
+                    record_user_id = record.get("fields", {}).get(user_id_field)
+                    # 富文本等结构化的值无法作为索引键，也不会与字符串用户ID相等
+                    if record_user_id is None or isinstance(record_user_id, (list, dict)):
+                        continue
+                    if record_user_id not in record_ids:
+                        record_ids[record_user_id] = record["record_id"]
+                        remaining.discard(record_user_id)
+                if not remaining:
+                    break
+        return record_ids
+    
+    def _invalidate_record_index(self, app_token: str, table_id: str):
+        """表格记录变化后清除该表的用户ID索引"""
+        for key in [key for key in self._record_index_cache if key[:2] == (app_token, table_id)]:
+            del self._record_index_cache[key]
+    
+    async def _iter_record_pages(
+        self,
+        app_token: str,
+        table_id: str,
+        filter_conditions: Optional[str] = None
+    ) -> AsyncIterator[List[Dict]]:
+        """逐页获取记录（可带过滤条件）"""
+        def fetch_page(page_token: Optional[str]) -> asyncio.Task:
+            return asyncio.create_task(self.query_records(
+                app_token,
+                table_id,
+                filter_conditions=filter_conditions,
+                page_size=500,  # 飞书允许的最大页面大小
+                page_token=page_token
+            ))
+        
+        # 飞书只支持游标分页，无法并发请求各页；拿到下一页的page_token后
+        # 先发起下一页请求，再交出当前页，让调用方处理数据与网络等待重叠
+        next_page = fetch_page(None)
+        try:
+            while next_page:
+                result = await next_page
+                next_page = None
+                
+                # 检查是否有更多数据
+                page_token = result.get("page_token")
+                if result.get("has_more", False) and page_token:
+                    next_page = fetch_page(page_token)
+                
+                yield result["records"]
+        finally:
+            if next_page and not next_page.done():
+                next_page.cancel()
+    
+    async def _fetch_all_records(
+        self,
+        app_token: str,
+        table_id: str,
+        filter_conditions: Optional[str] = None
+    ) -> List[Dict]:
+        """分页获取所有记录（可带过滤条件）"""
+        return [
+            record
+            async for records in self._iter_record_pages(app_token, table_id, filter_conditions)
+            for record in records
+        ]
+    
     # 记录创建操作
     async def create_record(
         self, 
@@ -305,6 +630,7 @@ class FeishuClient:
         
         try:
             result = await self._make_request("POST", endpoint, data=data)
+            self._invalidate_record_index(app_token, table_id)
             
             record = result.get("data", {}).get("record", {})
             logger.info(f"创建记录成功: {record.get('record_id', 'unknown')}")
@@ -332,6 +658,7 @@ class FeishuClient:
         
         try:
             result = await self._make_request("PUT", endpoint, data=data)
+            self._invalidate_record_index(app_token, table_id)
             
             record = result.get("data", {}).get("record", {})
             logger.info(f"更新记录成功: {record_id}")
@@ -343,47 +670,161 @@ class FeishuClient:
             raise
     
     # 批量操作
-    async def batch_create_records(
-        self, 
-        app_token: str, 
-        table_id: str, 
-        records: List[Dict[str, Any]],
-        batch_size: int = 100
+    async def _batch_create_chunk(
+        self,
+        app_token: str,
+        table_id: str,
+        records: List[Dict[str, Any]]
     ) -> List[Dict]:
-        """批量创建记录"""
-        all_results = []
+        """调用飞书批量新增接口，一次请求创建多条记录，返回创建的记录（顺序与传入一致）"""
+        endpoint = f"bitable/v1/apps/{app_token}/tables/{table_id}/records/batch_create"
         
-        # 分批处理
-        for i in range(0, len(records), batch_size):
-            batch = records[i:i + batch_size]
-            
-            logger.info(f"处理批次 {i // batch_size + 1}: {len(batch)}条记录")
-            
-            batch_results = []
-            for record_fields in batch:
+        data = {
+            "records": [{"fields": fields} for fields in records]
+        }
+        
+        result = await self._make_request("POST", endpoint, data=data)
+        self._invalidate_record_index(app_token, table_id)
+        return result.get("data", {}).get("records", [])
+    
+    async def _batch_update_chunk(
+        self,
+        app_token: str,
+        table_id: str,
+        records: List[Dict[str, Any]]
+    ) -> List[Dict]:
+        """调用飞书批量更新接口，一次请求更新多条记录（每项包含record_id和fields）"""
+        endpoint = f"bitable/v1/apps/{app_token}/tables/{table_id}/records/batch_update"
+        
+        data = {
+            "records": [{"record_id": record["record_id"], "fields": record["fields"]} for record in records]
+        }
+        
+        result = await self._make_request("POST", endpoint, data=data)
+        self._invalidate_record_index(app_token, table_id)
+        return result.get("data", {}).get("records", [])
+    
+    async def _write_in_batches(
+        self,
+        action: str,
+        items: List[Dict[str, Any]],
+        batch_size: int,
+        concurrency: int,
+        write_batch: Callable[[List[Dict[str, Any]]], Awaitable[List[Dict]]],
+        write_one: Callable[[Dict[str, Any]], Awaitable[Dict]],
+        describe: Callable[[Dict[str, Any]], Dict[str, Any]]
+    ) -> List[Dict]:
+        """
+        分批并发写入记录，结果与传入记录的顺序一致
+
+        Args:
+            action: 操作名称，用于日志
+            items: 待写入的记录
+            batch_size: 每批记录数
+            concurrency: 同时进行的请求数上限
+            write_batch: 写入一批记录的批量接口
+            write_one: 写入单条记录的接口，批量请求被拒绝时逐条写入
+            describe: 生成失败结果中记录信息的函数
+
+        Returns:
+            每条记录的结果：成功时为{"success": True, "record": 记录}，失败时包含error及记录信息
+        """
+        batch_size = min(batch_size, BATCH_CREATE_MAX_RECORDS)
+        # 用并发上限代替固定的批间等待来控制请求频率
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def write_single(item: Dict[str, Any]) -> Dict:
+            async with semaphore:
                 try:
-                    result = await self.create_record(app_token, table_id, record_fields)
-                    batch_results.append({
+                    return {
                         "success": True,
-                        "record": result
-                    })
+                        "record": await write_one(item)
+                    }
                 except Exception as e:
-                    logger.error(f"批量创建记录失败: {e}")
-                    batch_results.append({
+                    logger.error(f"批量{action}记录失败: {e}")
+                    return {
                         "success": False,
                         "error": str(e),
-                        "fields": record_fields
-                    })
-            
-            all_results.extend(batch_results)
-            
-            # 避免请求过于频繁
-            await asyncio.sleep(0.1)
+                        **describe(item)
+                    }
+        
+        def fail_all(batch: List[Dict[str, Any]], error: str) -> List[Dict]:
+            return [{"success": False, "error": error, **describe(item)} for item in batch]
+        
+        async def write_chunk(batch_number: int, batch: List[Dict[str, Any]]) -> List[Dict]:
+            logger.info(f"处理批次 {batch_number}: {len(batch)}条记录")
+            async with semaphore:
+                try:
+                    written = await write_batch(batch)
+                except FeishuAPIError as e:
+                    if not e.code:
+                        # 网络错误或服务端错误时无法确定记录是否已写入，不再重试，避免重复写入
+                        logger.error(f"批量{action}记录失败: {e}")
+                        return fail_all(batch, str(e))
+                    if e.code in (RATE_LIMIT_CODE, 429):
+                        # 限流重试已用尽，逐条写入只会继续触发限流
+                        logger.error(f"批量{action}记录被限流: {e}")
+                        return fail_all(batch, str(e))
+                    logger.warning(f"批量{action}接口返回错误，改为逐条{action}以定位失败记录: {e}")
+                    written = None
+                except Exception as e:
+                    # 意外错误只影响本批记录，不中断其他批次
+                    logger.exception(f"批量{action}记录异常: {e}")
+                    return fail_all(batch, str(e))
+                
+                if written is not None:
+                    if len(written) == len(batch):
+                        return [{"success": True, "record": record} for record in written]
+                    # 返回的记录数与请求不一致时无法对应每条记录的结果；记录可能已写入，不再重试
+                    error = f"批量{action}返回{len(written)}条记录，与请求的{len(batch)}条不一致"
+                    logger.error(error)
+                    return fail_all(batch, error)
+            # 批量请求被拒绝时整批都未写入，逐条写入，只有有问题的记录失败
+            return await asyncio.gather(*(write_single(item) for item in batch))
+        
+        # 分批并发处理
+        batch_results = await asyncio.gather(*(
+            write_chunk(i // batch_size + 1, items[i:i + batch_size])
+            for i in range(0, len(items), batch_size)
+        ))
+        all_results = [result for batch in batch_results for result in batch]
         
         success_count = sum(1 for r in all_results if r["success"])
-        logger.info(f"批量创建完成: {success_count}/{len(records)} 成功")
+        logger.info(f"批量{action}完成: {success_count}/{len(items)} 成功")
         
         return all_results
+    
+    async def batch_create_records(
+        self, 
+        app_token: str, 
+        table_id: str, 
+        records: List[Dict[str, Any]],
+        batch_size: int = BATCH_CREATE_MAX_RECORDS,
+        concurrency: int = FEISHU_WRITE_CONCURRENCY
+    ) -> List[Dict]:
+        """批量创建记录（records为各记录的fields），每批使用一次批量新增请求，结果与传入记录的顺序一致"""
+        return await self._write_in_batches(
+            "创建", records, batch_size, concurrency,
+            write_batch=lambda batch: self._batch_create_chunk(app_token, table_id, batch),
+            write_one=lambda fields: self.create_record(app_token, table_id, fields),
+            describe=lambda fields: {"fields": fields}
+        )
+    
+    async def batch_update_records(
+        self,
+        app_token: str,
+        table_id: str,
+        records: List[Dict[str, Any]],
+        batch_size: int = BATCH_CREATE_MAX_RECORDS,
+        concurrency: int = FEISHU_WRITE_CONCURRENCY
+    ) -> List[Dict]:
+        """批量更新记录（每项包含record_id和fields），每批使用一次批量更新请求，结果与传入记录的顺序一致"""
+        return await self._write_in_batches(
+            "更新", records, batch_size, concurrency,
+            write_batch=lambda batch: self._batch_update_chunk(app_token, table_id, batch),
+            write_one=lambda record: self.update_record(app_token, table_id, record["record_id"], record["fields"]),
+            describe=lambda record: {"record_id": record["record_id"], "fields": record["fields"]}
+        )
 
 # 辅助函数
 def create_link_field(record_id: str) -> List[str]:
@@ -391,24 +832,32 @@ def create_link_field(record_id: str) -> List[str]:
     # 飞书双向关联字段需要字符串数组格式，而不是对象数组
     return [record_id]
 
+# 支持解析的常见日期格式
+DATE_FORMATS = (
+    "%Y-%m-%d",
+    "%Y/%m/%d",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y/%m/%d %H:%M:%S"
+)
+
+@lru_cache(maxsize=4096)
+def _parse_date_timestamp(date_str: str) -> Optional[int]:
+    """按常见日期格式解析日期字符串，返回毫秒时间戳，无法解析时返回None（同一批记录的日期大多相同，结果缓存）"""
+    for fmt in DATE_FORMATS:
+        try:
+            dt = datetime.strptime(date_str, fmt)
+            return int(dt.timestamp() * 1000)  # 飞书使用毫秒时间戳
+        except ValueError:
+            continue
+    return None
+
 def format_date_field(date_str: str) -> int:
     """格式化日期字段为时间戳"""
     try:
         if isinstance(date_str, str):
-            # 尝试解析常见的日期格式
-            formats = [
-                "%Y-%m-%d",
-                "%Y/%m/%d", 
-                "%Y-%m-%d %H:%M:%S",
-                "%Y/%m/%d %H:%M:%S"
-            ]
-            
-            for fmt in formats:
-                try:
-                    dt = datetime.strptime(date_str, fmt)
-                    return int(dt.timestamp() * 1000)  # 飞书使用毫秒时间戳
-                except ValueError:
-                    continue
+            timestamp = _parse_date_timestamp(date_str)
+            if timestamp is not None:
+                return timestamp
         
         raise ValueError(f"无法解析日期格式: {date_str}")
         
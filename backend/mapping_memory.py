@@ -3,43 +3,123 @@
 用于保存和加载用户的字段映射配置历史
 """
 
-import json
 import os
+import copy
 import logging
+import orjson
+from collections import Counter
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from pathlib import Path
+from typing import Dict, List, Optional, Any, Set, Tuple
 
 logger = logging.getLogger(__name__)
 
+# 映射历史最多保留的条数
+MAX_HISTORY_ENTRIES = 10
+
+# 已解析的历史文件缓存：绝对路径 -> (文件状态, 历史记录, 日志行数)，避免每次实例化都重新解析文件
+_history_cache: Dict[str, Tuple[Tuple, Dict[str, Any], int]] = {}
+
+# 本进程内已确认存在的配置目录，重复实例化时不再访问文件系统
+_ensured_dirs: Set[str] = set()
+
 class MappingMemory:
     """映射配置记忆管理器"""
 
     def __init__(self, config_file: str = "config/field_mappings_history.json"):
         self.config_file = config_file
+        # 历史记录逐条追加到日志文件（每行一条JSON），config_file只保存最近一次映射
+        self.history_log_file = f"{os.path.splitext(config_file)[0]}.jsonl"
+        # 已加载的文件状态（修改时间与大小），文件未变化时无需重新加载
+        self._loaded_stamp: Optional[Tuple] = None
+        # 日志文件当前的行数，超过保留条数两倍时重写压缩
+        self._log_line_count = 0
         self.ensure_config_dir()
         self.history = self.load_history()
 
     def ensure_config_dir(self):
         """确保配置目录存在"""
         config_dir = os.path.dirname(self.config_file)
-        if config_dir and not os.path.exists(config_dir):
-            os.makedirs(config_dir, exist_ok=True)
+        if config_dir and config_dir not in _ensured_dirs:
+            Path(config_dir).mkdir(parents=True, exist_ok=True)
+            _ensured_dirs.add(config_dir)
+
+    def _get_files_stamp(self) -> Tuple:
+        """获取历史文件与日志文件的修改时间和大小，文件不存在时对应项为None"""
+        stamp = []
+        for path in (self.config_file, self.history_log_file):
+            try:
+                st = os.stat(path)
+                stamp.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def refresh(self):
+        """历史文件被修改过时重新加载，否则沿用内存中的记录"""
+        if self._get_files_stamp() != self._loaded_stamp:
+            self.history = self.load_history()
 
     def load_history(self) -> Dict[str, Any]:
         """加载历史映射配置"""
         try:
-            if os.path.exists(self.config_file):
-                with open(self.config_file, 'r', encoding='utf-8') as f:
-                    history = json.load(f)
-                    logger.info(f"加载映射历史成功: {self.config_file}")
-                    return history
-            else:
+            self._loaded_stamp = self._get_files_stamp()
+            config_stamp, log_stamp = self._loaded_stamp
+            if config_stamp is None and log_stamp is None:
                 logger.info("映射历史文件不存在，创建新的历史记录")
+                self._log_line_count = 0
                 return self._create_empty_history()
+
+            cache_key = os.path.abspath(self.config_file)
+            cached = _history_cache.get(cache_key)
+            if cached and cached[0] == self._loaded_stamp:
+                self._log_line_count = cached[2]
+                # 返回副本，实例修改内存记录时不会污染缓存
+                return copy.deepcopy(cached[1])
+
+            history = self._create_empty_history()
+            if config_stamp is not None:
+                with open(self.config_file, 'rb') as f:
+                    history.update(orjson.loads(f.read()))
+
+            if log_stamp is None and history["mapping_history"]:
+                # 旧版本把历史记录与最近映射保存在同一个文件中，迁移到日志文件
+                history["mapping_history"] = history["mapping_history"][-MAX_HISTORY_ENTRIES:]
+                self.history = history
+                self._save_to_file()
+                logger.info(f"映射历史已迁移到日志文件: {self.history_log_file}")
+                return history
+
+            history["mapping_history"], self._log_line_count = self._read_history_log()
+            _history_cache[cache_key] = (self._loaded_stamp, copy.deepcopy(history), self._log_line_count)
+            logger.info(f"加载映射历史成功: {self.config_file}")
+            return history
         except Exception as e:
             logger.error(f"加载映射历史失败: {e}")
             return self._create_empty_history()
 
+    def _read_history_log(self) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        读取历史日志文件中最近的记录
+
+        Returns:
+            (最近的历史记录列表, 日志文件总行数)
+        """
+        try:
+            with open(self.history_log_file, 'rb') as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return [], 0
+
+        entries = []
+        for line in lines[-MAX_HISTORY_ENTRIES:]:
+            try:
+                entries.append(orjson.loads(line))
+            except orjson.JSONDecodeError:
+                # 追加写入中断时最后一行可能不完整
+                logger.warning("跳过损坏的映射历史记录")
+        return entries, len(lines)
+
     def _create_empty_history(self) -> Dict[str, Any]:
         """创建空的历史记录结构"""
         return {
@@ -70,6 +150,8 @@ class MappingMemory:
         last = self.history["last_mapping"]
         last_headers = last.get("csv_headers", [])
         last_mapping = last.get("mapping", {})
+        # CSV字段是否与上次完全一致（与顺序无关），字段数不同时无需构建集合
+        headers_match = len(csv_headers) == len(last_headers) and set(csv_headers) == set(last_headers)
 
         # 检查是否为新格式
         if isinstance(last_mapping, dict) and "regular_mappings" in last_mapping:
@@ -78,19 +160,18 @@ class MappingMemory:
             note_mappings = last_mapping.get("note_mappings", [])
 
             # 检查CSV字段是否完全匹配
-            if set(csv_headers) == set(last_headers):
+            if headers_match:
                 logger.info("找到完全匹配的历史映射配置（新格式）")
                 return last_mapping
 
             # 部分匹配处理
-            partial_regular = {}
-            partial_note = []
-
-            for csv_field in csv_headers:
-                if csv_field in regular_mappings:
-                    partial_regular[csv_field] = regular_mappings[csv_field]
-                if csv_field in note_mappings:
-                    partial_note.append(csv_field)
+            partial_regular = {
+                csv_field: regular_mappings[csv_field]
+                for csv_field in csv_headers if csv_field in regular_mappings
+            }
+            # 备注字段保存为列表，转为集合后每个字段只需一次哈希查找
+            note_fields = set(note_mappings)
+            partial_note = [csv_field for csv_field in csv_headers if csv_field in note_fields]
 
             if partial_regular or partial_note:
                 result = {
@@ -103,7 +184,7 @@ class MappingMemory:
         else:
             # 兼容旧格式
             # 检查CSV字段是否完全匹配
-            if set(csv_headers) == set(last_headers):
+            if headers_match:
                 logger.info("找到完全匹配的历史映射配置（旧格式）")
                 return {
                     "regular_mappings": last_mapping,
@@ -111,10 +192,10 @@ class MappingMemory:
                 }
 
             # 检查是否有部分匹配的字段
-            partial_mapping = {}
-            for csv_field in csv_headers:
-                if csv_field in last_mapping:
-                    partial_mapping[csv_field] = last_mapping[csv_field]
+            partial_mapping = {
+                csv_field: last_mapping[csv_field]
+                for csv_field in csv_headers if csv_field in last_mapping
+            }
 
             if partial_mapping:
                 logger.info(f"找到部分匹配的历史映射配置（旧格式）: {len(partial_mapping)}/{len(csv_headers)} 个字段")
@@ -155,46 +236,97 @@ class MappingMemory:
                 }
                 total_mapped = len(mapping)
 
+            # 同一次保存的记录使用同一个时间
+            now = datetime.now()
+            timestamp = now.isoformat()
+
             # 更新最近使用的映射
             self.history["last_mapping"] = {
                 "csv_headers": csv_headers,
                 "mapping": normalized_mapping,
-                "timestamp": datetime.now().isoformat(),
+                "timestamp": timestamp,
                 "field_count": len(csv_headers),
                 "mapped_count": total_mapped
             }
 
             # 添加到历史记录
             history_entry = {
-                "name": f"映射_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+                "name": f"映射_{now.strftime('%Y%m%d_%H%M%S')}",
                 "csv_headers": csv_headers,
                 "mapping": normalized_mapping,
-                "timestamp": datetime.now().isoformat(),
+                "timestamp": timestamp,
                 "field_count": len(csv_headers),
                 "mapped_count": total_mapped
             }
 
             # 保持历史记录不超过10条
             self.history["mapping_history"].append(history_entry)
-            if len(self.history["mapping_history"]) > 10:
-                self.history["mapping_history"] = self.history["mapping_history"][-10:]
+            if len(self.history["mapping_history"]) > MAX_HISTORY_ENTRIES:
+                self.history["mapping_history"] = self.history["mapping_history"][-MAX_HISTORY_ENTRIES:]
 
             # 保存到文件
-            return self._save_to_file()
+            return self._append_history_entry(history_entry)
 
         except Exception as e:
             logger.error(f"保存映射配置失败: {e}")
             return False
 
+    def _append_history_entry(self, history_entry: Dict[str, Any]) -> bool:
+        """将一条历史记录追加到日志文件，并保存最近一次映射"""
+        if self._log_line_count >= MAX_HISTORY_ENTRIES * 2:
+            # 日志中过期的记录过多，重写为最近的记录
+            return self._save_to_file()
+
+        try:
+            with open(self.history_log_file, 'ab') as f:
+                f.write(orjson.dumps(history_entry, option=orjson.OPT_NON_STR_KEYS) + b"\n")
+            self._log_line_count += 1
+        except Exception as e:
+            logger.error(f"追加映射历史记录失败: {e}")
+            # 内存中的记录与文件不一致，下次访问时从文件重新加载
+            self._loaded_stamp = None
+            return False
+
+        return self._write_config_file()
+
     def _save_to_file(self) -> bool:
-        """将历史记录保存到文件"""
+        """重写历史日志文件，并保存最近一次映射"""
+        try:
+            entries = self.history.get("mapping_history", [])
+            temp_file = f"{self.history_log_file}.tmp"
+            with open(temp_file, 'wb') as f:
+                f.write(b"".join(
+                    orjson.dumps(entry, option=orjson.OPT_NON_STR_KEYS) + b"\n" for entry in entries
+                ))
+            os.replace(temp_file, self.history_log_file)
+            self._log_line_count = len(entries)
+        except Exception as e:
+            logger.error(f"保存映射历史日志失败: {e}")
+            self._loaded_stamp = None
+            return False
+
+        return self._write_config_file()
+
+    def _write_config_file(self) -> bool:
+        """保存最近一次映射等元信息（历史记录保存在日志文件中）"""
         try:
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(self.history, f, indent=2, ensure_ascii=False)
+            meta = {key: value for key, value in self.history.items() if key != "mapping_history"}
+            # 先写入临时文件再原子替换，写入中断时不会留下损坏的历史文件
+            temp_file = f"{self.config_file}.tmp"
+            with open(temp_file, 'wb') as f:
+                f.write(orjson.dumps(meta, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_INDENT_2))
+            os.replace(temp_file, self.config_file)
+            # 记录本次写入后的文件状态，避免下次访问时重复加载自己写入的内容
+            self._loaded_stamp = self._get_files_stamp()
+            _history_cache[os.path.abspath(self.config_file)] = (
+                self._loaded_stamp, copy.deepcopy(self.history), self._log_line_count
+            )
             logger.info(f"映射历史保存成功: {self.config_file}")
             return True
         except Exception as e:
             logger.error(f"保存映射历史文件失败: {e}")
+            # 内存中的记录与文件不一致，下次访问时从文件重新加载
+            self._loaded_stamp = None
             return False
 
     def get_mapping_history(self) -> List[Dict[str, Any]]:
@@ -222,7 +354,7 @@ class MappingMemory:
             }
 
         # 统计最常用的字段映射
-        field_usage = {}
+        field_usage = Counter()
         for entry in history:
             mapping = entry.get("mapping", {})
 
@@ -231,20 +363,20 @@ class MappingMemory:
                 # 统计常规映射
                 for csv_field, feishu_field in mapping.get("regular_mappings", {}).items():
                     key = f"{csv_field} → {feishu_field}"
-                    field_usage[key] = field_usage.get(key, 0) + 1
+                    field_usage[key] += 1
 
                 # 统计备注映射
                 for csv_field in mapping.get("note_mappings", []):
                     key = f"{csv_field} → 备注"
-                    field_usage[key] = field_usage.get(key, 0) + 1
+                    field_usage[key] += 1
             else:
                 # 兼容旧格式
                 for csv_field, feishu_field in mapping.items():
                     key = f"{csv_field} → {feishu_field}"
-                    field_usage[key] = field_usage.get(key, 0) + 1
+                    field_usage[key] += 1
 
         # 按使用频率排序
-        most_common = sorted(field_usage.items(), key=lambda x: x[1], reverse=True)[:5]
+        most_common = field_usage.most_common(5)
 
         return {
             "total_mappings": len(history),
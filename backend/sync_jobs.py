@@ -0,0 +1,124 @@
+"""
+同步任务管理器
+在后台执行同步任务，接口立即返回任务ID，前端通过任务ID轮询进度
+"""
+
+import asyncio
+import logging
+import secrets
+import time
+from datetime import datetime
+from typing import Dict, Any, Optional, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class SyncJobStore:
+    """后台同步任务存储"""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+    def __init__(self, ttl_seconds: int = 3600):
+        """
+        初始化任务存储
+
+        Args:
+            ttl_seconds: 已结束任务的保留时间（秒）
+        """
+        self.ttl_seconds = ttl_seconds
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def submit(
+        self,
+        run: Callable[[], Awaitable[Dict[str, Any]]],
+        on_done: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> str:
+        """
+        提交后台任务
+
+        Args:
+            run: 执行同步的协程函数，返回同步结果
+            on_done: 任务结束后的回调，参数为同步结果
+
+        Returns:
+            任务ID
+        """
+        self._purge_finished()
+
+        job_id = secrets.token_urlsafe(12)
+        self._jobs[job_id] = {
+            "job_id": job_id,
+            "status": self.PENDING,
+            "created_at": datetime.now().isoformat(),
+            "finished_at": None,
+            "result": None,
+            "_finished_monotonic": None
+        }
+        self._tasks[job_id] = asyncio.create_task(self._run(job_id, run, on_done))
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """获取任务状态"""
+        job = self._jobs.get(job_id)
+        if not job:
+            return None
+        return {key: value for key, value in job.items() if not key.startswith("_")}
+
+    def is_active(self, job_id: Optional[str]) -> bool:
+        """任务是否仍在等待或执行中"""
+        job = self._jobs.get(job_id) if job_id else None
+        return bool(job) and job["status"] in (self.PENDING, self.RUNNING)
+
+    async def cancel_all(self):
+        """取消所有未完成的任务（应用关闭时调用）"""
+        tasks = [task for task in self._tasks.values() if not task.done()]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(
+        self,
+        job_id: str,
+        run: Callable[[], Awaitable[Dict[str, Any]]],
+        on_done: Optional[Callable[[Dict[str, Any]], None]]
+    ):
+        """执行任务并记录结果"""
+        job = self._jobs[job_id]
+        job["status"] = self.RUNNING
+        try:
+            result = await run()
+        except Exception as e:
+            # 同步服务内部已处理预期的错误，这里捕获到的都是意外异常，保留堆栈便于排查
+            logger.exception("同步任务 %s 执行异常: %s", job_id, e)
+            result = {
+                "success": False,
+                "message": f"同步过程发生异常: {str(e)}"
+            }
+
+        job["result"] = result
+        job["status"] = self.COMPLETED if result.get("success") else self.FAILED
+        job["finished_at"] = datetime.now().isoformat()
+        job["_finished_monotonic"] = time.monotonic()
+        self._tasks.pop(job_id, None)
+
+        if on_done:
+            try:
+                on_done(result)
+            except Exception as e:
+                logger.warning(f"同步任务 {job_id} 结束回调失败: {e}")
+
+    def _purge_finished(self):
+        """清理超过保留时间的已结束任务"""
+        now = time.monotonic()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job["_finished_monotonic"] is not None
+            and now - job["_finished_monotonic"] > self.ttl_seconds
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
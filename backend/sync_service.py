@@ -1,16 +1,69 @@
+import re
+import sys
+import time
 import asyncio
 import logging
-from typing import Dict, List, Any, Optional, Tuple
+import tempfile
+import itertools
+from collections import Counter, defaultdict
+from functools import lru_cache
+from typing import Dict, List, Any, Optional, Tuple, Union, BinaryIO, Callable, Collection, AsyncIterable
 from datetime import datetime
 
 from .config import AppConfig, TableConfig
-from .feishu_client import FeishuClient, FeishuAPIError, create_link_field, format_date_field
+from .feishu_client import (
+    FeishuClient, FeishuAPIError, create_link_field, format_date_field, shared_feishu_client
+)
 from .csv_processor import CSVProcessor
 from .utils import ProcessLogger, create_response
 from .cache_manager import StudentCacheManager
 
 logger = logging.getLogger(__name__)
 
+# 表格字段结构的缓存时间（秒），连续同步时无需重复获取
+TABLE_SCHEMA_CACHE_TTL = 300
+
+# 以数据流传入的CSV内容超过此大小后写入磁盘临时文件
+SYNC_SPOOL_SIZE = 2 * 1024 * 1024
+
+# 学员 用户ID -> record_id 索引的缓存时间（秒），冲突更新查找record_id时复用
+USER_RECORD_INDEX_TTL = 300
+
+# 缓存未命中的用户不超过此数量时，逐个使用服务端过滤查询，不再下载整个学员表
+USER_FILTER_LOOKUP_MAX = 20
+
+# 飞书字段类型编号对应的名称
+FIELD_TYPE_NAMES = {
+    1: "多行文本",
+    2: "数字",
+    3: "单选",
+    4: "多选",
+    5: "日期",
+    7: "复选框",
+    11: "人员",
+    13: "电话号码",
+    15: "超链接",
+    17: "附件",
+    1001: "关联记录",
+    1005: "单行文本"
+}
+
+# CSV处理器生成的核心字段，映射时不报告为无映射规则
+CORE_RECORD_KEYS = frozenset({"user_id", "nickname", "phone", "course", "learning_date"})
+
+# 手机号中的非数字字符，清理时整体替换掉（正则在C层逐字符处理，比逐字符调用isdigit快）
+NON_DIGIT_PATTERN = re.compile(r"\D")
+
+# 表示空值的文本（不区分大小写）；预先列出所有大小写组合，判断时直接查集合，不必逐个值调用lower()
+NULL_VALUE_TOKENS = frozenset(
+    "".join(chars)
+    for token in ("nan", "null", "none")
+    for chars in itertools.product(*((c, c.upper()) for c in token))
+)
+
+# 同步摘要中列出的不同字段信息条数上限，完整次数见updated_count/skipped_count
+FIELD_SUMMARY_SAMPLE_LIMIT = 100
+
 class FieldConflict:
     """字段冲突信息"""
     def __init__(self, field_name: str, existing_value: Any, new_value: Any, user_id: str, nickname: str = None, record_id: str = None):
@@ -52,8 +105,9 @@ class FieldMappingService:
 
     def __init__(self, custom_mapping: Dict[str, Any] = None):
         self.conflicts = []
-        self.skipped_fields = []
-        self.updated_fields = []
+        # 跳过/写入的字段信息 -> 出现次数；逐行记录同一信息只累加计数，内存占用不随行数增长
+        self.skipped_fields: Counter = Counter()
+        self.updated_fields: Counter = Counter()
 
         # 处理新的映射数据结构
         if custom_mapping and isinstance(custom_mapping, dict):
@@ -69,10 +123,129 @@ class FieldMappingService:
             # 使用默认映射
             self.field_mapping = self.DEFAULT_FIELD_MAPPING.copy()
             self.note_mappings = []
+
+        self._note_fields = set(self.note_mappings)
+        # 预先解析每个CSV字段对应的飞书字段和取值处理函数，逐行映射时直接查表
+        self._compiled_mappings = self._compile_field_mappings()
+        # 按表格字段集合缓存的映射特化结果，见_specialize_for_schema
+        self._schema_specializations: Dict[frozenset, Tuple[Dict, Dict]] = {}
+
+    def _compile_field_mappings(self) -> Dict[str, Optional[Tuple[str, Callable[[str], Tuple[Any, Optional[str]]]]]]:
+        """
+        解析字段映射
+
+        Returns:
+            CSV字段 -> (飞书字段, 取值处理函数)；映射到学习记录表的字段为None，同步学员时跳过
+        """
+        compiled = {}
+        for csv_field, feishu_field in self.field_mapping.items():
+            if not feishu_field:
+                continue
+
+            # 字段名会在每个学员的记录中反复作为字典键查找，驻留后相同字段名共用同一个字符串对象，比较时直接按身份命中
+            csv_field = sys.intern(csv_field)
+
+            # 处理带表格前缀的映射（如 "student.姓名" -> "姓名"）
+            if feishu_field.startswith('student.'):
+                feishu_field = feishu_field[8:]  # 移除 'student.' 前缀
+            elif feishu_field.startswith('learning.'):
+                # 学习记录表的字段暂时跳过，在学习记录同步时处理
+                compiled[csv_field] = None
+                continue
+
+            # 对特定字段进行特殊处理
+            if feishu_field == "年龄":
+                processor = self._process_age
+            elif feishu_field == "手机号":
+                processor = self._process_phone
+            else:
+                processor = self._process_text
+            compiled[csv_field] = (sys.intern(feishu_field), processor)
+        return compiled
+
+    def _specialize_for_schema(
+        self, feishu_field_names: Collection[str]
+    ) -> Tuple[Dict[str, Tuple[str, Callable[[str], Tuple[Any, Optional[str]]], str]], Dict[str, str]]:
+        """
+        按飞书表格的字段预先区分可写入的映射与目标字段不存在的映射（同一表格结构只计算一次）
+
+        Returns:
+            (CSV字段 -> (飞书字段, 取值处理函数, 更新记录), CSV字段 -> 跳过原因)
+        """
+        if not isinstance(feishu_field_names, frozenset):
+            feishu_field_names = frozenset(feishu_field_names)
+        specialized = self._schema_specializations.get(feishu_field_names)
+        if specialized is not None:
+            return specialized
+
+        writable_mappings = {}
+        missing_field_reasons = {}
+        for csv_field, compiled in self._compiled_mappings.items():
+            if compiled is None:
+                continue
+            feishu_field, processor = compiled
+            if feishu_field and feishu_field in feishu_field_names:
+                writable_mappings[csv_field] = (feishu_field, processor, f"{csv_field} -> {feishu_field}")
+            elif csv_field in CORE_RECORD_KEYS:
+                continue
+            elif feishu_field:
+                missing_field_reasons[csv_field] = f"{csv_field} (表格中无此字段: {feishu_field})"
+            else:
+                missing_field_reasons[csv_field] = f"{csv_field} (无映射规则)"
+
+        specialized = (writable_mappings, missing_field_reasons)
+        self._schema_specializations[feishu_field_names] = specialized
+        return specialized
+
+    @staticmethod
+    def _process_text(cleaned_value: str) -> Tuple[Any, Optional[str]]:
+        """普通字段保持清理后的文本"""
+        return cleaned_value, None
+
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def _process_age(cleaned_value: str) -> Tuple[Any, Optional[str]]:
+        """年龄字段转换为整数，返回(处理后的值, 跳过原因)（年龄取值种类很少，结果缓存）"""
+        try:
+            # 检查是否为空或无效值
+            if not cleaned_value or cleaned_value == '0':
+                return None, "年龄为空，跳过"
+
+            # 将浮点数转换为整数
+            age_value = int(float(cleaned_value))
+
+            # 验证年龄范围（1-120）
+            if age_value < 1 or age_value > 120:
+                return None, f"年龄超出范围: {age_value}"
+
+            return age_value, None
+        except (ValueError, TypeError):
+            # 如果转换失败，跳过此字段
+            return None, f"年龄格式错误: {cleaned_value}"
+
+    @staticmethod
+    def _process_phone(cleaned_value: str) -> Tuple[Any, Optional[str]]:
+        """手机号字段只保留数字，返回(处理后的值, 跳过原因)"""
+        try:
+            # 去除手机号中的所有非数字字符
+            phone_digits = NON_DIGIT_PATTERN.sub('', cleaned_value)
+
+            # 如果没有数字，跳过
+            if not phone_digits:
+                return None, f"手机号无数字: {cleaned_value}"
+
+            # 验证手机号长度（通常11位）
+            if len(phone_digits) < 7 or len(phone_digits) > 15:
+                logger.warning(f"手机号长度异常: {phone_digits} (长度: {len(phone_digits)})")
+
+            return phone_digits, None
+        except Exception:
+            # 如果处理失败，跳过此字段
+            return None, f"手机号处理失败: {cleaned_value}"
     
-    def map_csv_fields_to_feishu(self, csv_fields: Dict[str, Any], feishu_field_names: List[str],
+    def map_csv_fields_to_feishu(self, csv_fields: Dict[str, Any], feishu_field_names: Collection[str],
                                 course_name: str = None, learning_date: str = None) -> Dict[str, Any]:
-        """将CSV字段映射到飞书字段，支持备注字段的多对一映射"""
+        """将CSV字段映射到飞书字段，支持备注字段的多对一映射（feishu_field_names建议传入集合）"""
         mapped_fields = {}
 
         # 处理备注字段的多对一映射
@@ -80,94 +253,67 @@ class FieldMappingService:
             note_content = self._build_note_content(csv_fields, course_name, learning_date)
             if note_content and "备注" in feishu_field_names:
                 mapped_fields["备注"] = note_content
-                self.updated_fields.append(f"多字段 -> 备注")
+                self.updated_fields[f"多字段 -> 备注"] += 1
 
         # 处理常规一对一映射
+        writable_mappings, missing_field_reasons = self._specialize_for_schema(feishu_field_names)
+        compiled_mappings = self._compiled_mappings
+        note_fields = self._note_fields
         for csv_field, value in csv_fields.items():
             # 跳过映射到备注的字段，因为已经在上面处理了
-            if csv_field in self.note_mappings:
+            if csv_field in note_fields:
                 continue
 
-            # 跳过空值
-            if not value or str(value).strip() == "":
+            # 跳过空值；CSV处理器产生的值已是字符串，不再重复转换
+            if not value:
+                continue
+            cleaned_value = value.strip() if type(value) is str else str(value).strip()
+            if not cleaned_value:
                 continue
 
-            # 查找映射
-            feishu_field = self.field_mapping.get(csv_field)
-
-            # 处理带表格前缀的映射（如 "student.姓名" -> "姓名"）
-            if feishu_field and '.' in feishu_field:
-                if feishu_field.startswith('student.'):
-                    feishu_field = feishu_field[8:]  # 移除 'student.' 前缀
-                elif feishu_field.startswith('learning.'):
-                    # 学习记录表的字段暂时跳过，在学习记录同步时处理
-                    continue
-
-            if feishu_field and feishu_field in feishu_field_names:
-                # 先清理数据：去除前后空白字符
-                cleaned_value = str(value).strip() if value is not None else ""
+            writable = writable_mappings.get(csv_field)
+            if writable is not None:
+                feishu_field, processor, updated_message = writable
 
                 # 跳过空值字段
-                if not cleaned_value or cleaned_value.lower() in ['nan', 'null', 'none']:
-                    self.skipped_fields.append(f"{csv_field} (空值)")
+                if cleaned_value in NULL_VALUE_TOKENS:
+                    self.skipped_fields[f"{csv_field} (空值)"] += 1
                     continue
 
-                # 对特定字段进行特殊处理
-                processed_value = cleaned_value
-
-                if feishu_field == "年龄":
-                    try:
-                        # 检查是否为空或无效值
-                        if not cleaned_value or cleaned_value.lower() in ['0', '']:
-                            self.skipped_fields.append(f"{csv_field} (年龄为空，跳过)")
-                            continue
-
-                        # 将浮点数转换为整数
-                        age_value = int(float(cleaned_value))
-
-                        # 验证年龄范围（1-120）
-                        if age_value < 1 or age_value > 120:
-                            self.skipped_fields.append(f"{csv_field} (年龄超出范围: {age_value})")
-                            continue
-
-                        processed_value = age_value
-                    except (ValueError, TypeError):
-                        # 如果转换失败，跳过此字段
-                        self.skipped_fields.append(f"{csv_field} (年龄格式错误: {cleaned_value})")
-                        continue
-                elif feishu_field == "手机号":
-                    try:
-                        # 去除手机号中的所有非数字字符
-                        phone_digits = ''.join(filter(str.isdigit, cleaned_value))
-
-                        # 如果没有数字，跳过
-                        if not phone_digits:
-                            self.skipped_fields.append(f"{csv_field} (手机号无数字: {cleaned_value})")
-                            continue
-
-                        # 验证手机号长度（通常11位）
-                        if len(phone_digits) < 7 or len(phone_digits) > 15:
-                            logger.warning(f"手机号长度异常: {phone_digits} (长度: {len(phone_digits)})")
-
-                        processed_value = phone_digits
-                    except Exception:
-                        # 如果处理失败，跳过此字段
-                        self.skipped_fields.append(f"{csv_field} (手机号处理失败: {cleaned_value})")
-                        continue
+                processed_value, skip_reason = processor(cleaned_value)
+                if skip_reason:
+                    self.skipped_fields[f"{csv_field} ({skip_reason})"] += 1
+                    continue
 
                 mapped_fields[feishu_field] = processed_value
-                self.updated_fields.append(f"{csv_field} -> {feishu_field}")
-            elif csv_field not in ["user_id", "nickname", "phone", "course", "learning_date"]:
-                # 跳过处理过的核心字段和不存在的字段
-                if feishu_field:
-                    self.skipped_fields.append(f"{csv_field} (表格中无此字段: {feishu_field})")
-                else:
-                    self.skipped_fields.append(f"{csv_field} (无映射规则)")
+                self.updated_fields[updated_message] += 1
+            elif csv_field in missing_field_reasons:
+                # 表格中没有映射的目标字段
+                self.skipped_fields[missing_field_reasons[csv_field]] += 1
+            elif csv_field not in compiled_mappings and csv_field not in CORE_RECORD_KEYS:
+                # 跳过处理过的核心字段和学习记录表的字段
+                self.skipped_fields[f"{csv_field} (无映射规则)"] += 1
 
         return mapped_fields
     
-    def detect_conflicts(self, new_fields: Dict[str, Any], existing_record: Dict[str, Any], user_id: str, nickname: str = None, record_id: str = None) -> List[FieldConflict]:
-        """检测字段冲突"""
+    def split_updates(
+        self,
+        new_fields: Dict[str, Any],
+        existing_record: Dict[str, Any],
+        user_id: str,
+        nickname: str = None,
+        record_id: str = None
+    ) -> Tuple[Dict[str, Any], List[FieldConflict]]:
+        """
+        一次遍历区分可安全更新的字段与冲突字段
+
+        Args:
+            new_fields: 待写入的字段，值应已去除首尾空白（map_csv_fields_to_feishu的结果即是如此）
+
+        Returns:
+            (可安全更新的字段, 冲突列表)；与现有值相同的字段两者都不包含
+        """
+        safe_updates = {}
         conflicts = []
         existing_fields = existing_record.get("fields", {})
         # 获取record_id（如果没有传入，尝试从existing_record中获取）
@@ -177,52 +323,41 @@ class FieldMappingService:
         for field_name, new_value in new_fields.items():
             existing_value = existing_fields.get(field_name)
 
-            # 备注字段采用追加模式，不视为冲突
+            # 备注字段采用追加模式，不视为冲突，总是更新
             if field_name == "备注":
                 # 如果是备注字段，合并内容而不是报告冲突
                 if existing_value and str(existing_value).strip():
-                    merged_content = self._append_to_existing_note(str(existing_value), str(new_value))
-                    new_fields[field_name] = merged_content
+                    new_value = self._append_to_existing_note(str(existing_value), str(new_value))
+                safe_updates[field_name] = new_value
                 continue
 
-            # 其他字段的正常冲突检测
-            if (existing_value and
-                str(existing_value).strip() != "" and
-                str(existing_value).strip() != str(new_value).strip()):
+            # 其他字段：只更新空字段
+            if not existing_value:
+                safe_updates[field_name] = new_value
+                continue
+            existing_text = str(existing_value).strip()
+            if not existing_text:
+                safe_updates[field_name] = new_value
+                continue
 
+            # 已有内容且与新值不同时视为冲突（新值在映射时已去除首尾空白，无需再次strip）
+            if existing_value != new_value and existing_text != (new_value if type(new_value) is str else str(new_value)):
                 conflict = FieldConflict(field_name, existing_value, new_value, user_id, nickname, record_id)
                 conflicts.append(conflict)
                 self.conflicts.append(conflict)
 
-        return conflicts
-
-    def _build_note_content(self, csv_fields: Dict[str, Any], course_name: str = None, learning_date: str = None) -> str:
-        """构建备注字段内容"""
-        if not self.note_mappings:
-            return ""
-
-        # 检查是否所有映射字段都为空
-        has_non_empty_field = False
-        for csv_field in self.note_mappings:
-            value = csv_fields.get(csv_field)
-            if value and str(value).strip():
-                cleaned_value = str(value).strip()
-                # 跳过明显的空值
-                if cleaned_value.lower() not in ['nan', 'null', 'none', '']:
-                    has_non_empty_field = True
-                    break
-
-        # 如果所有字段都为空，不生成任何内容
-        if not has_non_empty_field:
-            return ""
+        return safe_updates, conflicts
 
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def _format_note_title(course_name: Optional[str], learning_date: Optional[str]) -> str:
+        """格式化备注中的课程标题（YYYYMM-课程名），结果缓存"""
         # 格式化课程标题
         title_parts = []
 
         # 处理日期格式化 (转换为YYYYMM格式)
         if learning_date:
             try:
-                from datetime import datetime
                 # 尝试解析日期
                 if '-' in learning_date:
                     # 假设格式为 YYYY-MM-DD 或 YYYY-M-D
@@ -247,21 +382,36 @@ class FieldMappingService:
             title_parts.append(course_name)
 
         # 构建标题
-        title = "-".join(title_parts) if title_parts else "课程记录"
+        return "-".join(title_parts) if title_parts else "课程记录"
 
-        # 构建内容行
-        content_lines = [f">>> {title}", ""]  # 标题后空一行
+    def _build_note_content(self, csv_fields: Dict[str, Any], course_name: str = None, learning_date: str = None) -> str:
+        """构建备注字段内容"""
+        if not self.note_mappings:
+            return ""
 
-        # 添加映射字段的内容
+        # 每个字段只清理一次，跳过明显的空值
+        note_values = []
         for csv_field in self.note_mappings:
             value = csv_fields.get(csv_field)
-            if value and str(value).strip():
-                cleaned_value = str(value).strip()
-                # 跳过明显的空值
-                if cleaned_value.lower() not in ['nan', 'null', 'none', '']:
-                    content_lines.append(f"[{csv_field}]")
-                    content_lines.append(cleaned_value)
-                    content_lines.append("")  # 每个字段后空一行
+            if not value:
+                continue
+            cleaned_value = value.strip() if type(value) is str else str(value).strip()
+            if cleaned_value and cleaned_value not in NULL_VALUE_TOKENS:
+                note_values.append((csv_field, cleaned_value))
+
+        # 如果所有字段都为空，不生成任何内容
+        if not note_values:
+            return ""
+
+        # 构建内容行（同一批数据的课程和日期相同，标题只格式化一次）
+        title = self._format_note_title(course_name, learning_date)
+        content_lines = [f">>> {title}", ""]  # 标题后空一行
+
+        # 添加映射字段的内容
+        for csv_field, cleaned_value in note_values:
+            content_lines.append(f"[{csv_field}]")
+            content_lines.append(cleaned_value)
+            content_lines.append("")  # 每个字段后空一行
 
         # 如果有内容，移除最后的空行
         if len(content_lines) > 2:
@@ -280,14 +430,48 @@ class FieldMappingService:
     def get_summary(self) -> Dict[str, Any]:
         """获取字段处理摘要"""
         return {
-            "updated_fields": self.updated_fields,
-            "skipped_fields": self.skipped_fields,
+            "updated_fields": list(self.updated_fields)[:FIELD_SUMMARY_SAMPLE_LIMIT],
+            "skipped_fields": list(self.skipped_fields)[:FIELD_SUMMARY_SAMPLE_LIMIT],
+            "skipped_reasons": dict(self.skipped_fields.most_common(FIELD_SUMMARY_SAMPLE_LIMIT)),
             "conflicts": [c.to_dict() for c in self.conflicts],
             "conflicts_count": len(self.conflicts),
-            "updated_count": len(self.updated_fields),
-            "skipped_count": len(self.skipped_fields)
+            "updated_count": self.updated_fields.total(),
+            "skipped_count": self.skipped_fields.total()
         }
 
+# 默认映射中字段名的所有常见变体（原名、去除半角空格、去除全角空格），模块加载时计算一次
+KNOWN_FIELD_VARIANTS = frozenset(
+    variant
+    for field in FieldMappingService.DEFAULT_FIELD_MAPPING
+    for variant in (field, field.replace(" ", ""), field.replace("　", ""))
+)
+
+# 核心字段：这些字段会被CSV处理器自动处理
+CORE_FIELD_PATTERN = re.compile("userid|用户id|昵称|nickname|手机|phone", re.IGNORECASE)
+
+def classify_csv_headers(csv_headers: List[str]) -> Tuple[List[str], List[str]]:
+    """
+    区分CSV表头中可自动映射的字段和需要用户配置的字段
+    
+    Returns:
+        (已映射字段列表, 未映射字段列表)
+    """
+    mapped_fields = []
+    unmapped_fields = []
+    
+    for header in csv_headers:
+        # 标准化字段名（去除空格等）
+        normalized_header = header.strip().replace(" ", "").replace("　", "")
+        
+        if (CORE_FIELD_PATTERN.search(normalized_header)
+                or header in KNOWN_FIELD_VARIANTS
+                or normalized_header in KNOWN_FIELD_VARIANTS):
+            mapped_fields.append(header)
+        else:
+            unmapped_fields.append(header)
+    
+    return mapped_fields, unmapped_fields
+
 class SyncResult:
     """同步结果"""
     def __init__(self):
@@ -354,8 +538,8 @@ class SyncResult:
                 "field_mapping": self.field_mapping_summary,
                 "has_conflicts": len(self.conflicts) > 0,
                 "conflicts_count": len(self.conflicts),
-                "updated_fields_count": len(self.updated_fields),
-                "skipped_fields_count": len(self.skipped_fields)
+                "updated_fields_count": self.field_mapping_summary['updated_count'],
+                "skipped_fields_count": self.field_mapping_summary['skipped_count']
             })
         
         return summary
@@ -363,33 +547,49 @@ class SyncResult:
 class StudentSyncService:
     """学员同步服务"""
 
-    def __init__(self, config: AppConfig):
+    def __init__(self, config: AppConfig, cache_manager: Optional[StudentCacheManager] = None):
+        """
+        Args:
+            config: 应用配置
+            cache_manager: 复用的学员缓存管理器；配置变化重建服务时传入旧实例的缓存管理器，
+                保证同一缓存文件的写入始终由同一把锁串行化
+        """
         self.config = config
-        self.process_logger = ProcessLogger("学员同步")
         # TTL设置为10000小时（约416天），实际上缓存不会过期
-        self.cache_manager = StudentCacheManager(cache_dir="cache", ttl_hours=10000)
+        self.cache_manager = cache_manager or StudentCacheManager(cache_dir="cache", ttl_hours=10000)
+        # 表格字段结构缓存：(app_token, table_id) -> (获取时间, 字段列表)
+        self._schema_cache: Dict[Tuple[str, str], Tuple[float, List[Dict]]] = {}
+        # 学员表索引缓存：(app_token, table_id) -> (建立时间, 用户ID -> record_id)
+        self._user_record_index: Dict[Tuple[str, str], Tuple[float, Dict[Any, str]]] = {}
         
     async def sync_csv_data(
         self,
-        file_content: bytes,
+        file_content: Union[bytes, BinaryIO],
         filename: str,
         course_name: str = None,
         learning_date: str = None,
-        field_mapping: Dict[str, str] = None
+        field_mapping: Dict[str, str] = None,
+        encoding: Optional[str] = None
     ) -> Dict[str, Any]:
         """同步CSV数据到飞书表格"""
         result = SyncResult()
+        # 服务实例在并发的同步任务间共享，每次同步使用独立的过程日志，计时和步骤互不干扰
+        process_logger = ProcessLogger("学员同步")
+        # 后台保存学员缓存更新的任务
+        save_task = None
         
         try:
-            self.process_logger.start(f"开始同步数据: {filename}")
+            process_logger.start(f"开始同步数据: {filename}")
             
-            # 1. 处理CSV文件
+            # 1. 处理CSV文件（完整解析和逐行校验较耗CPU，放到线程中执行，避免阻塞事件循环）
             csv_processor = CSVProcessor()
-            csv_result = csv_processor.process_file(
+            csv_result = await asyncio.to_thread(
+                csv_processor.process_file,
                 file_content, 
                 filename,
                 course_name=course_name,
-                learning_date=learning_date
+                learning_date=learning_date,
+                encoding=encoding
             )
             
             if not csv_result["success"]:
@@ -402,12 +602,12 @@ class StudentSyncService:
             learning_records = csv_result["learning_records"]
             result.total_records = len(learning_records)
             
-            self.process_logger.step(
+            process_logger.step(
                 f"CSV处理完成: {len(unique_students)}个学员，{len(learning_records)}条学习记录"
             )
             
             # 2. 同步学员数据
-            async with FeishuClient(self.config) as feishu_client:
+            async with shared_feishu_client(self.config) as feishu_client:
                 # 测试连接
                 connection_test = await feishu_client.test_connection()
                 if not connection_test["success"]:
@@ -416,24 +616,31 @@ class StudentSyncService:
                         message=f"飞书连接失败: {connection_test['message']}"
                     )
                 
+                # 客户端跨请求复用，丢弃上次同步时建立的用户ID索引
+                feishu_client.clear_record_index()
+                
                 # 同步学员总表
                 student_id_mapping = await self._sync_students(
-                    feishu_client, unique_students, result, field_mapping,
+                    feishu_client, unique_students, result, process_logger, field_mapping,
                     course_name=course_name, learning_date=learning_date
                 )
                 
+                # 学员缓存已不再变化，同步学习记录的同时在后台保存缓存更新
+                save_task = asyncio.create_task(self.cache_manager.save_cache_updates())
+                
                 # 同步学习记录表
                 await self._sync_learning_records(
-                    feishu_client, learning_records, student_id_mapping, result
+                    feishu_client, learning_records, student_id_mapping, result, process_logger
                 )
             
             result.finish()
-            self.process_logger.finish(
+            process_logger.finish(
                 f"同步完成: 新增{result.new_students}个学员，{result.new_learning_records}条学习记录"
             )
 
-            # 保存缓存更新到文件
-            await self.cache_manager.save_cache_updates()
+            # 等待缓存保存完成（先置空，保存失败进入异常处理时不会再次等待同一任务）
+            task, save_task = save_task, None
+            await task
 
             return create_response(
                 success=True,
@@ -443,40 +650,48 @@ class StudentSyncService:
             
         except Exception as e:
             result.add_error(f"同步过程发生异常: {str(e)}")
-            self.process_logger.error(f"同步失败: {e}")
+            process_logger.error(f"同步失败: {e}")
+            
+            # 已同步的学员更新仍需写入缓存
+            if save_task is not None:
+                try:
+                    await save_task
+                except Exception as save_error:
+                    logger.error(f"保存缓存失败: {save_error}")
             
             return create_response(
                 success=False,
                 message=f"同步失败: {str(e)}",
                 data=result.get_summary()
             )
+        finally:
+            # 提前返回时也输出缓存的步骤日志
+            process_logger.flush()
     
     async def _sync_students(
         self,
         feishu_client: FeishuClient,
         unique_students: Dict[str, Dict[str, Any]],
         result: SyncResult,
+        process_logger: ProcessLogger,
         field_mapping: Dict[str, str] = None,
         course_name: str = None,
         learning_date: str = None
     ) -> Dict[str, str]:
         """同步学员数据，返回用户ID到record_id的映射"""
-        self.process_logger.step(f"开始同步学员数据: {len(unique_students)}个学员")
+        process_logger.step(f"开始同步学员数据: {len(unique_students)}个学员")
         
         student_table = self.config.student_table
-        student_id_mapping = {}
         
         # 获取学员总表的字段信息，用于字段映射
         try:
-            table_fields = await feishu_client.get_table_fields(
-                student_table.app_token,
-                student_table.table_id
-            )
-            feishu_field_names = [field["field_name"] for field in table_fields]
-            self.process_logger.step(f"获取到学员总表字段: {len(feishu_field_names)}个")
+            table_fields = await self._get_table_fields_cached(feishu_client, student_table)
+            # 每个学员的每个字段都要判断是否存在于表格中，使用集合查找
+            feishu_field_names = frozenset(field["field_name"] for field in table_fields)
+            process_logger.step(f"获取到学员总表字段: {len(feishu_field_names)}个")
         except Exception as e:
             result.add_error(f"获取表格字段失败: {str(e)}")
-            feishu_field_names = []
+            feishu_field_names = frozenset()
         
         # 创建字段映射服务
         field_mapping_service = FieldMappingService(field_mapping)
@@ -486,44 +701,57 @@ class StudentSyncService:
             feishu_client, student_table, list(unique_students.keys())
         )
         
-        # 构建现有学员映射
+        # 构建现有学员映射（用户ID -> 学员记录，record_id从记录中读取）
         existing_students_mapping = {}
         for student in existing_students:
             user_id = student["fields"].get("用户ID")
             if user_id:
-                student_id_mapping[user_id] = student["record_id"]
                 existing_students_mapping[user_id] = student
         
-        self.process_logger.step(f"找到{len(existing_students)}个现有学员")
+        process_logger.step(f"找到{len(existing_students)}个现有学员")
         
-        # 处理每个学员
+        # 处理每个学员：先整理出待创建和待更新的记录，再通过批量接口统一写入
+        pending_creates = []  # (用户ID, 字段)
+        pending_updates = []  # (用户ID, record_id, 字段)
         for user_id, student_data in unique_students.items():
             try:
-                if user_id in student_id_mapping:
-                    # 现有学员，检查并更新字段
-                    updated = await self._update_student_if_needed(
-                        feishu_client, student_table, student_data,
-                        student_id_mapping[user_id], existing_students_mapping[user_id],
+                existing_student = existing_students_mapping.get(user_id)
+                if existing_student is not None:
+                    # 现有学员，检查需要更新的字段
+                    record_id = existing_student["record_id"]
+                    safe_updates = self._build_student_updates(
+                        student_data, record_id, existing_student,
                         field_mapping_service, feishu_field_names, result,
                         course_name=course_name, learning_date=learning_date
                     )
-                    if updated:
-                        result.updated_students += 1
+                    if safe_updates:
+                        pending_updates.append((user_id, record_id, safe_updates))
                 else:
-                    # 新学员，创建记录
-                    record_id = await self._create_new_student(
-                        feishu_client, student_table, student_data,
-                        field_mapping_service, feishu_field_names, result,
+                    # 新学员，整理创建记录的字段
+                    fields = self._build_new_student_fields(
+                        student_data, field_mapping_service, feishu_field_names,
                         course_name=course_name, learning_date=learning_date
                     )
-                    if record_id:
-                        student_id_mapping[user_id] = record_id
+                    pending_creates.append((user_id, fields))
                 
                 result.processed_records += 1
                 
             except Exception as e:
                 result.add_error(f"处理学员{user_id}失败: {str(e)}")
         
+        # 现有学员的record_id，新建学员的record_id在批量创建后加入
+        student_id_mapping = {
+            user_id: student["record_id"] for user_id, student in existing_students_mapping.items()
+        }
+        
+        # 新建与更新涉及的记录互不重叠，两类批量请求同时进行
+        await asyncio.gather(
+            self._flush_new_students(
+                feishu_client, student_table, pending_creates, student_id_mapping, result
+            ),
+            self._flush_student_updates(feishu_client, student_table, pending_updates, result, process_logger)
+        )
+        
         # 设置字段映射摘要
         result.set_field_mapping_summary(field_mapping_service)
         
@@ -552,18 +780,16 @@ class StudentSyncService:
             # 从缓存批量获取学员信息
             cached_students = self.cache_manager.get_students_batch(user_ids)
 
-            logger.info(
-                f"从缓存查询学员: 请求 {len(user_ids)} 个，"
-                f"找到 {len(cached_students)} 个"
-            )
+            # 未开启INFO日志时跳过缓存统计和日志格式化
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("从缓存查询学员: 请求 %d 个，找到 %d 个", len(user_ids), len(cached_students))
 
-            # 获取缓存统计信息
-            cache_stats = self.cache_manager.get_cache_stats()
-            logger.info(
-                f"缓存状态: 总记录 {cache_stats['total_records']}, "
-                f"唯一用户 {cache_stats['unique_users']}, "
-                f"缓存年龄 {cache_stats.get('age_hours', 0):.1f} 小时"
-            )
+                # 获取缓存统计信息
+                cache_stats = self.cache_manager.get_cache_stats()
+                logger.info(
+                    "缓存状态: 总记录 %s, 唯一用户 %s, 缓存年龄 %.1f 小时",
+                    cache_stats['total_records'], cache_stats['unique_users'], cache_stats['age_hours'] or 0
+                )
 
             return cached_students
 
@@ -581,10 +807,11 @@ class StudentSyncService:
         user_ids: List[str]
     ) -> List[Dict]:
         """降级方案：直接查询现有学员"""
-        all_students = []
+        user_id_set = set(user_ids)
+        filtered_students = []
 
         try:
-            # 获取所有学员记录（分页处理）
+            # 获取所有学员记录（分页处理），逐页过滤，只保留匹配的用户ID
             page_token = None
             while True:
                 query_result = await feishu_client.query_records(
@@ -595,120 +822,178 @@ class StudentSyncService:
                 )
 
                 records = query_result.get("records", [])
-                all_students.extend(records)
+                for record in records:
+                    record_user_id = record.get("fields", {}).get("用户ID")
+                    # 富文本等格式的字段值是列表，不可哈希，也不会与用户ID字符串相等
+                    if isinstance(record_user_id, str) and record_user_id in user_id_set:
+                        filtered_students.append(record)
 
                 # 检查是否有更多数据
                 if not query_result.get("has_more", False):
                     break
                 page_token = query_result.get("page_token")
 
-            # 客户端过滤：只保留匹配的用户ID
-            filtered_students = []
-            for record in all_students:
-                record_user_id = record.get("fields", {}).get("用户ID")
-                if record_user_id in user_ids:
-                    filtered_students.append(record)
-
             return filtered_students
 
         except Exception as e:
             logger.warning(f"降级查询学员失败: {e}")
             return []
     
-    async def _create_new_student(
+    def _build_new_student_fields(
         self,
-        feishu_client: FeishuClient,
-        student_table: TableConfig,
         student_data: Dict[str, Any],
         field_mapping_service: 'FieldMappingService',
-        feishu_field_names: List[str],
-        result: SyncResult,
+        feishu_field_names: Collection[str],
         course_name: str = None,
         learning_date: str = None
-    ) -> Optional[str]:
-        """创建新学员记录"""
-        try:
-            # 基本必要字段
-            fields = {
-                "用户ID": student_data["user_id"],
-                "昵称": student_data["nickname"],
-            }
-            
-            # 处理手机号字段，确保格式正确
-            if student_data.get("phone"):
-                phone_value = student_data["phone"]
-                try:
-                    # 去除手机号中的所有非数字字符（与更新逻辑保持一致）
-                    phone_digits = ''.join(filter(str.isdigit, str(phone_value)))
+    ) -> Dict[str, Any]:
+        """整理新学员记录的字段"""
+        # 基本必要字段
+        fields = {
+            "用户ID": student_data["user_id"],
+            "昵称": student_data["nickname"],
+        }
+        
+        # 处理手机号字段，确保格式正确
+        if student_data.get("phone"):
+            phone_value = student_data["phone"]
+            try:
+                # 去除手机号中的所有非数字字符（与更新逻辑保持一致）
+                phone_digits = NON_DIGIT_PATTERN.sub('', str(phone_value))
 
-                    # 如果没有数字，跳过
-                    if not phone_digits:
-                        logger.warning(f"手机号无有效数字，跳过: {phone_value}")
-                    else:
-                        # 验证手机号长度
-                        if len(phone_digits) < 7 or len(phone_digits) > 15:
-                            logger.warning(f"手机号长度异常: {phone_digits} (长度: {len(phone_digits)})")
+                # 如果没有数字，跳过
+                if not phone_digits:
+                    logger.warning(f"手机号无有效数字，跳过: {phone_value}")
+                else:
+                    # 验证手机号长度
+                    if len(phone_digits) < 7 or len(phone_digits) > 15:
+                        logger.warning(f"手机号长度异常: {phone_digits} (长度: {len(phone_digits)})")
 
-                        # 保持为字符串格式，因为飞书中手机号字段是文本类型
-                        fields["手机号"] = phone_digits
+                    # 保持为字符串格式，因为飞书中手机号字段是文本类型
+                    fields["手机号"] = phone_digits
 
-                except Exception as e:
-                    logger.warning(f"手机号处理失败: {phone_value}, 错误: {e}")
-                    # 如果处理失败，使用清理后的字符串
-                    fields["手机号"] = str(phone_value).strip()
+            except Exception as e:
+                logger.warning(f"手机号处理失败: {phone_value}, 错误: {e}")
+                # 如果处理失败，使用清理后的字符串
+                fields["手机号"] = str(phone_value).strip()
+        
+        # 添加CSV中的其他字段
+        csv_all_fields = student_data.get('csv_all_fields', {})
+        if csv_all_fields:
+            additional_fields = field_mapping_service.map_csv_fields_to_feishu(
+                csv_all_fields, feishu_field_names,
+                course_name=course_name,
+                learning_date=learning_date
+            )
+            fields.update(additional_fields)
+        
+        return fields
+    
+    async def _flush_new_students(
+        self,
+        feishu_client: FeishuClient,
+        student_table: TableConfig,
+        pending_creates: List[Tuple[str, Dict[str, Any]]],
+        student_id_mapping: Dict[str, str],
+        result: SyncResult
+    ):
+        """通过批量新增接口创建新学员，并记录新建的record_id"""
+        if not pending_creates:
+            return
+        
+        create_results = await feishu_client.batch_create_records(
+            student_table.app_token,
+            student_table.table_id,
+            [fields for _, fields in pending_creates],
+            concurrency=self.config.write_concurrency
+        )
+        
+        for (user_id, fields), create_result in zip(pending_creates, create_results):
+            if not create_result["success"]:
+                result.add_error(f"创建学员{user_id}失败: {create_result['error']}")
+                continue
             
-            # 添加CSV中的其他字段
-            csv_all_fields = student_data.get('csv_all_fields', {})
-            if csv_all_fields:
-                additional_fields = field_mapping_service.map_csv_fields_to_feishu(
-                    csv_all_fields, feishu_field_names,
-                    course_name=course_name,
-                    learning_date=learning_date
-                )
-                fields.update(additional_fields)
+            record_id = create_result["record"]["record_id"]
+            student_id_mapping[user_id] = record_id
+            self._remember_user_record(student_table, user_id, record_id)
             
-            record = await feishu_client.create_record(
-                student_table.app_token,
-                student_table.table_id,
-                fields
-            )
-
             # 更新缓存
             if self.cache_manager.is_loaded:
                 self.cache_manager.add_student(
-                    student_data["user_id"],
+                    user_id,
                     {
-                        "record_id": record["record_id"],
+                        "record_id": record_id,
                         "fields": fields
                     }
                 )
-
-            result.new_students += 1
-            return record["record_id"]
             
-        except Exception as e:
-            result.add_error(f"创建学员{student_data['user_id']}失败: {str(e)}")
-            return None
+            result.new_students += 1
     
-    async def _update_student_if_needed(
+    async def _flush_student_updates(
         self,
         feishu_client: FeishuClient,
         student_table: TableConfig,
+        pending_updates: List[Tuple[str, str, Dict[str, Any]]],
+        result: SyncResult,
+        process_logger: ProcessLogger
+    ):
+        """通过批量更新接口写入现有学员的字段更新"""
+        if not pending_updates:
+            return
+        
+        update_results = await feishu_client.batch_update_records(
+            student_table.app_token,
+            student_table.table_id,
+            [{"record_id": record_id, "fields": safe_updates} for _, record_id, safe_updates in pending_updates],
+            concurrency=self.config.write_concurrency
+        )
+        
+        for (user_id, _, safe_updates), update_result in zip(pending_updates, update_results):
+            if not update_result["success"]:
+                error = update_result["error"]
+                error_msg = f"更新学员{user_id}字段失败: {error}"
+                logger.error(f"{error_msg} - 尝试更新的字段: {safe_updates}")
+                
+                # 检查是否是NumberFieldConvFail错误
+                if "NumberFieldConvFail" in error:
+                    # 分析哪个字段可能导致了问题
+                    for field_name, field_value in safe_updates.items():
+                        logger.error(f"疑似问题字段 {field_name}: 值='{field_value}', 类型={type(field_value)}")
+                
+                result.add_error(error_msg)
+                continue
+            
+            # 更新缓存
+            if self.cache_manager.is_loaded:
+                # 获取当前缓存的记录并更新字段
+                cached_record = self.cache_manager.get_student(user_id)
+                if cached_record:
+                    cached_record["fields"].update(safe_updates)
+                    self.cache_manager.update_student(user_id, cached_record)
+            
+            # 记录更新信息
+            updated_info = ", ".join([f"{k}: {v}" for k, v in safe_updates.items()])
+            process_logger.step(f"更新学员 {user_id} 字段: {updated_info}")
+            
+            result.updated_students += 1
+    
+    def _build_student_updates(
+        self,
         student_data: Dict[str, Any],
         record_id: str,
         existing_student: Dict[str, Any],
         field_mapping_service: 'FieldMappingService',
-        feishu_field_names: List[str],
+        feishu_field_names: Collection[str],
         result: SyncResult,
         course_name: str = None,
         learning_date: str = None
-    ) -> bool:
-        """如果需要则更新学员信息"""
+    ) -> Optional[Dict[str, Any]]:
+        """检查现有学员需要更新的字段，返回可安全更新的字段（无需更新时返回None）"""
         try:
             # 获取CSV中的所有字段
             csv_all_fields = student_data.get('csv_all_fields', {})
             if not csv_all_fields:
-                return False
+                return None
 
             # 映射CSV字段到飞书字段
             new_fields = field_mapping_service.map_csv_fields_to_feishu(
@@ -723,77 +1008,24 @@ class StudentSyncService:
                 new_fields['昵称'] = student_data['nickname']
 
             if not new_fields:
-                return False
+                return None
             
-            # 检测冲突（传递record_id用于优化）
-            conflicts = field_mapping_service.detect_conflicts(
+            # 分离无冲突的字段和有冲突的字段（传递record_id用于优化）
+            safe_updates, conflicts = field_mapping_service.split_updates(
                 new_fields, existing_student, student_data["user_id"], student_data["nickname"], record_id
             )
             
-            # 分离无冲突的字段和有冲突的字段
-            safe_updates = {}
-            conflicted_fields = {c.field_name for c in conflicts}
-            
-            for field_name, new_value in new_fields.items():
-                if field_name not in conflicted_fields:
-                    # 备注字段特殊处理：即使有内容也要更新（因为是追加）
-                    if field_name == "备注":
-                        # 备注字段总是更新（detect_conflicts已经处理了合并）
-                        safe_updates[field_name] = new_value
-                    else:
-                        # 其他字段：只更新空字段
-                        existing_value = existing_student.get("fields", {}).get(field_name)
-                        if not existing_value or str(existing_value).strip() == "":
-                            safe_updates[field_name] = new_value
-            
-            # 执行安全更新
+            # 返回安全更新的字段，由调用方批量写入
             if safe_updates:
-                try:
-                    # 详细记录即将更新的字段
-                    logger.info(f"准备更新学员 {student_data['user_id']} 字段: {safe_updates}")
+                # 详细记录即将更新的字段
+                logger.info(f"准备更新学员 {student_data['user_id']} 字段: {safe_updates}")
 
-                    # 验证数据格式
+                # 验证数据格式
+                if logger.isEnabledFor(logging.DEBUG):
                     for field_name, field_value in safe_updates.items():
-                        logger.debug(f"字段 {field_name}: 值='{field_value}', 类型={type(field_value)}")
-
-                    await feishu_client.update_record(
-                        student_table.app_token,
-                        student_table.table_id,
-                        record_id,
-                        safe_updates
-                    )
-
-                    logger.info(f"成功更新学员 {student_data['user_id']} 字段")
-
-                    # 更新缓存
-                    if self.cache_manager.is_loaded:
-                        # 获取当前缓存的记录并更新字段
-                        cached_record = self.cache_manager.get_student(student_data["user_id"])
-                        if cached_record:
-                            cached_record["fields"].update(safe_updates)
-                            self.cache_manager.update_student(
-                                student_data["user_id"],
-                                cached_record
-                            )
-
-                    # 记录更新信息
-                    updated_info = ", ".join([f"{k}: {v}" for k, v in safe_updates.items()])
-                    self.process_logger.step(f"更新学员 {student_data['user_id']} 字段: {updated_info}")
-
-                    return True
-                    
-                except Exception as e:
-                    error_msg = f"更新学员{student_data['user_id']}字段失败: {str(e)}"
-                    logger.error(f"{error_msg} - 尝试更新的字段: {safe_updates}")
-
-                    # 检查是否是NumberFieldConvFail错误
-                    if "NumberFieldConvFail" in str(e):
-                        # 分析哪个字段可能导致了问题
-                        for field_name, field_value in safe_updates.items():
-                            logger.error(f"疑似问题字段 {field_name}: 值='{field_value}', 类型={type(field_value)}")
+                        logger.debug("字段 %s: 值='%s', 类型=%s", field_name, field_value, type(field_value))
 
-                    result.add_error(error_msg)
-                    return False
+                return safe_updates
             
             # 如果有冲突，记录警告信息
             if conflicts:
@@ -806,24 +1038,27 @@ class StudentSyncService:
                     f"学员{student_data['nickname']}存在字段冲突，需要手动确认: {'; '.join(conflict_info)}"
                 )
             
-            return False
+            return None
             
         except Exception as e:
             result.add_error(f"更新学员{student_data['user_id']}失败: {str(e)}")
-            return False
+            return None
     
     async def _sync_learning_records(
         self, 
         feishu_client: FeishuClient, 
         learning_records: List[Dict[str, Any]], 
         student_id_mapping: Dict[str, str], 
-        result: SyncResult
+        result: SyncResult,
+        process_logger: ProcessLogger
     ):
         """同步学习记录"""
-        self.process_logger.step(f"开始同步学习记录: {len(learning_records)}条记录")
+        process_logger.step(f"开始同步学习记录: {len(learning_records)}条记录")
         
         learning_table = self.config.learning_record_table
         
+        # 整理所有学习记录的字段，再通过批量新增接口统一创建
+        pending_records = []
         for record in learning_records:
             try:
                 user_id = record["user_id"]
@@ -833,48 +1068,47 @@ class StudentSyncService:
                     result.add_warning(f"学员{user_id}不存在，跳过学习记录")
                     continue
                 
-                # 创建学习记录
-                await self._create_learning_record(
-                    feishu_client, learning_table, record, 
-                    student_id_mapping[user_id], result
+                pending_records.append(
+                    self._build_learning_record_fields(record, student_id_mapping[user_id])
                 )
                 
             except Exception as e:
                 result.add_error(f"处理学习记录失败: {str(e)}")
+        
+        if not pending_records:
+            return
+        
+        create_results = await feishu_client.batch_create_records(
+            learning_table.app_token,
+            learning_table.table_id,
+            pending_records,
+            concurrency=self.config.write_concurrency
+        )
+        
+        for create_result in create_results:
+            if create_result["success"]:
+                result.new_learning_records += 1
+            else:
+                result.add_error(f"创建学习记录失败: {create_result['error']}")
     
-    async def _create_learning_record(
+    def _build_learning_record_fields(
         self, 
-        feishu_client: FeishuClient, 
-        learning_table: TableConfig, 
         record_data: Dict[str, Any], 
-        student_record_id: str, 
-        result: SyncResult
-    ):
-        """创建学习记录"""
-        try:
-            fields = {
-                "用户ID": record_data["user_id"],
-                "昵称": record_data.get("nickname", ""),  # 添加昵称字段
-                "课程": record_data["course"],
-                "学习日期": format_date_field(record_data["learning_date"]),
-                "学员总表": create_link_field(student_record_id)  # 修正关联字段名称
-            }
-            
-            await feishu_client.create_record(
-                learning_table.app_token,
-                learning_table.table_id,
-                fields
-            )
-            
-            result.new_learning_records += 1
-            
-        except Exception as e:
-            result.add_error(f"创建学习记录失败: {str(e)}")
+        student_record_id: str
+    ) -> Dict[str, Any]:
+        """整理学习记录的字段"""
+        return {
+            "用户ID": record_data["user_id"],
+            "昵称": record_data.get("nickname", ""),  # 添加昵称字段
+            "课程": record_data["course"],
+            "学习日期": format_date_field(record_data["learning_date"]),
+            "学员总表": create_link_field(student_record_id)  # 修正关联字段名称
+        }
     
     async def test_table_connection(self, table_config: TableConfig) -> Dict[str, Any]:
         """测试表格连接"""
         try:
-            async with FeishuClient(self.config) as feishu_client:
+            async with shared_feishu_client(self.config) as feishu_client:
                 # 测试基本连接
                 connection_test = await feishu_client.test_connection()
                 if not connection_test["success"]:
@@ -905,17 +1139,15 @@ class StudentSyncService:
     async def get_table_fields_info(self) -> Dict[str, Any]:
         """获取表格字段信息（用于字段映射配置）"""
         try:
-            async with FeishuClient(self.config) as feishu_client:
+            async with shared_feishu_client(self.config) as feishu_client:
                 # 获取学员总表字段
-                student_fields = await feishu_client.get_table_fields(
-                    self.config.student_table.app_token,
-                    self.config.student_table.table_id
+                student_fields = await self._get_table_fields_cached(
+                    feishu_client, self.config.student_table
                 )
 
                 # 获取学习记录表字段
-                learning_fields = await feishu_client.get_table_fields(
-                    self.config.learning_record_table.app_token,
-                    self.config.learning_record_table.table_id
+                learning_fields = await self._get_table_fields_cached(
+                    feishu_client, self.config.learning_record_table
                 )
 
                 # 格式化字段信息
@@ -954,26 +1186,23 @@ class StudentSyncService:
 
     def _get_field_type_name(self, field_type: int) -> str:
         """获取字段类型名称"""
-        type_mapping = {
-            1: "多行文本",
-            2: "数字",
-            3: "单选",
-            4: "多选",
-            5: "日期",
-            7: "复选框",
-            11: "人员",
-            13: "电话号码",
-            15: "超链接",
-            17: "附件",
-            1001: "关联记录",
-            1005: "单行文本"
-        }
-        return type_mapping.get(field_type, f"未知类型({field_type})")
+        return FIELD_TYPE_NAMES.get(field_type) or f"未知类型({field_type})"
+
+    async def _get_table_fields_cached(self, feishu_client: FeishuClient, table_config: TableConfig) -> List[Dict]:
+        """获取表格字段信息，短时间内重复获取时使用缓存"""
+        key = (table_config.app_token, table_config.table_id)
+        cached = self._schema_cache.get(key)
+        if cached and time.monotonic() - cached[0] < TABLE_SCHEMA_CACHE_TTL:
+            return cached[1]
+
+        fields = await feishu_client.get_table_fields(table_config.app_token, table_config.table_id)
+        self._schema_cache[key] = (time.monotonic(), fields)
+        return fields
     
     async def validate_table_structure(self) -> Dict[str, Any]:
         """验证表格结构"""
         try:
-            async with FeishuClient(self.config) as feishu_client:
+            async with shared_feishu_client(self.config) as feishu_client:
                 # 验证学员总表
                 student_result = await self.test_table_connection(self.config.student_table)
                 
@@ -999,14 +1228,15 @@ class StudentSyncService:
 
     async def update_selected_conflicts(self, selected_conflicts: List[Dict[str, Any]]) -> Dict[str, Any]:
         """更新选中的冲突字段"""
+        process_logger = ProcessLogger("学员同步")
         try:
-            self.process_logger.start(f"开始更新{len(selected_conflicts)}个冲突字段")
+            process_logger.start(f"开始更新{len(selected_conflicts)}个冲突字段")
 
             updated_count = 0
             failed_count = 0
             errors = []
 
-            async with FeishuClient(self.config) as feishu_client:
+            async with shared_feishu_client(self.config) as feishu_client:
                 # 测试连接
                 connection_test = await feishu_client.test_connection()
                 if not connection_test["success"]:
@@ -1015,6 +1245,7 @@ class StudentSyncService:
                         "message": f"飞书连接失败: {connection_test['message']}"
                     }
 
+                feishu_client.clear_record_index()
                 student_table = self.config.student_table
 
                 # 确保缓存已加载（用于方案1的优化）
@@ -1024,67 +1255,75 @@ class StudentSyncService:
                 if cache_loaded:
                     logger.info("缓存已加载，将使用缓存加速查找")
                 
-                # 按用户ID分组冲突
-                user_conflicts = {}
-                for conflict in selected_conflicts:
-                    user_id = conflict["user_id"]
-                    if user_id not in user_conflicts:
-                        user_conflicts[user_id] = []
-                    user_conflicts[user_id].append(conflict)
+                # 同一用户的同一字段只保留最后提交的冲突，再按用户ID分组
+                latest_conflicts = {
+                    (conflict["user_id"], conflict["field_name"]): conflict
+                    for conflict in selected_conflicts
+                }
+                user_conflicts = defaultdict(list)
+                for conflict in latest_conflicts.values():
+                    user_conflicts[conflict["user_id"]].append(conflict)
                 
-                # 对每个用户更新冲突字段
+                # 先确定所有用户的record_id，再开始更新：
+                # 写入会使客户端的用户索引失效，缓存未命中的用户统一通过一次整表扫描查找
+                record_ids = {}
+                missing_user_ids = []
                 for user_id, conflicts in user_conflicts.items():
-                    try:
-                        # 方案3优化：优先使用冲突数据中的record_id
-                        record_id = None
-                        if conflicts[0].get("record_id"):
-                            record_id = conflicts[0]["record_id"]
-                            logger.debug(f"使用冲突数据中的record_id: {record_id}")
-                        else:
-                            # 方案1优化：从缓存查找record_id
-                            if self.cache_manager.is_loaded:
-                                cached_record = self.cache_manager.get_student(user_id)
-                                if cached_record:
-                                    record_id = cached_record.get("record_id")
-                                    logger.debug(f"从缓存找到用户 {user_id} 的record_id")
-
-                            # 最后降级到原始查找方法
-                            if not record_id:
-                                logger.warning(f"缓存未命中，降级查询用户 {user_id}")
-                                user_record = await self._find_user_record(feishu_client, student_table, user_id)
-                                if user_record:
-                                    record_id = user_record["record_id"]
-
-                        if not record_id:
-                            errors.append(f"用户{user_id}不存在")
-                            failed_count += len(conflicts)
-                            continue
-
-                        # 准备更新字段
-                        update_fields = {}
-                        for conflict in conflicts:
-                            field_name = conflict["field_name"]
-                            new_value = conflict["new_value"]
-                            update_fields[field_name] = new_value
-
-                        # 执行更新
-                        await feishu_client.update_record(
-                            student_table.app_token,
-                            student_table.table_id,
-                            record_id,
-                            update_fields
-                        )
-                        
-                        updated_count += len(conflicts)
-                        self.process_logger.step(f"用户{user_id}更新{len(conflicts)}个字段成功")
-                        
-                    except Exception as e:
-                        error_msg = f"用户{user_id}更新失败: {str(e)}"
-                        errors.append(error_msg)
+                    # 方案3优化：优先使用冲突数据中的record_id
+                    record_id = conflicts[0].get("record_id")
+                    if record_id:
+                        logger.debug(f"使用冲突数据中的record_id: {record_id}")
+                    elif self.cache_manager.is_loaded:
+                        # 方案1优化：从缓存查找record_id
+                        cached_record = self.cache_manager.get_student(user_id)
+                        if cached_record:
+                            record_id = cached_record.get("record_id")
+                            logger.debug(f"从缓存找到用户 {user_id} 的record_id")
+                    if record_id:
+                        record_ids[user_id] = record_id
+                    else:
+                        missing_user_ids.append(user_id)
+
+                # 最后降级到整表查找（只扫描一次）
+                if missing_user_ids:
+                    logger.warning(f"缓存未命中{len(missing_user_ids)}个用户，降级查询学员表")
+                    user_record_ids = await self._lookup_user_record_ids(feishu_client, student_table, missing_user_ids)
+                    for user_id in missing_user_ids:
+                        record_id = user_record_ids.get(user_id)
+                        if record_id:
+                            record_ids[user_id] = record_id
+
+                # 合并每个用户的冲突字段
+                pending_updates = []
+                for user_id, conflicts in user_conflicts.items():
+                    record_id = record_ids.get(user_id)
+                    if not record_id:
+                        errors.append(f"用户{user_id}不存在")
                         failed_count += len(conflicts)
-                        logger.error(error_msg)
+                        continue
+
+                    update_fields = {conflict["field_name"]: conflict["new_value"] for conflict in conflicts}
+                    pending_updates.append((user_id, len(conflicts), {"record_id": record_id, "fields": update_fields}))
+
+                # 通过批量更新接口写入（每批最多500条，批量请求被拒绝时自动逐条更新定位失败记录）
+                if pending_updates:
+                    update_results = await feishu_client.batch_update_records(
+                        student_table.app_token,
+                        student_table.table_id,
+                        [record for _, _, record in pending_updates],
+                        concurrency=self.config.write_concurrency
+                    )
+                    for (user_id, field_count, _), update_result in zip(pending_updates, update_results):
+                        if update_result["success"]:
+                            updated_count += field_count
+                            process_logger.step(f"用户{user_id}更新{field_count}个字段成功")
+                        else:
+                            error_msg = f"用户{user_id}更新失败: {update_result['error']}"
+                            errors.append(error_msg)
+                            failed_count += field_count
+                            logger.error(error_msg)
             
-            self.process_logger.finish(f"冲突更新完成: 成功{updated_count}个，失败{failed_count}个")
+            process_logger.finish(f"冲突更新完成: 成功{updated_count}个，失败{failed_count}个")
             
             return {
                 "success": True,
@@ -1098,43 +1337,111 @@ class StudentSyncService:
             
         except Exception as e:
             error_msg = f"冲突更新过程发生异常: {str(e)}"
-            self.process_logger.error(error_msg)
+            process_logger.error(error_msg)
             return {
                 "success": False,
                 "message": error_msg
             }
+        finally:
+            # 提前返回时也输出缓存的步骤日志
+            process_logger.flush()
+
+    async def _lookup_user_record_ids(
+        self,
+        feishu_client: FeishuClient,
+        student_table: TableConfig,
+        user_ids: Collection[str]
+    ) -> Dict[Any, str]:
+        """
+        查找学员的record_id（同一用户有多条记录时取第一条）
+
+        缓存的索引未过期且包含所有要查找的用户时直接使用；要查找的用户较少时逐个使用服务端过滤查询，
+        只传输匹配的记录；否则分页扫描一次学员表，找到所有用户后即停止
+
+        Returns:
+            用户ID -> record_id，找不到的用户不包含在内
+        """
+        key = (student_table.app_token, student_table.table_id)
+        cached = self._user_record_index.get(key)
+        if (
+            cached
+            and time.monotonic() - cached[0] < USER_RECORD_INDEX_TTL
+            and all(user_id in cached[1] for user_id in user_ids)
+        ):
+            return cached[1]
+
+        if (
+            len(user_ids) <= USER_FILTER_LOOKUP_MAX
+            and feishu_client.is_user_id_filter_supported(student_table.app_token, student_table.table_id)
+        ):
+            return await self._filter_user_record_ids(feishu_client, student_table, user_ids)
+
+        return await self._scan_user_record_ids(feishu_client, student_table, user_ids)
+
+    async def _filter_user_record_ids(
+        self,
+        feishu_client: FeishuClient,
+        student_table: TableConfig,
+        user_ids: Collection[str]
+    ) -> Dict[Any, str]:
+        """使用服务端过滤逐个查询用户的record_id（并发数受写入并发上限约束）"""
+        semaphore = asyncio.Semaphore(self.config.write_concurrency)
+
+        async def find_record_id(user_id: str) -> Optional[str]:
+            async with semaphore:
+                try:
+                    record = await feishu_client.find_first_record_by_user_id(
+                        student_table.app_token,
+                        student_table.table_id,
+                        "用户ID",
+                        user_id
+                    )
+                except Exception as e:
+                    logger.error(f"查找用户{user_id}记录失败: {e}")
+                    return None
+            return record["record_id"] if record else None
 
-    async def _find_user_record(self, feishu_client: FeishuClient, student_table: TableConfig, user_id: str) -> Optional[Dict]:
-        """查找用户记录"""
+        record_ids = await asyncio.gather(*(find_record_id(user_id) for user_id in user_ids))
+        found = {user_id: record_id for user_id, record_id in zip(user_ids, record_ids) if record_id}
+        for user_id, record_id in found.items():
+            self._remember_user_record(student_table, user_id, record_id)
+        return found
+
+    async def _scan_user_record_ids(
+        self,
+        feishu_client: FeishuClient,
+        student_table: TableConfig,
+        user_ids: Collection[str]
+    ) -> Dict[Any, str]:
+        """
+        分页扫描一次学员表查找record_id，所有用户都找到后不再继续翻页
+
+        扫描过的记录都缓存为索引：缓存只在包含所有要查找的用户时才会使用，提前结束扫描得到的部分索引也可以复用
+        """
+        key = (student_table.app_token, student_table.table_id)
         try:
-            # 使用客户端过滤方式查找用户记录
-            page_token = None
-            while True:
-                query_result = await feishu_client.query_records(
-                    student_table.app_token,
-                    student_table.table_id,
-                    page_size=500,
-                    page_token=page_token
-                )
-                
-                records = query_result.get("records", [])
-                
-                # 查找匹配的用户ID
-                for record in records:
-                    record_user_id = record.get("fields", {}).get("用户ID")
-                    if record_user_id == user_id:
-                        return record
-                
-                # 检查是否有更多数据
-                if not query_result.get("has_more", False):
-                    break
-                page_token = query_result.get("page_token")
-            
-            return None
-            
+            record_ids = await feishu_client.find_record_ids_by_user_ids(
+                student_table.app_token,
+                student_table.table_id,
+                "用户ID",
+                user_ids
+            )
         except Exception as e:
             logger.error(f"查找用户记录失败: {e}")
-            return None
+            return {}
+
+        self._user_record_index[key] = (time.monotonic(), record_ids)
+        return record_ids
+
+    def _remember_user_record(self, student_table: TableConfig, user_id: str, record_id: str):
+        """新建学员后补充到已缓存的索引中"""
+        cached = self._user_record_index.get((student_table.app_token, student_table.table_id))
+        if cached:
+            cached[1].setdefault(user_id, record_id)
+
+    def clear_user_record_index(self):
+        """清空学员表索引缓存"""
+        self._user_record_index.clear()
 
 # 工具函数
 def create_sync_service(config: AppConfig) -> StudentSyncService:
@@ -1143,16 +1450,34 @@ def create_sync_service(config: AppConfig) -> StudentSyncService:
 
 async def quick_sync(
     config: AppConfig, 
-    file_content: bytes, 
+    file_content: Union[bytes, BinaryIO, AsyncIterable[bytes]], 
     filename: str,
     course_name: str = None,
     learning_date: str = None
 ) -> Dict[str, Any]:
-    """快速同步接口"""
+    """
+    快速同步接口
+
+    Args:
+        file_content: 文件内容、二进制文件句柄，或逐块产生文件内容的异步迭代器（如请求体数据流）；
+            数据流会边接收边写入临时文件（小文件留在内存，大文件落盘），不需要先把整个文件读入内存
+    """
     service = StudentSyncService(config)
-    return await service.sync_csv_data(
-        file_content, 
-        filename, 
-        course_name=course_name, 
-        learning_date=learning_date
-    ) 
\ No newline at end of file
+    if not hasattr(file_content, "__aiter__"):
+        return await service.sync_csv_data(
+            file_content, 
+            filename, 
+            course_name=course_name, 
+            learning_date=learning_date
+        )
+
+    with tempfile.SpooledTemporaryFile(max_size=SYNC_SPOOL_SIZE) as spooled:
+        async for chunk in file_content:
+            spooled.write(chunk)
+        spooled.seek(0)
+        return await service.sync_csv_data(
+            spooled, 
+            filename, 
+            course_name=course_name, 
+            learning_date=learning_date
+        ) 
\ No newline at end of file
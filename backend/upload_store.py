@@ -0,0 +1,137 @@
+"""
+上传会话存储
+按上传令牌保存已上传的CSV文件数据，避免多个用户共用一个全局变量互相覆盖
+"""
+
+import logging
+import secrets
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, BinaryIO, Callable
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class UploadSession:
+    """一次CSV上传的文件句柄与元信息"""
+    content: Optional[BinaryIO]
+    filename: str
+    size: int
+    headers: List[str]
+    encoding: str
+    course_name: str
+    learning_date: str
+    field_mapping: Optional[Dict[str, Any]] = None
+    sync_job_id: Optional[str] = None
+
+    def drop_content(self):
+        """关闭并释放上传文件占用的临时文件，可重复调用"""
+        content, self.content = self.content, None
+        if content is not None:
+            try:
+                content.close()
+            except Exception as e:
+                logger.warning(f"关闭上传临时文件失败: {e}")
+
+
+class UploadSessionStore:
+    """带过期时间的上传会话存储"""
+
+    def __init__(
+        self,
+        maxsize: int = 128,
+        ttl_seconds: int = 1800,
+        is_pinned: Optional[Callable[[UploadSession], bool]] = None
+    ):
+        """
+        初始化上传会话存储
+
+        Args:
+            maxsize: 最多保留的上传会话数量，超出时淘汰最早的会话
+            ttl_seconds: 会话有效期（秒）
+            is_pinned: 判断会话是否仍在使用（如同步任务正在读取文件），使用中的会话不会被过期清理或淘汰
+        """
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.is_pinned = is_pinned or (lambda session: False)
+        # token -> (过期时间, 上传会话)，按插入顺序排列
+        self._sessions: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def put(self, session: UploadSession) -> str:
+        """
+        保存上传会话并返回上传令牌
+
+        Args:
+            session: 上传会话
+
+        Returns:
+            上传令牌
+        """
+        self._purge_expired()
+        evictable = [
+            token for token, (_, session) in self._sessions.items()
+            if not self.is_pinned(session)
+        ]
+        for token in evictable[:max(len(self._sessions) - self.maxsize + 1, 0)]:
+            _, evicted = self._sessions.pop(token)
+            evicted.drop_content()
+        if len(self._sessions) >= self.maxsize:
+            logger.warning(f"上传会话均在使用中，暂时超出数量上限: {len(self._sessions) + 1}")
+
+        token = secrets.token_urlsafe(16)
+        self._sessions[token] = (time.monotonic() + self.ttl_seconds, session)
+        return token
+
+    def get(self, token: Optional[str]) -> Optional[UploadSession]:
+        """
+        获取上传会话
+
+        Args:
+            token: 上传令牌，为空时返回None（不能回退到其他用户的上传）
+
+        Returns:
+            上传会话或None
+        """
+        self._purge_expired()
+        entry = self._sessions.get(token) if token else None
+        return entry[1] if entry else None
+
+    def pop(self, token: Optional[str]) -> Optional[UploadSession]:
+        """
+        移除上传会话并释放其文件内容
+
+        Args:
+            token: 上传令牌，为空时不移除任何会话
+
+        Returns:
+            被移除的上传会话（文件内容已释放）或None
+        """
+        self._purge_expired()
+        entry = self._sessions.pop(token, None) if token else None
+        if not entry:
+            return None
+        entry[1].drop_content()
+        return entry[1]
+
+    def clear(self):
+        """清空所有上传会话"""
+        for _, session in self._sessions.values():
+            session.drop_content()
+        self._sessions.clear()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _purge_expired(self):
+        """清理过期会话（同步任务仍在使用的会话等任务结束后再清理）"""
+        now = time.monotonic()
+        expired = [
+            token for token, (expires_at, session) in self._sessions.items()
+            if expires_at <= now and not self.is_pinned(session)
+        ]
+        for token in expired:
+            _, session = self._sessions.pop(token)
+            session.drop_content()
+            logger.info(f"上传会话已过期: {session.filename}")
@@ -1,9 +1,48 @@
 import os
+import re
+import gzip
+import queue
+import shutil
+import atexit
+import time
 import logging
 import logging.handlers
 from datetime import datetime
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 import json
+import orjson
+from fastapi.responses import JSONResponse
+
+# 在后台线程中写日志文件的监听器，setup_logging时创建
+_log_listener: Optional[logging.handlers.QueueListener] = None
+
+def _stop_log_listener():
+    """停止日志监听线程，写完队列中剩余的日志"""
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
+
+atexit.register(_stop_log_listener)
+
+class CompressingRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """轮转时把备份日志压缩为gzip文件（app.log.1.gz ...），日志文本通常能压缩到十分之一左右"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.namer = self._gzip_namer
+        self.rotator = self._gzip_rotator
+
+    @staticmethod
+    def _gzip_namer(name: str) -> str:
+        return name + ".gz"
+
+    @staticmethod
+    def _gzip_rotator(source: str, dest: str):
+        # 轮转很少发生，使用最快的压缩级别；轮转在日志线程中执行，不阻塞请求处理
+        with open(source, "rb") as src, gzip.open(dest, "wb", compresslevel=1) as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.remove(source)
 
 def setup_logging(
     log_level: str = "INFO",
@@ -24,7 +63,8 @@ def setup_logging(
     logger = logging.getLogger()
     logger.setLevel(level)
     
-    # 清除现有处理器
+    # 清除现有处理器（重新配置时先停掉之前的日志线程）
+    _stop_log_listener()
     logger.handlers.clear()
     
     # 定义日志格式
@@ -33,65 +73,100 @@ def setup_logging(
         datefmt='%Y-%m-%d %H:%M:%S'
     )
     
-    # 控制台输出
+    # 实际输出日志的处理器，统一放到后台线程执行
+    output_handlers = []
+    
+    # 控制台输出（StreamHandler每条日志只写一次并刷新，耗时主要在写终端/管道本身）
     if console_output:
         console_handler = logging.StreamHandler()
         console_handler.setLevel(level)
         console_handler.setFormatter(formatter)
-        logger.addHandler(console_handler)
+        output_handlers.append(console_handler)
     
     # 文件输出
     if file_output:
         # 普通日志文件
-        file_handler = logging.handlers.RotatingFileHandler(
+        file_handler = CompressingRotatingFileHandler(
             os.path.join(log_dir, 'app.log'),
             maxBytes=10*1024*1024,  # 10MB
             backupCount=5
         )
         file_handler.setLevel(level)
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
         
         # 错误日志文件
-        error_handler = logging.handlers.RotatingFileHandler(
+        error_handler = CompressingRotatingFileHandler(
             os.path.join(log_dir, 'error.log'),
             maxBytes=10*1024*1024,  # 10MB
             backupCount=5
         )
         error_handler.setLevel(logging.ERROR)
         error_handler.setFormatter(formatter)
-        logger.addHandler(error_handler)
+        output_handlers.extend((file_handler, error_handler))
+    
+    # 控制台和文件写入（包括日志轮转）放到后台线程，记录日志时只把记录放入队列，不阻塞事件循环；
+    # 队列不设上限，避免日志量突增时丢失日志
+    if output_handlers:
+        global _log_listener
+        log_queue = queue.Queue(-1)
+        logger.addHandler(logging.handlers.QueueHandler(log_queue))
+        _log_listener = logging.handlers.QueueListener(
+            log_queue, *output_handlers, respect_handler_level=True
+        )
+        _log_listener.start()
+
+# 需要脱敏的字段名（包含以下任一词，不区分大小写）
+SENSITIVE_KEY_PATTERN = re.compile(r"token|secret|password|key", re.IGNORECASE)
+
+def _mask_sensitive_value(value: Any) -> str:
+    """隐藏敏感字段的值，较长的字符串保留首尾4个字符"""
+    if isinstance(value, str) and len(value) > 10:
+        return f"{value[:4]}...{value[-4:]}"
+    return "***"
 
 def sanitize_log_data(data: Any) -> Any:
-    """脱敏日志数据"""
-    if isinstance(data, dict):
-        sanitized = {}
-        for key, value in data.items():
-            if any(sensitive in key.lower() for sensitive in ['token', 'secret', 'password', 'key']):
-                if isinstance(value, str) and len(value) > 10:
-                    sanitized[key] = f"{value[:4]}...{value[-4:]}"
-                else:
-                    sanitized[key] = "***"
-            else:
-                sanitized[key] = sanitize_log_data(value)
-        return sanitized
-    elif isinstance(data, list):
-        return [sanitize_log_data(item) for item in data]
-    else:
+    """脱敏日志数据（用显式栈遍历嵌套结构，数据层级很深时也不会超出递归深度）"""
+    if not isinstance(data, (dict, list)):
         return data
 
+    sanitized = {} if isinstance(data, dict) else []
+    # (原容器, 对应的脱敏后容器)，子容器先占位再入栈，保持原有顺序
+    stack = [(data, sanitized)]
+    while stack:
+        source, target = stack.pop()
+        if isinstance(source, dict):
+            for key, value in source.items():
+                if isinstance(key, str) and SENSITIVE_KEY_PATTERN.search(key):
+                    target[key] = _mask_sensitive_value(value)
+                elif isinstance(value, (dict, list)):
+                    child = {} if isinstance(value, dict) else []
+                    target[key] = child
+                    stack.append((value, child))
+                else:
+                    target[key] = value
+        else:
+            for item in source:
+                if isinstance(item, (dict, list)):
+                    child = {} if isinstance(item, dict) else []
+                    target.append(child)
+                    stack.append((item, child))
+                else:
+                    target.append(item)
+    return sanitized
+
+# 文件大小单位，相邻单位相差1024倍
+FILE_SIZE_UNITS = ("B", "KB", "MB", "GB")
+
 def format_file_size(size_bytes: int) -> str:
     """格式化文件大小"""
     if size_bytes == 0:
         return "0 B"
+    if size_bytes < 1024:
+        return f"{size_bytes:.1f} B"
     
-    size_names = ["B", "KB", "MB", "GB"]
-    i = 0
-    while size_bytes >= 1024 and i < len(size_names) - 1:
-        size_bytes /= 1024.0
-        i += 1
-    
-    return f"{size_bytes:.1f} {size_names[i]}"
+    # 整数的二进制位数直接确定单位（每个单位10位），不必循环逐级除以1024
+    i = min((int(size_bytes).bit_length() - 1) // 10, len(FILE_SIZE_UNITS) - 1)
+    return f"{size_bytes / (1 << (10 * i)):.1f} {FILE_SIZE_UNITS[i]}"
 
 def format_duration(seconds: float) -> str:
     """格式化持续时间"""
@@ -106,10 +181,9 @@ def format_duration(seconds: float) -> str:
 
 def validate_csv_headers(headers: list, required_fields: list) -> Dict[str, Any]:
     """验证CSV文件头"""
-    missing_fields = []
-    for field in required_fields:
-        if field not in headers:
-            missing_fields.append(field)
+    # 列名转为集合后逐个检查，不必每个必需字段都扫描一遍列名列表
+    header_set = set(headers)
+    missing_fields = [field for field in required_fields if field not in header_set]
     
     return {
         "valid": len(missing_fields) == 0,
@@ -117,6 +191,17 @@ def validate_csv_headers(headers: list, required_fields: list) -> Dict[str, Any]
         "headers": headers
     }
 
+# 响应时间戳缓存：(整秒时间, ISO格式字符串)，同一秒内的响应复用同一个字符串
+_response_timestamp = (0, "")
+
+def _current_timestamp() -> str:
+    """获取精确到秒的当前时间（ISO格式），每秒只格式化一次"""
+    global _response_timestamp
+    now = int(time.time())
+    if now != _response_timestamp[0]:
+        _response_timestamp = (now, datetime.fromtimestamp(now).isoformat())
+    return _response_timestamp[1]
+
 def create_response(
     success: bool,
     message: str,
@@ -127,7 +212,7 @@ def create_response(
     response = {
         "success": success,
         "message": message,
-        "timestamp": datetime.now().isoformat()
+        "timestamp": _current_timestamp()
     }
     
     if data is not None:
@@ -138,6 +223,16 @@ def create_response(
     
     return response
 
+class ORJSONResponse(JSONResponse):
+    """使用orjson序列化的JSON响应，比标准库json快数倍"""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(
+            content,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        )
+
 def safe_json_loads(json_str: str, default: Any = None) -> Any:
     """安全的JSON解析"""
     try:
@@ -151,6 +246,9 @@ def truncate_string(text: str, max_length: int = 100) -> str:
         return text
     return text[:max_length] + "..."
 
+# 处理步骤日志缓存的条数，达到后合并为一条日志输出
+PROCESS_LOG_FLUSH_STEPS = 50
+
 class ProcessLogger:
     """处理过程日志记录器"""
     
@@ -159,10 +257,20 @@ class ProcessLogger:
         self.logger = logging.getLogger(f"process.{process_name}")
         self.start_time = None
         self.step_count = 0
+        # 尚未输出的步骤日志，逐个用户更新等步骤很多时合并输出，减少日志写入次数
+        self._buffer: List[str] = []
+        
+    def flush(self):
+        """输出缓存的步骤日志"""
+        if self._buffer:
+            self.logger.info("\n".join(self._buffer))
+            self._buffer.clear()
         
     def start(self, message: str = ""):
         """开始处理"""
-        self.start_time = datetime.now()
+        self.flush()
+        # 耗时只需要单调计时，不需要取墙上时间
+        self.start_time = time.perf_counter()
         self.step_count = 0
         msg = f"[{self.process_name}] 开始处理"
         if message:
@@ -172,14 +280,20 @@ class ProcessLogger:
     def step(self, message: str, data: Optional[Dict] = None):
         """记录处理步骤"""
         self.step_count += 1
+        # 日志不会输出时跳过格式化和数据脱敏
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
         msg = f"[{self.process_name}] 步骤{self.step_count}: {message}"
         if data:
             sanitized_data = sanitize_log_data(data)
             msg += f" - {sanitized_data}"
-        self.logger.info(msg)
+        self._buffer.append(msg)
+        if len(self._buffer) >= PROCESS_LOG_FLUSH_STEPS:
+            self.flush()
         
     def error(self, message: str, error: Optional[Exception] = None):
         """记录错误"""
+        self.flush()
         msg = f"[{self.process_name}] 错误: {message}"
         if error:
             msg += f" - {str(error)}"
@@ -187,8 +301,9 @@ class ProcessLogger:
         
     def finish(self, message: str = "", success: bool = True):
         """结束处理"""
+        self.flush()
         if self.start_time:
-            duration = (datetime.now() - self.start_time).total_seconds()
+            duration = time.perf_counter() - self.start_time
             duration_str = format_duration(duration)
         else:
             duration_str = "未知"
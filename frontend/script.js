@@ -2,6 +2,7 @@
 class AppState {
     constructor() {
         this.currentFile = null;
+        this.uploadToken = null;
         this.configValid = false;
         this.processing = false;
         this.connectionTested = false;
@@ -18,10 +19,16 @@ class AppState {
 
     // 清除服务器端上传文件缓存
     async clearUploadedFileCache() {
+        // 只清除本页面上传的文件，不影响其他用户的上传
+        if (!this.uploadToken) {
+            return;
+        }
+
         try {
-            const response = await fetch('/api/upload/clear', {
+            const response = await fetch(`/api/upload/clear?upload_token=${encodeURIComponent(this.uploadToken)}`, {
                 method: 'DELETE'
             });
+            this.uploadToken = null;
             
             if (response.ok) {
                 const result = await response.json();
@@ -290,6 +297,9 @@ class AppState {
                 throw new Error(`文件上传失败: ${uploadResult.message || '未知错误'}`);
             }
 
+            // 保存上传令牌，后续映射和同步请求都需要携带
+            this.uploadToken = uploadResult.data.upload_token;
+
             // 检查是否需要显示字段映射界面
             if (uploadResult.data && uploadResult.data.need_mapping) {
                 // 显示字段映射界面
@@ -330,23 +340,39 @@ class AppState {
         }
     }
 
-    // 执行同步操作
-    async performSync() {
+    // 执行同步操作（fieldMapping 为用户确认的字段映射，使用默认映射时不传）
+    async performSync(fieldMapping = null) {
         try {
             this.updateProcessStatus('文件上传成功，正在同步数据...', 'loading');
 
             console.log('开始同步请求...');
             const syncResponse = await fetch('/api/sync', {
-                method: 'POST'
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify({
+                    upload_token: this.uploadToken,
+                    field_mapping: fieldMapping
+                })
             });
 
             console.log('同步响应状态:', syncResponse.status);
 
-            const syncResult = await syncResponse.json();
+            const submitResult = await syncResponse.json();
+            console.log('同步任务提交结果:', submitResult);
+
+            if (!submitResult.success) {
+                throw new Error(`同步失败: ${submitResult.message || '未知错误'}`);
+            }
+
+            // 同步在后台执行，轮询任务状态直到结束
+            const syncResult = await this.waitForSyncJob(submitResult.data.job_id);
             console.log('同步响应数据:', syncResult);
 
             if (syncResult.success) {
                 console.log('同步成功，显示结果');
+                this.uploadToken = null;
                 this.showSyncSuccess(syncResult);
                 // 保存映射到历史记录
                 if (this.currentMapping && this.currentCsvHeaders) {
@@ -375,6 +401,35 @@ class AppState {
         }
     }
 
+    // 轮询后台同步任务，返回最终的同步结果（超过最长等待时间或任务不存在时停止轮询）
+    async waitForSyncJob(jobId, maxWaitMs = 30 * 60 * 1000) {
+        const deadline = Date.now() + maxWaitMs;
+        while (true) {
+            if (Date.now() > deadline) {
+                throw new Error('同步任务等待超时，请稍后刷新页面查看同步结果');
+            }
+            await new Promise(resolve => setTimeout(resolve, 1000));
+
+            const response = await fetch(`/api/sync/status/${encodeURIComponent(jobId)}`);
+            if (response.status === 404) {
+                throw new Error('同步任务不存在或已过期（服务可能已重启）');
+            }
+            if (!response.ok) {
+                throw new Error(`同步任务状态查询失败: HTTP ${response.status}`);
+            }
+            const result = await response.json();
+
+            if (!result.success) {
+                throw new Error(result.message || '同步任务状态查询失败');
+            }
+
+            const job = result.data;
+            if (job.status === 'completed' || job.status === 'failed') {
+                return job.result;
+            }
+        }
+    }
+
     // 重置表单
     resetForm() {
         document.getElementById('course-name').value = '';
@@ -1409,33 +1464,12 @@ async function confirmMapping() {
 
         console.log('发送映射数据:', mappingData);
 
-        // 发送映射配置到后端
-        app.updateProcessStatus('正在保存字段映射配置...', 'loading');
-
-        const mappingResponse = await fetch('/api/mapping/set', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                mapping: mappingData
-            })
-        });
-
-        const mappingResult = await mappingResponse.json();
-
-        if (!mappingResult.success) {
-            throw new Error('保存字段映射配置失败: ' + mappingResult.message);
-        }
-
-        console.log('字段映射配置已发送到后端');
-
         // 隐藏映射界面
         const mappingSection = document.getElementById('mapping-section');
         mappingSection.style.display = 'none';
 
-        // 继续同步流程
-        await app.performSync();
+        // 继续同步流程，映射配置随同步请求一起发送
+        await app.performSync(mappingData);
 
     } catch (error) {
         console.error('确认映射失败:', error);
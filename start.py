@@ -5,13 +5,17 @@ NVC学员信息同步工具启动脚本
 
 import os
 import sys
+import hashlib
 import subprocess
 from pathlib import Path
 
+# 记录已安装依赖的requirements.txt摘要，内容和Python环境都没变时跳过pip安装
+REQUIREMENTS_MARKER = Path(".requirements.installed")
+
 def check_python_version():
     """检查Python版本"""
-    if sys.version_info < (3, 8):
-        print("❌ 错误: 需要Python 3.8或更高版本")
+    if sys.version_info < (3, 10):
+        print("❌ 错误: 需要Python 3.10或更高版本")
         print(f"当前版本: {sys.version}")
         sys.exit(1)
     print(f"✅ Python版本检查通过: {sys.version}")
@@ -25,13 +29,28 @@ def check_venv():
         print("⚠️  警告: 未检测到虚拟环境")
         return False
 
+def requirements_digest() -> str:
+    """计算requirements.txt与当前Python环境的摘要（换了虚拟环境需要重新安装）"""
+    digest = hashlib.blake2b(Path("requirements.txt").read_bytes(), digest_size=16)
+    digest.update(sys.prefix.encode())
+    return digest.hexdigest()
+
 def install_dependencies():
     """安装依赖"""
     print("📦 检查并安装依赖...")
+    digest = requirements_digest()
+    try:
+        if REQUIREMENTS_MARKER.read_text().strip() == digest:
+            print("✅ 依赖已是最新，跳过安装")
+            return
+    except OSError:
+        pass
+    
     try:
         # 不捕获输出，让用户看到安装进度
         result = subprocess.run([sys.executable, "-m", "pip", "install", "-r", "requirements.txt"],
                               check=True)
+        REQUIREMENTS_MARKER.write_text(digest)
         print("✅ 依赖安装完成")
     except subprocess.CalledProcessError as e:
         print(f"❌ 依赖安装失败: {e}")
@@ -68,15 +87,22 @@ def start_server():
     print("按 Ctrl+C 停止服务")
     print("-" * 50)
     
+    # 上传会话、同步任务和学员缓存都保存在进程内存中，只能使用单个工作进程；
+    # uvicorn[standard]已包含uvloop和httptools，uvicorn默认会自动使用
+    cmd = [
+        sys.executable, "-m", "uvicorn", 
+        "backend.app:app", 
+        "--host", "0.0.0.0", 
+        "--port", "8000"
+    ]
+    # 自动重载会额外启动监控文件变化的进程，只在开发时通过 DEV=1 开启
+    if os.getenv("DEV") == "1":
+        cmd.append("--reload")
+        print("🔁 开发模式: 代码修改后自动重启")
+    
     try:
         # 启动uvicorn服务器（从项目根目录）
-        subprocess.run([
-            sys.executable, "-m", "uvicorn", 
-            "backend.app:app", 
-            "--reload", 
-            "--host", "0.0.0.0", 
-            "--port", "8000"
-        ])
+        subprocess.run(cmd)
     except KeyboardInterrupt:
         print("\n👋 服务器已停止")
     except Exception as e:
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+测试脚本共用的同步辅助函数
+"""
+
+import time
+
+import requests
+
+# 同步任务最长等待时间（秒），与前端 waitForSyncJob 的超时一致
+SYNC_JOB_TIMEOUT = 30 * 60
+
+def run_sync(base_url, upload_token, timeout=SYNC_JOB_TIMEOUT):
+    """提交同步任务并轮询直到结束，返回同步结果；接口返回非200或等待超时时抛出异常"""
+    response = requests.post(f"{base_url}/api/sync", json={"upload_token": upload_token})
+    print(f"同步状态码: {response.status_code}")
+    if response.status_code != 200:
+        raise RuntimeError(f"提交同步任务失败: HTTP {response.status_code} - {response.text}")
+    submit_result = response.json()
+    if not submit_result.get('success'):
+        return submit_result
+
+    job_id = submit_result['data']['job_id']
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        time.sleep(1)
+        response = requests.get(f"{base_url}/api/sync/status/{job_id}")
+        if response.status_code != 200:
+            raise RuntimeError(f"查询同步任务失败: HTTP {response.status_code} - {response.text}")
+        job = response.json().get('data') or {}
+        if job.get('status') in ('completed', 'failed'):
+            return job.get('result', {})
+
+    raise TimeoutError(f"同步任务 {job_id} 超过{timeout}秒仍未结束")
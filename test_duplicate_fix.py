@@ -7,6 +7,8 @@ import requests
 import json
 import time
 
+from sync_test_utils import run_sync
+
 BASE_URL = "http://localhost:8000"
 
 def test_duplicate_fix():
@@ -46,9 +48,7 @@ duplicate_test_001,新用户测试1,13800138002"""
         
         # 开始同步
         print("\n🔄 开始同步处理")
-        sync_response = requests.post(f"{BASE_URL}/api/sync")
-        print(f"同步状态码: {sync_response.status_code}")
-        sync_result = sync_response.json()
+        sync_result = run_sync(BASE_URL, upload_result['data']['upload_token'])
         
         if sync_result.get('success'):
             print(f"✅ 同步成功!")
@@ -7,6 +7,8 @@ import requests
 import json
 import time
 
+from sync_test_utils import run_sync
+
 BASE_URL = "http://localhost:8000"
 
 def test_query_fix():
@@ -43,9 +45,7 @@ query_test_003,查询测试用户3,13800138002"""
             return
         
         print("\n🔄 步骤2: 开始同步")
-        sync_response = requests.post(f"{BASE_URL}/api/sync")
-        print(f"同步状态码: {sync_response.status_code}")
-        sync_result = sync_response.json()
+        sync_result = run_sync(BASE_URL, upload_result['data']['upload_token'])
         print(f"同步结果: {json.dumps(sync_result, indent=2, ensure_ascii=False)}")
         
         if sync_result.get('success'):
@@ -61,8 +61,7 @@ query_test_003,查询测试用户3,13800138002"""
             print(f"第二次上传结果: {json.dumps(upload_result2, indent=2, ensure_ascii=False)}")
             
             if upload_result2.get('success'):
-                sync_response2 = requests.post(f"{BASE_URL}/api/sync")
-                sync_result2 = sync_response2.json()
+                sync_result2 = run_sync(BASE_URL, upload_result2['data']['upload_token'])
                 print(f"第二次同步结果: {json.dumps(sync_result2, indent=2, ensure_ascii=False)}")
                 
                 if sync_result2.get('success'):